@@ -0,0 +1,46 @@
+"""
+Compares the installed JSON codecs on realistic CouchDB payloads: a _bulk_docs request body and an
+include_docs=true view response.
+
+Usage:
+  python benchmarks/bench_codec.py [--docs N] [--repeat N]
+"""
+import  argparse
+import  os
+import  sys
+import  timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import  couchapy.codec  # noqa: E402
+from    stub_server import make_doc  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    docs = [make_doc(i) for i in range(args.docs)]
+    payloads = {
+        '_bulk_docs body': {'docs': docs},
+        'view include_docs': {'total_rows': args.docs, 'offset': 0,
+                              'rows': [{'id': doc['_id'], 'key': doc['_id'], 'value': {'rev': doc['_rev']}, 'doc': doc}
+                                       for doc in docs]},
+    }
+
+    for label, payload in payloads.items():
+        size = len(couchapy.codec.JsonCodec().dumps(payload))
+        print(f'{label}: {args.docs} docs, {size / 1024:.0f} KiB')
+
+        for name in couchapy.codec.available_codecs():
+            codec = couchapy.codec.get_codec(name)
+            encoded = codec.dumps(payload)
+            dumps = timeit.timeit(lambda: codec.dumps(payload), number=args.repeat) / args.repeat
+            loads = timeit.timeit(lambda: codec.loads(encoded), number=args.repeat) / args.repeat
+            print(f'  {name:<8} dumps {dumps * 1000:>8.2f} ms   loads {loads * 1000:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
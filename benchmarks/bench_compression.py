@@ -0,0 +1,129 @@
+"""
+Measures bytes on the wire and end-to-end time of _bulk_docs requests with and without gzip request
+compression (compression_kwargs of CouchDB), and of include_docs _all_docs responses with each
+Accept-Encoding the client can negotiate (identity, gzip and deflate).
+
+The stub server decompresses every request body, as CouchDB does, and compresses responses with the
+encoding the client accepts, as a compressing reverse proxy in front of CouchDB does.  It can throttle
+both directions to emulate a slow link, e.g. --bandwidth 50 for a 50 Mbit/s cross-region connection.
+
+Usage:
+  python benchmarks/bench_compression.py [--docs N] [--requests N] [--bandwidth MBIT]
+"""
+import  argparse
+import  gzip
+import  json
+import  os
+import  sys
+import  threading
+import  time
+import  zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import  couchapy  # noqa: E402
+from    couchapy.compression import Compressor  # noqa: E402
+from    stub_server import StubHandler, StubServer, make_doc  # noqa: E402
+
+
+class CountingHandler(StubHandler):
+    lock = threading.Lock()
+    wire_bytes = 0
+    json_bytes = 0
+    bandwidth = None
+    # the response body, and its encodings, are compressed once so that only the client is timed
+    response = b''
+    encoded = {}
+
+    def _count(self, wire, json_body):
+        with CountingHandler.lock:
+            CountingHandler.wire_bytes += len(wire)
+            CountingHandler.json_bytes += len(json_body)
+
+        if self.bandwidth:
+            time.sleep(len(wire) * 8 / (self.bandwidth * 1000000))
+
+    def do_POST(self):
+        body = self._drain()
+        self._count(body, gzip.decompress(body) if self.headers.get('Content-Encoding') == 'gzip' else body)
+        self._respond(201, [])
+
+    def do_GET(self):
+        accepted = [encoding.split(';')[0].strip() for encoding in self.headers.get('Accept-Encoding', '').split(',')]
+        encoding = next((encoding for encoding in ['gzip', 'deflate'] if encoding in accepted), None)
+        body = self.encoded[encoding]
+        self._count(body, self.response)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def report(label, direction, elapsed, requests):
+    ratio = CountingHandler.wire_bytes / CountingHandler.json_bytes
+    print(f'  {label:<18} {CountingHandler.wire_bytes / 1048576:>8.2f} MiB {direction}  ({ratio:>4.0%} of JSON)   '
+          f'{elapsed / requests * 1000:>8.2f} ms/request')
+
+
+def run(server, label, docs, requests, compression_kwargs):
+    couch = couchapy.CouchDB(host=server.host, port=server.port, database_kwargs={'db': 'bench'},
+                             compression_kwargs=compression_kwargs)
+    CountingHandler.wire_bytes = CountingHandler.json_bytes = 0
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        couch.db.bulk_save(data={'docs': docs})
+    elapsed = time.perf_counter() - start
+
+    couch.close()
+    report(label, 'sent', elapsed, requests)
+
+
+def run_responses(server, accept_encoding, requests):
+    couch = couchapy.CouchDB(host=server.host, port=server.port, database_kwargs={'db': 'bench'},
+                             compression_kwargs={'accept_encoding': accept_encoding})
+    CountingHandler.wire_bytes = CountingHandler.json_bytes = 0
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        couch.db.get_docs(params={'include_docs': True})
+    elapsed = time.perf_counter() - start
+
+    couch.close()
+    report(accept_encoding, 'received', elapsed, requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=1000, help='documents per _bulk_docs request')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--bandwidth', type=float, default=None, help='emulated link bandwidth in Mbit/s')
+    args = parser.parse_args()
+
+    CountingHandler.bandwidth = args.bandwidth
+    docs = [make_doc(i) for i in range(args.docs)]
+    link = f'{args.bandwidth:g} Mbit/s link' if args.bandwidth else 'unthrottled loopback'
+    print(f'_bulk_docs, {args.docs} docs per request, {args.requests} requests, {link}')
+
+    rows = [{'id': doc['_id'], 'key': doc['_id'], 'value': {'rev': doc['_rev']}, 'doc': doc} for doc in docs]
+    CountingHandler.response = json.dumps({'total_rows': len(rows), 'offset': 0, 'rows': rows}).encode('utf-8')
+    CountingHandler.encoded = {None: CountingHandler.response,
+                               'gzip': Compressor(threshold=0).compress(CountingHandler.response),
+                               'deflate': zlib.compress(CountingHandler.response)}
+
+    with StubServer(handler=CountingHandler) as server:
+        run(server, 'uncompressed', docs, args.requests, None)
+        for level in [1, 6, 9]:
+            run(server, f'gzip level {level}', docs, args.requests, {'level': level})
+
+        print(f'_all_docs with include_docs, {args.docs} rows per response, by Accept-Encoding')
+        for accept_encoding in ['identity', 'gzip', 'deflate']:
+            run_responses(server, accept_encoding, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures the client-side overhead of a call through the endpoint decorator, excluding network time.
+
+The transport of the CouchDB instance is replaced by one that returns a canned response, so the
+numbers only include URI building, key validation, request preparation and response handling.
+
+Usage:
+  python benchmarks/bench_decorator.py [--calls N]
+"""
+import  argparse
+import  os
+from    re import sub
+import  sys
+import  timeit
+
+import  requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import  couchapy  # noqa: E402
+from    couchapy.decorators import UriTemplate  # noqa: E402
+
+
+class CannedTransport():
+    def __init__(self, body):
+        self._response = requests.Response()
+        self._response.status_code = 200
+        self._response.reason = 'OK'
+        self._response._content = body
+        self._response.headers['Content-Type'] = 'application/json'
+
+    def request(self, method, uri, **kwargs):
+        return self._response
+
+
+def uncompiled_build_uri(template, segments):
+    """URI building as done by the endpoint decorator before templates were precompiled."""
+    return sub(r':([\w_]+):', lambda matches: segments[matches.group(1)], template)
+
+
+def _report(label, seconds, calls):
+    print(f'{label:<44} {seconds / calls * 1e6:>8.2f} us/call')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+
+    template = '/:db:/_design/:docid:/_view/:view:'
+    segments = {'db': 'somedb', 'docid': 'ddoc', 'view': 'byname'}
+    compiled = UriTemplate(template)
+    host, port = 'http://127.0.0.1', 5984
+
+    _report('uri: re.sub per call (before)',
+            timeit.timeit(lambda: f'{host}:{port}{uncompiled_build_uri(template, segments)}', number=args.calls), args.calls)
+    _report('uri: precompiled template (after)',
+            timeit.timeit(lambda: 'http://127.0.0.1:5984' + compiled.format(segments), number=args.calls), args.calls)
+
+    couch = couchapy.CouchDB(database_kwargs={'db': 'somedb'})
+    couch._transport = CannedTransport(b'{"_id":"somedoc","_rev":"1-abc"}')
+
+    _report('endpoint call: get_doc',
+            timeit.timeit(lambda: couch.db.get_doc(uri_segments={'docid': 'somedoc'}), number=args.calls), args.calls)
+    _report('endpoint call: get_view with params',
+            timeit.timeit(lambda: couch.db.get_view(uri_segments={'docid': 'ddoc', 'view': 'byname'},
+                                                    params={'limit': 10, 'include_docs': True}),
+                          number=args.calls), args.calls)
+
+    couch.observers.append(couchapy.MetricsAggregator())
+    _report('endpoint call: get_doc, MetricsAggregator',
+            timeit.timeit(lambda: couch.db.get_doc(uri_segments={'docid': 'somedoc'}), number=args.calls), args.calls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures time to first row, total time and peak client memory of large view, _all_docs and _find
+results read with the default json response format versus response_format='rows', which parses
+rows one at a time as they are received.
+
+The stub server sends _all_docs and view rows with include_docs, so every row carries a full document.
+
+Usage:
+  python benchmarks/bench_rows.py [--rows N] [--repeat N]
+"""
+import  argparse
+import  os
+import  sys
+import  time
+import  tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import  couchapy  # noqa: E402
+from    stub_server import CouchStubHandler, StubServer  # noqa: E402
+
+
+def query(db, name, rows, response_format):
+    if name == 'view':
+        return db.get_view(uri_segments={'docid': 'orders', 'view': 'by_customer'},
+                           params={'limit': rows, 'include_docs': 'true'}, response_format=response_format)
+    if name == 'all_docs':
+        return db.get_docs(params={'limit': rows, 'include_docs': 'true'}, response_format=response_format)
+    return db.find(data={'selector': {'type': 'order'}, 'limit': rows}, response_format=response_format)
+
+
+def consume(result, response_format):
+    """
+    :returns float seconds until the first row was available
+    """
+    start = time.perf_counter()
+    first = None
+
+    items = result if response_format == 'rows' else result.get('rows', result.get('docs'))
+    for _ in items:
+        if first is None:
+            first = time.perf_counter() - start
+
+    return first
+
+
+def measure(db, name, rows, response_format, repeat):
+    first_rows, totals = [], []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query(db, name, rows, response_format)
+        request = time.perf_counter() - start
+        first = consume(result, response_format)
+        totals.append(time.perf_counter() - start)
+        first_rows.append(request + first)
+
+    tracemalloc.start()
+    try:
+        consume(query(db, name, rows, response_format), response_format)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return min(first_rows), min(totals), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows per response')
+    parser.add_argument('--repeat', type=int, default=5, help='timed requests per measurement; the fastest is kept')
+    args = parser.parse_args()
+
+    CouchStubHandler.docs = args.rows
+    print(f'{args.rows} rows per response, best of {args.repeat}')
+    print(f'  {"endpoint":<10} {"format":<6} {"first row ms":>12} {"total ms":>10} {"peak MiB":>10}')
+
+    with StubServer(handler=CouchStubHandler) as server:
+        couch = couchapy.CouchDB(host=server.host, port=server.port, database_kwargs={'db': 'bench'})
+
+        for name in ['view', 'all_docs', 'find']:
+            for response_format in ['json', 'rows']:
+                first, total, peak = measure(couch.db, name, args.rows, response_format, args.repeat)
+                print(f'  {name:<10} {response_format:<6} {first * 1000:>12.1f} {total * 1000:>10.1f} '
+                      f'{peak / 1048576:>10.1f}')
+
+        couch.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark suite of the synchronous client against the CouchDB stand-in of stub_server.py,
+which is started in a separate process so that only client-side CPU time is measured.
+
+Every scenario calls one endpoint with a realistic payload size and reports throughput, latency
+percentiles, client CPU time per request and memory allocated per request.  Results can be saved as
+JSON and compared with the results of another commit to spot regressions in the endpoint decorator,
+codec or transport.
+
+Usage:
+  python benchmarks/bench_suite.py [--requests N] [--threads N] [--scenario NAME ...]
+                                   [--output FILE] [--compare FILE]
+
+Examples:
+  git checkout main   && python benchmarks/bench_suite.py --output main.json
+  git checkout branch && python benchmarks/bench_suite.py --compare main.json
+"""
+import  argparse
+from    concurrent.futures import ThreadPoolExecutor
+import  datetime
+import  json
+import  os
+import  platform
+import  resource
+import  subprocess
+import  sys
+import  time
+import  tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+
+import  couchapy  # noqa: E402
+from    stub_server import make_doc  # noqa: E402
+
+
+BULK_DOCS = [make_doc(i) for i in range(500)]
+BULK_GET = {'docs': [{'id': f'order:{i:08}'} for i in range(100)]}
+
+SCENARIOS = {
+    'get_doc': ('GET a single document',
+                lambda db: db.get_doc(uri_segments={'docid': 'order:00000042'})),
+    'all_docs_1000': ('GET _all_docs, 1000 rows with include_docs',
+                      lambda db: db.get_docs(params={'limit': 1000, 'include_docs': 'true'})),
+    'view_1000': ('GET a view, 1000 rows',
+                  lambda db: db.get_view(uri_segments={'docid': 'orders', 'view': 'by_customer'}, params={'limit': 1000})),
+    'find_200': ('POST _find, 200 documents',
+                 lambda db: db.find(data={'selector': {'type': 'order', 'status': 'shipped'}, 'limit': 200})),
+    'bulk_save_500': ('POST _bulk_docs, 500 documents',
+                      lambda db: db.bulk_save(data={'docs': BULK_DOCS})),
+    'bulk_get_100': ('POST _bulk_get, 100 documents',
+                     lambda db: db.bulk_get(data=BULK_GET)),
+    'changes_1000': ('GET _changes, 1000 changes',
+                     lambda db: db.get_changes(params={'since': 0, 'limit': 1000})),
+}
+
+
+def start_stub(docs):
+    """
+    :returns tuple (process, host, port) of a stub server running in a child process
+    """
+    process = subprocess.Popen([sys.executable, os.path.join(BENCHMARKS, 'stub_server.py'), '--docs', str(docs)],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    address = process.stdout.readline().strip()
+    host, port = address.rsplit(':', 1)
+    return process, host, int(port)
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+
+    def at(percent):
+        return ordered[min(len(ordered) - 1, int(percent / 100 * len(ordered)))]
+
+    return {'p50': at(50), 'p95': at(95), 'p99': at(99), 'max': ordered[-1], 'mean': sum(ordered) / len(ordered)}
+
+
+def allocated_per_request(call, samples):
+    """
+    :returns int median peak of memory allocated by the client during a request, in bytes
+    """
+    peaks = []
+    try:
+        for _ in range(samples):
+            # traced from scratch for every sample, since tracemalloc.reset_peak only exists from Python 3.9
+            tracemalloc.start()
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    finally:
+        tracemalloc.stop()
+
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def run_scenario(db, call, requests, threads, warmup):
+    def timed(_):
+        start = time.perf_counter()
+        result = call(db)
+        elapsed = time.perf_counter() - start
+        if isinstance(result, couchapy.CouchError):
+            raise RuntimeError(f'request failed: {result.status_code} {result.reason}')
+        return elapsed
+
+    for _ in range(warmup):
+        timed(None)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(timed, range(requests)))
+    else:
+        latencies = [timed(None) for _ in range(requests)]
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    return {'requests': requests,
+            'threads': threads,
+            'seconds': elapsed,
+            'throughput': requests / elapsed,
+            'latency': percentiles(latencies),
+            'cpu_per_request': cpu / requests,
+            'allocated_per_request': allocated_per_request(lambda: call(db), min(requests, 20))}
+
+
+def git(*args):
+    # capture_output and text are only accepted from Python 3.7
+    return subprocess.run(['git'] + list(args), cwd=BENCHMARKS, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True).stdout.strip()
+
+
+def environment():
+    try:
+        commit = git('rev-parse', '--short', 'HEAD') or None
+        dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    except OSError:
+        commit, dirty = None, None
+
+    return {'commit': commit, 'dirty': dirty,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'codec': couchapy.CouchDB()._codec.name if hasattr(couchapy.CouchDB()._codec, 'name') else None}
+
+
+def _change(new, old, lower_is_better):
+    if not old:
+        return ''
+    change = (new - old) / old
+    worse = change > 0 if lower_is_better else change < 0
+    return f'{change:>+7.1%}{" !" if worse and abs(change) > 0.1 else "  "}'
+
+
+def report(results, baseline=None):
+    baseline = (baseline or {}).get('scenarios', {})
+    print(f'{"scenario":<16} {"req/s":>9}        {"p50 ms":>8}        {"p99 ms":>8}        '
+          f'{"cpu us/req":>10}        {"alloc KiB":>9}')
+
+    for name, result in results['scenarios'].items():
+        old = baseline.get(name, {})
+        old_latency = old.get('latency', {})
+        print(f'{name:<16} {result["throughput"]:>9.1f} {_change(result["throughput"], old.get("throughput"), False):>9}'
+              f'{result["latency"]["p50"] * 1000:>8.2f} {_change(result["latency"]["p50"], old_latency.get("p50"), True):>9}'
+              f'{result["latency"]["p99"] * 1000:>8.2f} {_change(result["latency"]["p99"], old_latency.get("p99"), True):>9}'
+              f'{result["cpu_per_request"] * 1e6:>10.0f} {_change(result["cpu_per_request"], old.get("cpu_per_request"), True):>9}'
+              f'{result["allocated_per_request"] / 1024:>9.0f} '
+              f'{_change(result["allocated_per_request"], old.get("allocated_per_request"), True):>9}')
+
+    if baseline:
+        print('\nChanges are relative to the baseline; "!" marks regressions of more than 10%.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario')
+    parser.add_argument('--threads', type=int, default=1, help='client threads sharing one CouchDB instance')
+    parser.add_argument('--docs', type=int, default=10000, help='number of documents of the emulated database')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='scenarios to run (Default: all)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    process, host, port = start_stub(args.docs)
+    try:
+        couch = couchapy.CouchDB(host=host, port=port, database_kwargs={'db': 'bench'},
+                                 transport_kwargs={'pool_maxsize': args.threads})
+
+        results = {'environment': environment(),
+                   'settings': {'requests': args.requests, 'warmup': args.warmup, 'threads': args.threads,
+                                'docs': args.docs},
+                   'scenarios': {}}
+
+        for name in args.scenario or SCENARIOS:
+            description, call = SCENARIOS[name]
+            results['scenarios'][name] = {'description': description,
+                                          **run_scenario(couch.db, call, args.requests, args.threads, args.warmup)}
+
+        results['environment']['max_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        couch.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'\nResults written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Compares request throughput of the pooled CouchDB transport with the module-level requests
+functions that the endpoint decorator previously used.
+
+Usage:
+  python benchmarks/bench_transport.py [--requests N] [--threads N]
+"""
+import  argparse
+from    concurrent.futures import ThreadPoolExecutor
+import  os
+import  sys
+import  time
+
+import  requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import  couchapy  # noqa: E402
+from    stub_server import StubServer  # noqa: E402
+
+
+def _run(label, call, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: call(), range(total)))
+    elapsed = time.perf_counter() - start
+    print(f'{label:<32} {total / elapsed:>10.1f} req/s  ({elapsed:.2f}s for {total} requests, {threads} threads)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        uri = f'{server.host}:{server.port}/_up'
+        couch = couchapy.CouchDB(host=server.host, port=server.port,
+                                 transport_kwargs={'pool_maxsize': args.threads})
+
+        _run('before: requests.get per call', lambda: requests.get(uri).json(), args.requests, args.threads)
+        _run('after: pooled CouchDB transport', couch.server.server_status, args.requests, args.threads)
+
+        couch.close()
+
+
+if __name__ == '__main__':
+    main()
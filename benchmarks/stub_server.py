@@ -0,0 +1,221 @@
+"""
+Minimal, fast stand-ins for a CouchDB server used by the benchmarks in this directory.
+
+The stubs speak HTTP/1.1 with keep-alive so that client-side connection reuse can be measured.
+StubHandler answers every request with a small canned JSON document.  CouchStubHandler emulates the
+response shapes and sizes of the bulk, _all_docs, view, _find and _changes endpoints of a database of
+generated documents; it is not a CouchDB emulator either, and nothing is stored.
+
+Run it in its own process, so that its CPU time is not attributed to the client being measured:
+  python benchmarks/stub_server.py [--port N] [--docs N]
+"""
+import  argparse
+from    functools import lru_cache
+import  gzip
+from    http.server import BaseHTTPRequestHandler, HTTPServer
+import  json
+from    socketserver import ThreadingMixIn
+import  sys
+import  threading
+from    urllib.parse import parse_qs, urlsplit
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer only exists from Python 3.7
+    daemon_threads = True
+
+
+def make_doc(i):
+    return {'_id': f'order:{i:08}', '_rev': f'3-{i:032x}', 'type': 'order', 'status': 'shipped',
+            'customer': {'id': f'customer:{i % 977:06}', 'name': 'Zoë Example', 'email': 'zoe@example.com',
+                         'address': {'street': '1 Main St', 'city': 'Springfield', 'zip': '12345'}},
+            'lines': [{'sku': f'SKU-{j:05}', 'qty': j + 1, 'price': 19.99 + j, 'tags': ['sale', 'new']} for j in range(5)],
+            'total': 123.45 + i, 'paid': True, 'notes': None, 'created': '2020-05-01T12:34:56Z'}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _drain(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        self._respond(200, {'couchdb': 'Welcome', 'version': 'stub'})
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('ETag', '"1-stub"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        self._drain()
+        self._respond(201, {'ok': True})
+
+    def do_PUT(self):
+        self._drain()
+        self._respond(201, {'ok': True, 'id': 'stub', 'rev': '1-stub'})
+
+
+class CouchStubHandler(StubHandler):
+    """
+    Serves a database of docs generated documents (see make_doc) under any database name.  Responses are
+    rendered once per distinct query and then served from memory, so that the stub is never the bottleneck.
+    """
+    docs = 10000
+
+    def _path(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return url.path.strip('/').split('/'), query
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json_body(self):
+        body = self._drain()
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body) if body else {}
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _rows(kind, skip, limit, include_docs, total):
+        rows = []
+        for i in range(skip, min(skip + limit, total)):
+            doc = make_doc(i)
+            if kind == 'view':
+                row = {'id': doc['_id'], 'key': [doc['customer']['id'], doc['created']], 'value': doc['total']}
+            else:
+                row = {'id': doc['_id'], 'key': doc['_id'], 'value': {'rev': doc['_rev']}}
+            if include_docs:
+                row['doc'] = doc
+            rows.append(row)
+
+        return json.dumps({'total_rows': total, 'offset': skip, 'rows': rows}).encode('utf-8')
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _find(limit, total):
+        docs = [make_doc(i) for i in range(min(limit, total))]
+        return json.dumps({'docs': docs, 'bookmark': 'g1AAAAB' + 'x' * 60}).encode('utf-8')
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _changes(since, limit, total):
+        end = min(since + limit, total)
+        results = [{'seq': f'{i + 1}-g1AAAA', 'id': f'order:{i:08}', 'changes': [{'rev': f'3-{i:032x}'}]}
+                   for i in range(since, end)]
+        return json.dumps({'results': results, 'last_seq': f'{end}-g1AAAA', 'pending': total - end}).encode('utf-8')
+
+    def do_GET(self):
+        parts, query = self._path()
+        limit = int(query.get('limit', self.docs))
+        include_docs = query.get('include_docs', 'false').lower() == 'true'
+        skip = int(query.get('skip', 0))
+
+        if len(parts) == 2 and parts[1] == '_all_docs':
+            self._send(200, self._rows('all_docs', skip, limit, include_docs, self.docs))
+        elif len(parts) == 5 and parts[3] == '_view':
+            self._send(200, self._rows('view', skip, limit, include_docs, self.docs))
+        elif len(parts) == 2 and parts[1] == '_changes':
+            since = int(str(query.get('since', '0')).split('-')[0] or 0)
+            self._send(200, self._changes(since, limit, self.docs))
+        elif len(parts) == 2:
+            index = int(parts[1].rsplit(':', 1)[-1]) if parts[1].startswith('order:') else 0
+            self._send(200, json.dumps(make_doc(index)).encode('utf-8'))
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        parts, query = self._path()
+        data = self._json_body()
+
+        if len(parts) == 2 and parts[1] == '_bulk_docs':
+            self._respond(201, [{'ok': True, 'id': doc.get('_id', f'generated:{i}'), 'rev': '1-967a00dff5e02add41819138abb3284d'}
+                                for i, doc in enumerate(data.get('docs', []))])
+        elif len(parts) == 2 and parts[1] == '_bulk_get':
+            results = []
+            for i, item in enumerate(data.get('docs', [])):
+                doc = make_doc(i)
+                doc['_id'] = item.get('id')
+                results.append({'id': item.get('id'), 'docs': [{'ok': doc}]})
+            self._respond(200, {'results': results})
+        elif len(parts) == 2 and parts[1] == '_find':
+            self._send(200, self._find(int(data.get('limit', 25)), self.docs))
+        else:
+            self._respond(201, {'ok': True, 'id': 'stub', 'rev': '1-stub'})
+
+
+class StubServer():
+    """
+    Runs the stub server on a background thread.
+
+    Usage Examples:
+      with StubServer() as server:
+          couch = CouchDB(host=server.host, port=server.port)
+    """
+    def __init__(self, host='127.0.0.1', port=0, handler=StubHandler):
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+        self.host = f'http://{host}'
+        self.port = self._server.server_address[1]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        """
+        Serves requests on the calling thread.
+        """
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--docs', type=int, default=10000, help='number of documents in every emulated database')
+    args = parser.parse_args()
+
+    CouchStubHandler.docs = args.docs
+    server = StubServer(args.host, args.port, CouchStubHandler)
+
+    # the first line of output tells a parent process where to connect
+    print(f'{server.host}:{server.port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
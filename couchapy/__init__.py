@@ -1,3 +1,6 @@
+from    couchapy.aio import AsyncCouchDB
 from    couchapy.couchdb import CouchDB
+from    couchapy.decorators import RawResponse
 from    couchapy.error import CouchError, InvalidKeysException
+from    couchapy.metrics import MetricsAggregator
 from    couchapy.session import Session
@@ -0,0 +1,321 @@
+import  json
+import  re
+
+import  couchapy.error
+
+
+# operators that let a json index narrow the range of keys that is read
+_INDEXABLE_OPERATORS = {'$eq', '$gt', '$gte', '$lt', '$lte', '$in', '$beginsWith'}
+_RANGE_OPERATORS = _INDEXABLE_OPERATORS - {'$eq'}
+
+
+def _selector_fields(selector, prefix=''):
+    """
+    :returns tuple (equality fields, range fields) of a selector that a json index can be used for, in the order
+             they appear in the selector
+    """
+    equality, ranges = [], []
+
+    for key, value in selector.items():
+        if key == '$and':
+            for clause in value:
+                clause_equality, clause_ranges = _selector_fields(clause, prefix)
+                equality += clause_equality
+                ranges += clause_ranges
+            continue
+
+        if key.startswith('$'):
+            # $or, $nor, $not and the like cannot be answered from a single range of a json index
+            continue
+
+        field = prefix + key
+        if not isinstance(value, dict):
+            equality.append(field)
+        elif not value:
+            continue
+        elif all(operator.startswith('$') for operator in value):
+            if '$eq' in value:
+                equality.append(field)
+            elif _RANGE_OPERATORS.intersection(value):
+                ranges.append(field)
+        else:
+            nested_equality, nested_ranges = _selector_fields(value, field + '.')
+            equality += nested_equality
+            ranges += nested_ranges
+
+    return equality, ranges
+
+
+def _referenced_fields(selector, prefix=''):
+    """
+    :returns set of the fields a selector references outside $or, $nor and $not, which is what the query planner
+             compares with the fields of an index
+    """
+    fields = set()
+
+    for key, value in selector.items():
+        if key == '$and':
+            for clause in value:
+                fields |= _referenced_fields(clause, prefix)
+        elif key.startswith('$'):
+            continue
+        elif isinstance(value, dict) and value and not all(operator.startswith('$') for operator in value):
+            fields |= _referenced_fields(value, prefix + key + '.')
+        elif value != {'$exists': False}:
+            fields.add(prefix + key)
+
+    return fields
+
+
+def _sort_fields(sort):
+    fields = []
+    for item in sort or []:
+        fields.append(next(iter(item)) if isinstance(item, dict) else item)
+    return fields
+
+
+def _index_fields(index):
+    return [next(iter(field)) if isinstance(field, dict) else field
+            for field in index.get('def', {}).get('fields', [])]
+
+
+def suggest_index(query):
+    """
+    Suggests a json index for a Mango query: the fields the selector compares for equality, then the sort fields,
+    then the fields the selector compares with a range operator.
+
+    The query planner only uses a json index when the selector references every field of the index, so a query
+    that sorts on a field its selector does not reference must use the selector returned by suggest_selector.
+
+    :param dict query: Body of a Database.find request
+
+    :returns dict data for Database.save_index, or None if no field of the selector can be indexed
+    """
+    equality, ranges = _selector_fields(query.get('selector', {}))
+    sort = _sort_fields(query.get('sort'))
+
+    fields = []
+    for field in equality + sort + ranges:
+        if field not in fields:
+            fields.append(field)
+
+    if not fields:
+        return None
+
+    name = 'advisor-' + '-'.join(re.sub(r'[^A-Za-z0-9_]+', '_', field) for field in fields)
+    return {'index': {'fields': fields}, 'ddoc': name, 'name': name, 'type': 'json'}
+
+
+def suggest_selector(query):
+    """
+    Adds {"<field>": {"$exists": true}} to the selector of a Mango query for every sort field that the selector
+    does not reference, so that the index suggested by suggest_index can be used for the query.  Documents without
+    the field are not returned, just as when the query is sorted with an index.
+
+    :param dict query: Body of a Database.find request
+
+    :returns dict selector, or None if the selector already references every sort field
+    """
+    selector = query.get('selector', {})
+    referenced = _referenced_fields(selector)
+    missing = [field for field in _sort_fields(query.get('sort')) if field not in referenced]
+
+    if not missing:
+        return None
+
+    return {**selector, **{field: {'$exists': True} for field in missing}}
+
+
+class QueryReport():
+    """
+    Outcome of the analysis of a single Mango query by IndexAdvisor.
+
+    Attributes:
+    :param dict     query:              Body of the Database.find request
+    :param dict     index:              Index chosen by the query planner, as reported by Database.explain
+    :param bool     full_scan:          The query reads every document of the database through _all_docs
+    :param int      docs_examined:      Documents read by the query, from its execution_stats, or None
+    :param int      results_returned:   Documents returned by the query, from its execution_stats, or None
+    :param float    ratio:              Documents examined per document returned, or None
+    :param bool     slow:               The query does a full scan or examines more than max_ratio documents
+                                        per result
+    :param dict     suggestion:         Index definition for Database.save_index that should speed the query up,
+                                        or None
+    :param dict     selector:           Selector the query must use for the suggested index, or an existing index
+                                        with the same fields, to be picked, when it sorts on fields the selector
+                                        does not reference, or None.  See suggest_selector.
+    :param str      warning:            Warning returned by the server with the query results, if any
+    :param          error:              CouchError of a failed explain or find request, if any
+    """
+    def __init__(self, query, explain, stats, max_ratio, existing):
+        self.query = query
+        self.error = next((result for result in [explain, stats] if isinstance(result, couchapy.error.CouchError)), None)
+
+        explain = explain if isinstance(explain, dict) else {}
+        stats = stats if isinstance(stats, dict) else {}
+
+        self.index = explain.get('index', {})
+        self.full_scan = self.index.get('type') == 'special' and self.index.get('name') == '_all_docs'
+        self.warning = stats.get('warning')
+
+        execution_stats = stats.get('execution_stats', {})
+        self.docs_examined = execution_stats.get('total_docs_examined')
+        self.results_returned = execution_stats.get('results_returned')
+        self.ratio = self.docs_examined / max(self.results_returned, 1) \
+            if self.docs_examined is not None and self.results_returned is not None else None
+
+        self.slow = self.error is None and (self.full_scan or (self.ratio is not None and self.ratio > max_ratio))
+
+        self.suggestion = suggest_index(query) if self.slow else None
+        self.selector = suggest_selector(query) if self.suggestion is not None else None
+        if self.suggestion is not None and self.suggestion['index']['fields'] in existing:
+            # an index with the same fields exists, but the planner does not pick it for this query
+            self.suggestion = None
+
+    def __repr__(self):
+        return (f'QueryReport(selector={json.dumps(self.query.get("selector", {}))}, '
+                f'index={self.index.get("name")!r}, ratio={self.ratio}, slow={self.slow})')
+
+
+class IndexAdvisor():
+    """
+    Finds Mango queries that scan the whole database or examine many more documents than they return, and
+    suggests json indexes for them.
+
+    Every query is analysed with Database.explain, which reports the index picked by the query planner, and
+    with Database.find with execution_stats enabled, which reports the documents examined and returned.  The
+    responses are recorded, so that the analysis can be saved and repeated offline, e.g. in a CI job without
+    access to the database.
+
+    Analysing a query runs it; queries should carry the limit they are run with in production.
+
+    :param Database database:       Database the queries are run against, or None to analyse a recording
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param float    max_ratio:      Documents examined per document returned above which a query is reported as
+                                    slow. (Default: 10)
+    :param bool     execute:        Run every query with execution_stats in addition to explaining it.
+                                    (Default: True)
+    :param          recording:      Recording made by an earlier analysis, or the path of the JSON file it was
+                                    saved to (see save_recording), to analyse offline. (Default: None)
+
+    Usage Examples:
+      advisor = couchdb_instance.db.index_advisor()
+      reports = advisor.analyze([{'selector': {'type': 'order', 'status': 'shipped'}, 'sort': ['created']}])
+      for report in reports:
+          print(report.query, report.full_scan, report.ratio, report.suggestion, report.selector)
+      advisor.create_indexes(reports)
+      advisor.save_recording('queries.json')
+
+      offline = IndexAdvisor(recording='queries.json')
+      reports = offline.analyze()
+    """
+    def __init__(self, database=None, **kwargs):
+        self.database = database
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.max_ratio = kwargs.get('max_ratio', 10)
+        self.execute = kwargs.get('execute', True)
+
+        recording = kwargs.get('recording', None)
+        if isinstance(recording, str):
+            with open(recording) as file:
+                recording = json.load(file)
+
+        if database is None and recording is None:
+            raise ValueError('IndexAdvisor requires either a database or a recording')
+
+        self.recording = recording or {'indexes': None, 'queries': []}
+
+    def save_recording(self, path):
+        """
+        Saves the server responses of every analysed query to a JSON file.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.recording, file, indent=2)
+
+    @staticmethod
+    def _recordable(result):
+        if isinstance(result, couchapy.error.CouchError):
+            return {'error': result.error, 'reason': result.reason, 'status_code': result.status_code}
+        return result
+
+    @staticmethod
+    def _replayed(result):
+        if isinstance(result, dict) and 'status_code' in result and 'error' in result:
+            return couchapy.error.CouchError(**result)
+        return result
+
+    def _lookup(self, query):
+        return next((entry for entry in self.recording['queries'] if entry['query'] == query), None)
+
+    def _record(self, query):
+        entry = self._lookup(query)
+        if entry is not None or self.database is None:
+            return entry
+
+        explain = self.database.explain(uri_segments=self.uri_segments, data=query)
+        stats = None
+        if self.execute:
+            stats = self.database.find(uri_segments=self.uri_segments, data={**query, 'execution_stats': True})
+            if isinstance(stats, dict):
+                # the documents themselves are not needed for the analysis
+                stats = {key: value for key, value in stats.items() if key != 'docs'}
+
+        entry = {'query': query, 'explain': self._recordable(explain), 'find': self._recordable(stats)}
+        self.recording['queries'].append(entry)
+        return entry
+
+    def _existing_fields(self):
+        if self.recording.get('indexes') is None and self.database is not None:
+            self.recording['indexes'] = self._recordable(self.database.get_indices(uri_segments=self.uri_segments))
+
+        indexes = self.recording.get('indexes')
+        if not isinstance(indexes, dict) or 'indexes' not in indexes:
+            return []
+
+        return [_index_fields(index) for index in indexes['indexes'] if index.get('type') == 'json']
+
+    def analyze(self, queries=None):
+        """
+        :param list queries: Bodies of Database.find requests.  (Default: every query of the recording)
+
+        :returns list of QueryReport, in the order of queries
+        """
+        if queries is None:
+            queries = [entry['query'] for entry in self.recording['queries']]
+
+        existing = self._existing_fields()
+        reports = []
+
+        for query in queries:
+            entry = self._record(query)
+            if entry is None:
+                raise KeyError(f'The recording has no responses for the query {json.dumps(query)}')
+
+            reports.append(QueryReport(query, self._replayed(entry['explain']), self._replayed(entry['find']),
+                                       self.max_ratio, existing))
+
+        return reports
+
+    def create_indexes(self, reports, database=None):
+        """
+        Creates the suggested index of every slow query, once per distinct definition.
+
+        :param list     reports:    QueryReports returned by analyze
+        :param Database database:   Database the indexes are created in. (Default: the database of the advisor)
+
+        :returns list of the Database.save_index result of every index created
+        :returns CouchError if an error occured accessing the couch api, as an item of the list
+        """
+        database = database or self.database
+        if database is None:
+            raise ValueError('create_indexes requires a database')
+
+        created, results = [], []
+        for report in reports:
+            if report.suggestion is None or report.suggestion in created:
+                continue
+
+            created.append(report.suggestion)
+            results.append(database.save_index(uri_segments=self.uri_segments, data=report.suggestion))
+
+        return results
@@ -0,0 +1,291 @@
+import  asyncio
+from    functools import wraps
+import  time
+
+import  requests
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+import  couchapy.client
+import  couchapy.database
+import  couchapy.decorators
+import  couchapy.error
+import  couchapy.server
+import  couchapy.session
+
+
+async def _send(instance, spec, kwargs, uri, request_kwargs, timings):
+    def request(absolute_uri):
+        return instance.parent._transport.request(spec.method, absolute_uri, timings=timings, **request_kwargs)
+
+    return await instance.parent._dispatch(request, uri, kwargs.get('node'), spec.retry_policy(instance, kwargs),
+                                           spec.idempotent(kwargs))
+
+
+def _async_endpoint(spec):
+    """
+    Creates a coroutine function that performs the request declared by an endpoint and hands the
+    response to the same post-processing function used by the synchronous client.
+    """
+    @wraps(spec.fn)
+    async def wrapper(self, *query_params, **kwargs):
+        response_format = spec.response_format(self, kwargs)
+        if response_format in ['stream', 'rows']:
+            raise ValueError(f'The {response_format} response format is not supported by the async client')
+
+        uri, request_kwargs = spec.prepare(self, kwargs)
+        timings = {} if self.parent.observers else None
+        status_code, reason, headers, body = await _send(self, spec, kwargs, uri, request_kwargs, timings)
+
+        if response_format != 'json':
+            if timings is not None:
+                spec.observe(self, status_code, request_kwargs, len(body), timings)
+
+            return spec.raw(self, status_code, reason, headers, body if response_format == 'bytes' else memoryview(body))
+
+        def load_json():
+            if timings is None:
+                return self.parent._codec.loads(body)
+
+            start = time.perf_counter()
+            try:
+                return self.parent._codec.loads(body)
+            finally:
+                timings['decode'] = time.perf_counter() - start
+
+        couch_data = spec.process(self, status_code, reason, headers, load_json)
+
+        if timings is not None:
+            spec.observe(self, status_code, request_kwargs, len(body), timings)
+
+        policy = spec.retry_policy(self, kwargs) if spec.retry_docs else None
+        if policy is not None and isinstance(couch_data, list) and isinstance(kwargs.get('data'), dict):
+            couch_data = await policy.resend_failed_docs_async(
+                lambda data: wrapper(self, **{**kwargs, 'data': data, 'retry': False}), kwargs['data'], couch_data)
+
+        return spec.fn(self, couch_data)
+
+    wrapper.endpoint = spec
+    return wrapper
+
+
+def mirror(source):
+    """
+    Class decorator that adds an async counterpart of every endpoint declared on source.
+
+    Endpoints that the decorated class defines itself, and streaming endpoints, are left untouched.
+    """
+    def decorate(cls):
+        for name, attr in vars(source).items():
+            spec = getattr(attr, 'endpoint', None)
+
+            if isinstance(spec, couchapy.decorators.Endpoint) and not spec.stream and name not in vars(cls):
+                setattr(cls, name, _async_endpoint(spec))
+
+        return cls
+    return decorate
+
+
+@mirror(couchapy.session.Session)
+class AsyncSession():
+    """
+    Async counterpart of couchapy.session.Session.
+
+    This class is not intended to be instanced directly.
+    """
+    __init__ = couchapy.session.Session.__init__
+    set_auth_token_from_headers = couchapy.session.Session.set_auth_token_from_headers
+
+    async def renew_session(self):
+        """
+        Alias for get_session_info()
+        """
+        return await self.get_session_info()
+
+
+@mirror(couchapy.server.Server)
+class AsyncServer():
+    """
+    Async counterpart of couchapy.server.Server.
+
+    This class is not intended to be instanced directly.
+    """
+    __init__ = couchapy.server.Server.__init__
+
+
+@mirror(couchapy.database.Database)
+class AsyncDatabase():
+    """
+    Async counterpart of couchapy.database.Database.  The doc_cache option is not used by the async client.
+
+    This class is not intended to be instanced directly.
+    """
+    __init__ = couchapy.database.Database.__init__
+
+
+class AsyncTransport():
+    """
+    Non-blocking, pooled HTTP transport backed by aiohttp.
+
+    This class is not intended to be instanced directly.  Configure it through the transport_kwargs
+    argument of AsyncCouchDB.
+
+    :param int  pool_limit:     Maximum number of simultaneously open connections.  0 means no limit. (Default: 100)
+    :param int  pool_maxsize:   Maximum number of simultaneously open connections to a single host.
+                                0 means no limit. (Default: 0)
+    :param bool keep_alive:     Keep connections open between requests. (Default: True)
+    :param      timeout:        Total number of seconds allowed for a request. (Default: None)
+    """
+    def __init__(self, **kwargs):
+        if aiohttp is None:
+            raise ImportError('AsyncCouchDB requires aiohttp.  Install it with: pip install couchapy[async]')
+
+        self.pool_limit = kwargs.get('pool_limit', 100)
+        self.pool_maxsize = kwargs.get('pool_maxsize', 0)
+        self.keep_alive = kwargs.get('keep_alive', True)
+        self.timeout = kwargs.get('timeout', None)
+
+        self._session = None
+
+    def _get_session(self):
+        # aiohttp sessions must be created from within a running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit,
+                                             limit_per_host=self.pool_maxsize,
+                                             force_close=not self.keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  cookie_jar=aiohttp.DummyCookieJar(),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                                  trace_configs=[self._trace_config()])
+        return self._session
+
+    @staticmethod
+    def _trace_config():
+        # records the time spent opening connections of requests made with a timings dict
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx['connect'] = time.perf_counter() - context.connect_start
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+    async def request(self, method, uri, timings=None, **kwargs):
+        """
+        :param dict timings: When given, receives the seconds spent opening a connection (connect), waiting for the
+                             response headers (wait) and reading the response body (download)
+
+        :returns tuple (status code, reason, headers, body)
+        """
+        # encode query parameters exactly as the synchronous transport does
+        prepared = requests.PreparedRequest()
+        prepared.prepare_url(uri, kwargs.pop('params', None))
+
+        cookies = {k: v for k, v in (kwargs.pop('cookies', None) or {}).items() if v is not None}
+
+        start = time.perf_counter()
+        async with self._get_session().request(method.upper(), prepared.url, cookies=cookies,
+                                               trace_request_ctx=timings, **kwargs) as response:
+            headers_received = time.perf_counter()
+            body = await response.read()
+
+            if timings is not None:
+                timings.setdefault('connect', 0.0)
+                timings['wait'] = max(headers_received - start - timings['connect'], 0.0)
+                timings['download'] = time.perf_counter() - headers_received
+
+            return response.status, response.reason, response.headers, body
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncCouchDB(couchapy.client.BaseClient):
+    """
+    Exposes an asyncio interface for interacting with a CouchDB server's REST API.
+
+    Every endpoint of the server, db and session namespaces of CouchDB is available as a coroutine
+    with the same name and arguments.  Options are read, and requests routed to nodes and retried, by
+    couchapy.client.BaseClient, exactly as for CouchDB.  Requires the optional aiohttp dependency.
+
+    :param str  host:               Address that the CouchDB server is served from. (Default: http://127.0.0.1)
+    :param int  port:               Port number that the CouchDB server is listening on. (Default: 5984)
+
+    :param str  name:               Username used to authenticate to the CouchDB server. (Default: None)
+    :param str  password:           Password used to authenticate to the CouchDB server. (Default: None)
+
+    :param bool auto_connect:       Determines if an authentication attempt will be made when entering an
+                                    async with block. (Default: False)
+
+    :param dict transport_kwargs:   Connection pool settings.  See couchapy.aio.AsyncTransport. (Default: {})
+    :param      codec:              JSON codec used for request and response bodies.  See couchapy.codec.get_codec.
+                                    (Default: 'json')
+    :param str  response_format:    Default response format of every endpoint: json, bytes or memoryview.
+                                    See couchapy.decorators.Endpoint. (Default: 'json')
+    :param dict compression_kwargs: Request body compression settings.  See couchapy.compression.Compressor.
+                                    (Default: None)
+    :param list observers:          Callables receiving the couchapy.metrics.RequestMetrics of every request.
+                                    (Default: [])
+    :param dict retry_kwargs:       Retry settings.  See couchapy.retry.RetryPolicy.  None disables retries.
+                                    (Default: None)
+    :param list nodes:              Addresses of the cluster nodes to spread requests across.  See
+                                    couchapy.CouchDB. (Default: None)
+    :param dict cluster_kwargs:     Load balancing settings.  See couchapy.cluster.NodePool. (Default: {})
+
+    Usage Examples:
+      async with AsyncCouchDB(name=<user>, password=<password>, auto_connect=True) as couch:
+          doc = await couch.db.get_doc(uri_segments={'db': 'somedb', 'docid': 'somedoc'})
+    """
+
+    transport_class = AsyncTransport
+    asynchronous = True
+
+    def __init__(self, **kwargs):
+        self._auto_connect = kwargs.get('auto_connect', False)
+        self._probes = set()
+
+        super().__init__(**kwargs)
+
+        self.session = AsyncSession(self, **kwargs)
+        self.server = AsyncServer(self, **kwargs.get('server_kwargs', {}))
+        self.db = AsyncDatabase(self, **kwargs.get('database_kwargs', {}))
+
+    async def __aenter__(self):
+        if self._auto_connect is True and self.session.basic_auth is False:
+            await self.session.authenticate(data={'name': self.name, 'password': self.password})
+
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Releases every pooled connection held by this instance.
+        """
+        for task in list(self._probes):
+            task.cancel()
+        await self._transport.close()
+
+    def _probe_node(self, node):
+        # health checks run as separate tasks so that the request which triggered them is not delayed
+        async def probe():
+            try:
+                healthy = not isinstance(await self.server.server_status(node=node.base_uri, retry=False),
+                                         couchapy.error.CouchError)
+            except Exception:
+                healthy = False
+            self._nodes.probed(node, healthy)
+
+        task = asyncio.ensure_future(probe())
+        self._probes.add(task)
+        task.add_done_callback(self._probes.discard)
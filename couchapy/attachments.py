@@ -0,0 +1,82 @@
+import  os
+
+import  requests
+
+import  couchapy.error
+
+
+def _writer(dest):
+    """
+    :returns callable writing one chunk to dest
+    """
+    if hasattr(dest, 'write'):
+        return dest.write
+    if hasattr(dest, 'sendall'):
+        return dest.sendall
+    if callable(dest):
+        return dest
+
+    raise TypeError('dest must be a file path, a writable file object, a socket or a callable')
+
+
+def download(endpoint, codec, dest, chunk_size=65536, **kwargs):
+    """
+    Streams an attachment into dest, one chunk at a time.
+
+    This function is not intended to be called directly.  See Database.download_attachment.
+
+    :param callable endpoint:   Bound attachment endpoint, e.g. Database.get_attachment
+    :param          codec:      JSON codec used to decode error responses
+    :param          dest:       File path, writable binary file object, connected socket, or callable receiving
+                                every chunk
+    :param int      chunk_size: Maximum number of bytes read at a time. (Default: 65536)
+
+    :returns dict with the content_type, length and digest of the attachment
+    :returns CouchError if an error occured accessing the couch api
+    """
+    headers = {'Accept': '*/*', **kwargs.pop('headers', {})}
+
+    with endpoint(response_format='stream', headers=headers, **kwargs) as response:
+        if response.status_code != requests.codes['ok']:
+            return couchapy.error.from_raw_response(response, codec)
+
+        if isinstance(dest, (str, os.PathLike)):
+            with open(dest, 'wb') as file:
+                length = _copy(response, file.write, chunk_size)
+        else:
+            length = _copy(response, _writer(dest), chunk_size)
+
+        return {'content_type': response.headers.get('Content-Type'),
+                'length': length,
+                'digest': response.headers.get('Content-MD5')}
+
+
+def _copy(response, write, chunk_size):
+    length = 0
+    for chunk in response.iter_chunks(chunk_size):
+        write(chunk)
+        length += len(chunk)
+    return length
+
+
+def upload(endpoint, source, content_type, **kwargs):
+    """
+    Streams an attachment from source to the server without reading it into memory.
+
+    This function is not intended to be called directly.  See Database.upload_attachment.
+
+    :param callable endpoint:       Bound attachment endpoint, e.g. Database.save_attachment
+    :param          source:         File path, readable binary file object, bytes, or iterator of bytes.  Iterators
+                                    are sent with chunked transfer encoding.
+    :param str      content_type:   MIME type of the attachment
+
+    :returns dict with the id and new rev of the document
+    :returns CouchError if an error occured accessing the couch api
+    """
+    headers = {'Content-Type': content_type, **kwargs.pop('headers', {})}
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            return endpoint(body=file, headers=headers, **kwargs)
+
+    return endpoint(body=source, headers=headers, **kwargs)
@@ -0,0 +1,345 @@
+import  asyncio
+from    concurrent.futures import Future, ThreadPoolExecutor
+import  threading
+import  time
+
+import  couchapy.error
+
+
+class BulkWriter():
+    """
+    Buffers documents and saves them in chunks with concurrent Database.bulk_save requests.
+
+    A chunk is sent as soon as the buffer reaches max_docs documents or max_bytes of encoded JSON,
+    or when its oldest document has waited flush_interval seconds.  Up to max_workers chunks are
+    sent at the same time over the pooled transport; add blocks while more chunks than that are
+    waiting to be sent.
+
+    Results are returned in the order the documents were added.  Each result is the per-document
+    result reported by CouchDB (including conflict and forbidden errors), or the CouchError of the
+    request if the whole chunk failed.  A chunk that could not be sent at all, e.g. because the
+    connection failed, reports a CouchError with the name and message of the exception and no
+    status_code.
+
+    This class is not intended to be instanced directly.  See Database.bulk_writer.
+
+    :param Database database:       Database the documents are saved to
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param dict     data:           Additional _bulk_docs options, e.g. {'new_edits': False}. (Default: {})
+    :param int      max_docs:       Maximum number of documents per chunk. (Default: 500)
+    :param int      max_bytes:      Maximum encoded size of a chunk, in bytes.  None disables the size check,
+                                    which avoids encoding every document twice. (Default: 4194304)
+    :param float    flush_interval: Maximum number of seconds a document stays buffered.  None disables the
+                                    timer. (Default: None)
+    :param int      max_workers:    Number of chunks sent concurrently. (Default: 4)
+
+    Usage Examples:
+      with couchdb_instance.db.bulk_writer(uri_segments={'db': 'somedb'}) as writer:
+          for doc in docs:
+              writer.add(doc)
+      results = writer.results
+    """
+    def __init__(self, database, **kwargs):
+        self.database = database
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.data = kwargs.get('data', {})
+        self.max_docs = kwargs.get('max_docs', 500)
+        self.max_bytes = kwargs.get('max_bytes', 4194304)
+        self.flush_interval = kwargs.get('flush_interval', None)
+        self.max_workers = kwargs.get('max_workers', 4)
+
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+        self._chunks = []
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_since = None
+        self._count = 0
+        self._results = None
+        self._closed = False
+
+        self._stop_timer = threading.Event()
+        self._timer = None
+        if self.flush_interval is not None:
+            self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def add(self, doc):
+        """
+        Buffers a document to be saved.
+
+        :returns int Position of the document's result in results
+        """
+        size = len(self.database.parent._codec.dumps(doc)) + 1 if self.max_bytes is not None else 0
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Cannot add documents to a closed BulkWriter')
+
+            if self._buffer and self.max_bytes is not None and self._buffer_bytes + size > self.max_bytes:
+                self._flush()
+
+            if not self._buffer:
+                self._buffer_since = time.monotonic()
+
+            self._buffer.append(doc)
+            self._buffer_bytes += size
+            index = self._count
+            self._count += 1
+
+            if len(self._buffer) >= self.max_docs:
+                self._flush()
+
+            return index
+
+    def flush(self):
+        """
+        Sends every buffered document without waiting for the response.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+
+        # apply back pressure instead of buffering an unbounded number of chunks
+        self._in_flight.acquire()
+
+        start = self._count - len(self._buffer)
+        docs = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_since = None
+
+        future = self._executor.submit(self._save, docs)
+        future.add_done_callback(lambda _: self._in_flight.release())
+        self._chunks.append((start, len(docs), future))
+
+    def _save(self, docs):
+        data = dict(self.data)
+        data['docs'] = docs
+        return self.database.bulk_save(uri_segments=self.uri_segments, data=data)
+
+    def _flush_periodically(self):
+        while not self._stop_timer.wait(min(self.flush_interval, 0.05)):
+            with self._lock:
+                if self._buffer_since is not None and time.monotonic() - self._buffer_since >= self.flush_interval:
+                    self._flush()
+
+    def close(self):
+        """
+        Sends every buffered document and waits for all chunks to complete.
+
+        :returns list Per-document results, in the order the documents were added
+        """
+        with self._lock:
+            if self._closed:
+                return self._results
+
+            self._closed = True
+            self._flush()
+
+        self._stop_timer.set()
+        self._executor.shutdown(wait=True)
+
+        results = [None] * self._count
+        for start, length, future in self._chunks:
+            exception = future.exception()
+            # a chunk that could not be sent fails on its own; the results of the other chunks are kept
+            response = future.result() if exception is None else \
+                couchapy.error.CouchError(error=type(exception).__name__, reason=str(exception))
+
+            if isinstance(response, couchapy.error.CouchError):
+                results[start:start + length] = [response] * length
+            else:
+                # new_edits=false returns no per-document results
+                for offset, result in enumerate(response[:length]):
+                    results[start + offset] = result
+
+        self._chunks = []
+        self._results = results
+        return results
+
+    @property
+    def results(self):
+        """
+        Per-document results, in the order the documents were added.  Available once the writer is closed.
+        """
+        return self._results
+
+
+class BulkLoader():
+    """
+    Batches individual document lookups into _bulk_get requests, in the style of a DataLoader.
+
+    Ids requested within batch_window seconds of each other, up to batch_size ids, are fetched with a
+    single Database.bulk_get request and each result is delivered to its caller.  Ids that are requested
+    more than once within a batch are only fetched once.  Lookups can be made from any number of threads
+    or asyncio tasks.
+
+    This class is not intended to be instanced directly.  See Database.bulk_loader.
+
+    :param Database database:       Database the documents are read from
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param dict     params:         _bulk_get query parameters, e.g. {'revs': True}. (Default: {})
+    :param int      batch_size:     Maximum number of ids per request. (Default: 100)
+    :param float    batch_window:   Seconds to wait for more ids after the first id of a batch. (Default: 0.005)
+    :param int      max_workers:    Number of batches fetched concurrently. (Default: 4)
+
+    Usage Examples:
+      with couchdb_instance.db.bulk_loader(uri_segments={'db': 'somedb'}) as loader:
+          doc = loader.get('somedoc')                   # from a thread
+          doc = await loader.load_async('somedoc')      # from an asyncio task
+    """
+    def __init__(self, database, **kwargs):
+        self.database = database
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.params = kwargs.get('params', {})
+        self.batch_size = kwargs.get('batch_size', 100)
+        self.batch_window = kwargs.get('batch_window', 0.005)
+        self.max_workers = kwargs.get('max_workers', 4)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._condition = threading.Condition()
+        self._batch = {}
+        self._batch_since = None
+        self._closed = False
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def load(self, docid):
+        """
+        Schedules a document lookup.
+
+        :returns Future resolving to the document, or a CouchError if it could not be read
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Cannot load documents with a closed BulkLoader')
+
+            future = self._batch.get(docid)
+            if future is None:
+                future = Future()
+                self._batch[docid] = future
+
+                if self._batch_since is None:
+                    self._batch_since = time.monotonic()
+
+                if len(self._batch) >= self.batch_size:
+                    self._executor.submit(self._fetch, self._take_batch())
+                else:
+                    self._condition.notify()
+
+            return future
+
+    def get(self, docid):
+        """
+        Blocking lookup of a single document.
+
+        :returns dict the document
+        :returns CouchError if the document could not be read
+        """
+        return self.load(docid).result()
+
+    def get_many(self, docids):
+        """
+        Blocking lookup of several documents.
+
+        :returns list Documents or CouchErrors, in the order of docids
+        """
+        return [future.result() for future in [self.load(docid) for docid in docids]]
+
+    async def load_async(self, docid):
+        """
+        Lookup of a single document from an asyncio task.  The event loop is not blocked while waiting.
+
+        :returns dict the document
+        :returns CouchError if the document could not be read
+        """
+        return await asyncio.wrap_future(self.load(docid))
+
+    def _take_batch(self):
+        batch = self._batch
+        self._batch = {}
+        self._batch_since = None
+        return batch
+
+    def _dispatch(self):
+        with self._condition:
+            while True:
+                if self._batch and not self._closed:
+                    remaining = self._batch_since + self.batch_window - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+
+                if self._batch:
+                    self._executor.submit(self._fetch, self._take_batch())
+                elif self._closed:
+                    return
+                else:
+                    self._condition.wait()
+
+    def _fetch(self, batch):
+        try:
+            response = self.database.bulk_get(uri_segments=self.uri_segments, params=self.params,
+                                              data={'docs': [{'id': docid} for docid in batch]})
+        except Exception as exception:
+            for future in batch.values():
+                future.set_exception(exception)
+            return
+
+        if isinstance(response, couchapy.error.CouchError):
+            for future in batch.values():
+                future.set_result(response)
+            return
+
+        for result in response.get('results', []):
+            future = batch.pop(result.get('id'), None)
+            if future is not None:
+                future.set_result(_bulk_get_result(result))
+
+        for future in batch.values():
+            future.set_result(couchapy.error.CouchError(error='not_found', reason='missing', status_code=404))
+
+    def close(self):
+        """
+        Fetches every pending lookup and releases the worker threads.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+
+def _bulk_get_result(result):
+    """
+    Converts one entry of a _bulk_get response into a document or a CouchError.
+    """
+    error = None
+    for doc in result.get('docs', []):
+        if 'ok' in doc:
+            return doc['ok']
+
+        error = error or doc.get('error', {})
+
+    error = error or {}
+    return couchapy.error.CouchError(error=error.get('error'), reason=error.get('reason'),
+                                     status_code=404 if error.get('error') == 'not_found' else None)
@@ -0,0 +1,288 @@
+from    collections import OrderedDict
+import  threading
+import  time
+
+import  couchapy.error
+
+
+class CacheEntry():
+    def __init__(self, body, etag, size):
+        self.body = body
+        self.etag = etag
+        self.size = size
+        self.validated_at = time.monotonic()
+
+
+class DocumentCache():
+    """
+    Thread-safe, least recently used cache of documents keyed by (database name, document id).
+
+    Entries younger than ttl seconds are served without contacting the server.  Older entries are
+    revalidated with a conditional GET (If-None-Match) and served from the cache when the server
+    answers 304 Not Modified.
+
+    Documents are cached as their encoded response bodies and decoded on every hit, so that callers never
+    share, or modify, the cached copy.
+
+    Every eviction is recorded with an increasing generation, so that a body read before a document was
+    evicted, e.g. by a write or a change of the _changes feed while the read was in flight, is not cached
+    afterwards.  Reads pass the generation() they started at to put().  The evictions of the max_entries
+    most recently evicted documents are remembered; older ones conservatively drop every body read before them.
+
+    This class is not intended to be instanced directly.  Enable it with the doc_cache key of
+    database_kwargs, e.g. CouchDB(database_kwargs={'db': 'somedb', 'doc_cache': {'max_entries': 5000}}).
+
+    :param int   max_entries:   Maximum number of cached documents. (Default: 1000)
+    :param int   max_bytes:     Maximum combined size of the cached response bodies.  None means no limit.
+                                (Default: None)
+    :param float ttl:           Seconds during which a cached document is served without revalidation.
+                                0 revalidates on every read. (Default: 0)
+    """
+    def __init__(self, **kwargs):
+        self.max_entries = kwargs.get('max_entries', 1000)
+        self.max_bytes = kwargs.get('max_bytes', None)
+        self.ttl = kwargs.get('ttl', 0)
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self._generation = 0
+        # generation of the last eviction of each recently evicted key
+        self._evictions = OrderedDict()
+        # bodies read before this generation are not cached, since their eviction is no longer remembered
+        self._evicted_before = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def size(self):
+        """
+        Combined size, in bytes, of the cached response bodies.
+        """
+        return self._bytes
+
+    def get(self, key):
+        """
+        :returns CacheEntry or None if the key is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry):
+        return time.monotonic() - entry.validated_at < self.ttl
+
+    def generation(self):
+        """
+        :returns int current eviction generation, to pass to put() along with a body read from now on
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, key, body, etag, size=0, generation=None):
+        """
+        :param int generation:  generation() before the body was read.  The body is not cached if the key was
+                                evicted since.  None caches it unconditionally. (Default: None)
+        """
+        with self._lock:
+            if generation is not None and self._evicted_since(key, generation):
+                return
+
+            self._remove(key)
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = CacheEntry(body, etag, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def touch(self, key):
+        """
+        Marks a cached document as validated now, e.g. after a 304 Not Modified response.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.validated_at = time.monotonic()
+
+    def evict(self, key):
+        """
+        Drops a document from the cache, along with any body of it that is still being read.
+        """
+        with self._lock:
+            self._remove(key)
+
+            self._generation += 1
+            self._evictions[key] = self._generation
+            self._evictions.move_to_end(key)
+            while len(self._evictions) > self.max_entries:
+                self._evicted_before = self._evictions.popitem(last=False)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+            self._generation += 1
+            self._evictions.clear()
+            self._evicted_before = self._generation
+
+    def _evicted_since(self, key, generation):
+        return generation < self._evicted_before or self._evictions.get(key, 0) > generation
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+def _seq_number(seq):
+    """
+    Numeric prefix of an update sequence, e.g. 42 for '42-g1AAAA...'.  None for opaque sequences.
+    """
+    try:
+        return int(str(seq).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+class CacheInvalidator():
+    """
+    Follows a database's _changes feed on a background thread, starting from its current update_seq,
+    and evicts (or refreshes) cached documents as soon as they change.  With an invalidator running,
+    the ttl of the cache can be raised to serve reads locally with staleness bounded by the feed's
+    latency instead of the ttl.
+
+    The whole cache is flushed whenever changes may have been missed: when the feed falls more than
+    max_pending changes behind, when the update sequence goes backwards (e.g. the database was
+    recreated), or when the feed fails.
+
+    This class is not intended to be instanced directly.  See Database.cache_invalidator.
+
+    :param Database      database:      Database whose feed is followed
+    :param DocumentCache cache:         Cache to invalidate. (Default: database.doc_cache)
+    :param dict          uri_segments:  Dynamic URI segments. (Default: {})
+    :param bool          refresh:       Re-read changed documents that are cached instead of evicting them. (Default: False)
+    :param int           poll_timeout:  Milliseconds a longpoll request waits for changes before it is re-issued.
+                                        (Default: 60000)
+    :param int           batch_size:    Maximum number of changes per request. (Default: 1000)
+    :param int           max_pending:   Number of pending changes above which the cache is flushed instead of
+                                        catching up. (Default: 10000)
+    :param float         retry_delay:   Seconds to wait after the feed fails before starting over. (Default: 5)
+    """
+    def __init__(self, database, **kwargs):
+        self.database = database
+        self.cache = kwargs.get('cache', database.doc_cache)
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.refresh = kwargs.get('refresh', False)
+        self.poll_timeout = kwargs.get('poll_timeout', 60000)
+        self.batch_size = kwargs.get('batch_size', 1000)
+        self.max_pending = kwargs.get('max_pending', 10000)
+        self.retry_delay = kwargs.get('retry_delay', 5)
+
+        if self.cache is None:
+            raise ValueError('CacheInvalidator requires a document cache.  Enable the doc_cache database option.')
+
+        self.db_name = {**database._predefined_segments, **self.uri_segments}.get('db')
+        self.last_seq = None
+
+        self._stop = threading.Event()
+        self._worker = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def start(self):
+        if not self.running:
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._follow, daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops following the feed.  The worker thread exits once the current longpoll request returns.
+
+        :param float timeout: Seconds to wait for the worker thread to exit.  0 does not wait. (Default: None)
+        """
+        self._stop.set()
+        if self._worker is not None and timeout != 0:
+            self._worker.join(timeout)
+
+    def flush(self):
+        self.cache.clear()
+
+    def _current_seq(self):
+        info = self.database.get(uri_segments=self.uri_segments)
+        return None if isinstance(info, couchapy.error.CouchError) else info.get('update_seq')
+
+    def _apply(self, row):
+        key = (self.db_name, row.get('id'))
+        cached = key in self.cache
+
+        # evicted even when not cached, so that a read of the document still in flight is not cached
+        self.cache.evict(key)
+        if cached and self.refresh and not row.get('deleted', False):
+            self.database.get_doc(uri_segments={**self.uri_segments, 'docid': row.get('id')})
+
+    def _poll(self):
+        """
+        Reads one batch of changes.
+
+        :returns bool False if changes may have been missed and the cache had to be flushed
+        """
+        feed = self.database.iter_changes(uri_segments=self.uri_segments,
+                                          params={'feed': 'longpoll', 'since': self.last_seq,
+                                                  'timeout': self.poll_timeout, 'limit': self.batch_size})
+        previous = _seq_number(self.last_seq)
+
+        for row in feed:
+            if isinstance(row, couchapy.error.CouchError):
+                return False
+            self._apply(row)
+
+        current = _seq_number(feed.last_seq)
+        if previous is not None and current is not None and current < previous:
+            return False
+
+        if (feed.pending or 0) > self.max_pending:
+            return False
+
+        self.last_seq = feed.last_seq
+        return True
+
+    def _follow(self):
+        while not self._stop.is_set():
+            try:
+                if self.last_seq is None:
+                    self.last_seq = self._current_seq()
+                    if self.last_seq is None:
+                        raise ConnectionError('Unable to read the update sequence of the database')
+
+                if self._poll():
+                    continue
+            except Exception:
+                pass
+
+            # changes may have been missed; start over from the current sequence with an empty cache
+            self.flush()
+            self.last_seq = None
+            self._stop.wait(self.retry_delay)
@@ -0,0 +1,114 @@
+import  time
+
+import  requests
+
+import  couchapy.error
+import  couchapy.stream
+
+
+class ChangesFeed():
+    """
+    Iterates the rows of a database's _changes feed while reading the response incrementally, so
+    that memory use stays constant regardless of the number of changes.
+
+    Normal and longpoll feeds (a results array) and continuous feeds (newline-delimited rows) are
+    supported.  Heartbeats are skipped.  The sequence of the most recently yielded row is tracked in
+    last_seq, and the feed resumes from it when the connection drops.
+
+    This class is not intended to be instanced directly.  See Database.iter_changes.
+
+    :param Database database:           Database whose feed is read
+    :param dict     params:             Query parameters.  See AllowedKeys.DATABASE__CHANGES__PARAMS
+    :param dict     data:               Request body, e.g. {'doc_ids': [...]}.  When provided, the feed is
+                                        requested with POST. (Default: None)
+    :param dict     uri_segments:       Dynamic URI segments, e.g. {'db': 'somedb'}. (Default: {})
+    :param bool     follow:             Issue a new request from last_seq whenever the server ends a
+                                        longpoll or continuous feed, e.g. because of its timeout. (Default: False)
+    :param int      reconnect_attempts: Number of consecutive reconnection attempts made after the connection
+                                        drops before giving up. (Default: 3)
+    :param float    reconnect_delay:    Seconds to wait before reconnecting. (Default: 1)
+
+    Attributes:
+    :param          last_seq:           Sequence of the most recently read change, or the last_seq reported by
+                                        the server.  Pass it as the since parameter to resume later.
+    :param int      pending:            Number of changes remaining after the last completed request, if known.
+
+    :yields dict for every change row
+    :yields CouchError if an error occured accessing the couch api, after which iteration stops
+    """
+    def __init__(self, database, **kwargs):
+        self.database = database
+        self.params = dict(kwargs.get('params', {}))
+        self.data = kwargs.get('data', None)
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.follow = kwargs.get('follow', False)
+        self.reconnect_attempts = kwargs.get('reconnect_attempts', 3)
+        self.reconnect_delay = kwargs.get('reconnect_delay', 1)
+
+        self.last_seq = self.params.get('since', None)
+        self.pending = None
+
+    @property
+    def continuous(self):
+        return self.params.get('feed', 'normal') == 'continuous'
+
+    def _request(self):
+        params = dict(self.params)
+        if self.last_seq is not None:
+            params['since'] = self.last_seq
+
+        if self.data is not None:
+            return self.database._filtered_changes_stream(uri_segments=self.uri_segments, params=params, data=self.data)
+
+        return self.database._changes_stream(uri_segments=self.uri_segments, params=params)
+
+    def _rows(self, response):
+        chunks = response.iter_content(chunk_size=None)
+        codec = self.database.parent._codec
+
+        if self.continuous:
+            for line in couchapy.stream.iter_lines(chunks):
+                if not line.strip():
+                    continue  # heartbeat
+
+                row = codec.loads(line)
+                if 'last_seq' in row and 'changes' not in row:
+                    self.last_seq = row['last_seq']
+                    self.pending = row.get('pending', self.pending)
+                else:
+                    yield row
+        else:
+            rows = couchapy.stream.JsonArrayStream(chunks, array_keys=['results'], codec=codec)
+            yield from rows
+
+            self.last_seq = rows.meta.get('last_seq', self.last_seq)
+            self.pending = rows.meta.get('pending', self.pending)
+
+    def __iter__(self):
+        failures = 0
+
+        while True:
+            try:
+                response = self._request()
+
+                if isinstance(response, couchapy.error.CouchError):
+                    yield response
+                    return
+
+                with response:
+                    for row in self._rows(response):
+                        failures = 0
+                        self.last_seq = row.get('seq', self.last_seq)
+                        yield row
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                failures += 1
+                if failures > self.reconnect_attempts:
+                    raise
+
+                time.sleep(self.reconnect_delay)
+                continue
+
+            if not self.follow or self.params.get('feed', 'normal') == 'normal':
+                return
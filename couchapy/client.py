@@ -0,0 +1,104 @@
+import  couchapy.cluster
+import  couchapy.codec
+import  couchapy.compression
+import  couchapy.retry
+import  couchapy.transport
+
+
+class BaseClient():
+    """
+    Settings and request routing shared by CouchDB and couchapy.aio.AsyncCouchDB, so that both clients read their
+    options, and send their requests, the same way.  See CouchDB for the supported options.
+
+    Subclasses set transport_class and asynchronous, and implement _probe_node, which the node pool calls to
+    health check a node that failed.
+
+    This class is not intended to be instanced directly.
+    """
+    transport_class = couchapy.transport.Transport
+    # True when transport_class.request, and therefore _dispatch, return coroutines
+    asynchronous = False
+
+    def __init__(self, **kwargs):
+        self._headers = {
+            'Content-type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+        self.custom_headers = kwargs.get('custom_headers', {})  # TODO: implement
+
+        self.host = kwargs.get('host', 'http://127.0.0.1')
+        self.port = kwargs.get('port', 5984)
+
+        self.name = kwargs.get('name', None)
+        self.password = kwargs.get('password', None)
+
+        # a single pooled transport is shared by every endpoint so that connections are reused between requests
+        self._transport = self.transport_class(**kwargs.get('transport_kwargs', {}))
+        self._codec = couchapy.codec.get_codec(kwargs.get('codec', 'json'))
+        self.response_format = kwargs.get('response_format', 'json')
+
+        self.observers = list(kwargs.get('observers', []))
+
+        retry_kwargs = kwargs.get('retry_kwargs', None)
+        self._retry_policy = couchapy.retry.RetryPolicy(**retry_kwargs) if retry_kwargs is not None else None
+
+        nodes = kwargs.get('nodes', None)
+        self._nodes = couchapy.cluster.NodePool(nodes, probe=self._probe_node, **kwargs.get('cluster_kwargs', {})) \
+            if nodes else None
+
+        compression_kwargs = kwargs.get('compression_kwargs', None)
+        self._compressor = couchapy.compression.Compressor(**compression_kwargs) if compression_kwargs is not None else None
+        if self._compressor is not None:
+            self._headers['Accept-Encoding'] = self._compressor.accept_encoding
+
+    # the host:port prefix shared by every endpoint URI is rebuilt only when either part changes
+    @property
+    def host(self):
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        self._host = host
+        self._base_uri = f'{host}:{getattr(self, "_port", "")}'
+
+    @property
+    def port(self):
+        return self._port
+
+    @port.setter
+    def port(self, port):
+        self._port = port
+        self._base_uri = f'{getattr(self, "_host", "")}:{port}'
+
+    def _probe_node(self, node):
+        raise NotImplementedError
+
+    def _dispatch(self, request, uri, node=None, policy=None, idempotent=False):
+        """
+        Sends a request to node, to the next node of the cluster, or to host and port, retrying it with policy.
+
+        :param callable    request:     Called with the absolute URI to send the request to; sends it with the transport
+        :param str         uri:         URI of the request, starting with the host:port prefix of the client
+        :param str         node:        Base URI of the node to send the request to, bypassing the cluster. (Default: None)
+        :param RetryPolicy policy:      Retry policy of the request.  None sends it once. (Default: None)
+        :param bool        idempotent:  Whether the request is safe to repeat. (Default: False)
+
+        :returns the response returned by request, or a coroutine returning it for the asynchronous client
+        """
+        # the host:port prefix is swapped for the node the request is sent to
+        path = uri[len(self._base_uri):]
+
+        def request_node(base_uri):
+            return request(base_uri + path)
+
+        def send():
+            if node is not None:
+                return request_node(node.rstrip('/'))
+            if self._nodes is not None:
+                return self._nodes.call_async(request_node) if self.asynchronous else self._nodes.call(request_node)
+            return request(uri)
+
+        if policy is None:
+            return send()
+        return policy.call_async(send, idempotent) if self.asynchronous else policy.call(send, idempotent)
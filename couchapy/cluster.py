@@ -0,0 +1,206 @@
+import  itertools
+import  random
+import  threading
+import  time
+
+
+class Node():
+    """
+    A CouchDB node and the load balancing state of the client for it.
+
+    Attributes:
+    :param str   base_uri:      Address of the node, e.g. http://10.0.0.1:5984
+    :param int   outstanding:   Number of requests in flight
+    :param float latency:       Exponentially weighted moving average of the response time, in seconds, or None
+                                before the first response
+    :param bool  healthy:       False while the node is ejected
+    """
+    def __init__(self, base_uri):
+        self.base_uri = base_uri.rstrip('/')
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.healthy = True
+        self.next_probe = 0.0
+
+    def __repr__(self):
+        return f'Node({self.base_uri!r})'
+
+
+class RoundRobin():
+    """
+    Sends requests to every node in turn.
+    """
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, nodes):
+        return nodes[next(self._counter) % len(nodes)]
+
+
+class LeastOutstanding():
+    """
+    Sends requests to the node with the fewest requests in flight, picking at random between ties.
+    """
+    def choose(self, nodes):
+        return min(nodes, key=lambda node: (node.outstanding, random.random()))
+
+
+class LatencyWeighted():
+    """
+    Picks nodes at random, weighted by the inverse of their average response time multiplied by their number
+    of requests in flight, so that slow or busy nodes receive less traffic without being starved of the
+    requests that measure their recovery.  Nodes without measurements are weighted as the fastest node.
+    """
+    def choose(self, nodes):
+        measured = [node.latency for node in nodes if node.latency is not None]
+        fastest = min(measured) if measured else 1.0
+
+        weights = [1 / (max(node.latency if node.latency is not None else fastest, 1e-6) * (node.outstanding + 1))
+                   for node in nodes]
+        return random.choices(nodes, weights)[0]
+
+
+STRATEGIES = {'round_robin': RoundRobin, 'least_outstanding': LeastOutstanding, 'latency_weighted': LatencyWeighted}
+
+
+class NodePool():
+    """
+    Spreads the requests of a client across several CouchDB nodes and ejects the nodes that fail.
+
+    A node is ejected after max_failures consecutive connection errors, timeouts or 502, 503 and 504 responses.
+    Ejected nodes receive no requests; they are probed with Server.server_status (GET /_up) every probe_interval
+    seconds and readmitted as soon as a probe succeeds.  When every node is ejected, requests are spread across
+    all of them rather than failing outright.
+
+    This class is not intended to be instanced directly.  Configure it through the nodes and cluster_kwargs
+    arguments of CouchDB.
+
+    :param list     nodes:          Node addresses, e.g. ['http://10.0.0.1:5984', 'http://10.0.0.2:5984']
+    :param callable probe:          Called with every ejected Node that is due for a health check
+    :param          strategy:       'round_robin', 'least_outstanding', 'latency_weighted', or an object with a
+                                    choose(nodes) method returning one of the given healthy nodes.
+                                    (Default: 'round_robin')
+    :param int      max_failures:   Consecutive failures after which a node is ejected. (Default: 3)
+    :param float    probe_interval: Seconds between two health checks of an ejected node. (Default: 5)
+    :param float    latency_decay:  Weight of the newest response time in the latency average. (Default: 0.3)
+    """
+    failure_statuses = {502, 503, 504}
+
+    def __init__(self, nodes, probe=None, **kwargs):
+        if not nodes:
+            raise ValueError('A NodePool requires at least one node')
+
+        strategy = kwargs.get('strategy', 'round_robin')
+        if isinstance(strategy, str):
+            if strategy not in STRATEGIES:
+                raise ValueError(f'Unknown load balancing strategy "{strategy}".  Expected one of: {", ".join(STRATEGIES)}')
+            strategy = STRATEGIES[strategy]()
+
+        self.nodes = [Node(node) if isinstance(node, str) else node for node in nodes]
+        self.probe = probe
+        self.strategy = strategy
+        self.max_failures = kwargs.get('max_failures', 3)
+        self.probe_interval = kwargs.get('probe_interval', 5)
+        self.latency_decay = kwargs.get('latency_decay', 0.3)
+
+        self._lock = threading.Lock()
+
+    @property
+    def healthy_nodes(self):
+        return [node for node in self.nodes if node.healthy]
+
+    def acquire(self):
+        """
+        :returns Node to send the next request to
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            healthy = [node for node in self.nodes if node.healthy]
+            node = self.strategy.choose(healthy or self.nodes)
+            node.outstanding += 1
+
+            due = [other for other in self.nodes if not other.healthy and other.next_probe <= now]
+            for other in due:
+                other.next_probe = now + self.probe_interval
+
+        if self.probe is not None:
+            for other in due:
+                self.probe(other)
+
+        return node
+
+    def release(self, node, elapsed=None, failed=False):
+        """
+        Records the outcome of a request sent to node.
+
+        :param float elapsed:   Response time in seconds, if a response was received
+        :param bool  failed:    The node failed to answer the request
+        """
+        with self._lock:
+            node.outstanding -= 1
+
+            if elapsed is not None:
+                node.latency = elapsed if node.latency is None else \
+                    self.latency_decay * elapsed + (1 - self.latency_decay) * node.latency
+
+            if not failed:
+                node.failures = 0
+                return
+
+            node.failures += 1
+            if node.healthy and node.failures >= self.max_failures:
+                node.healthy = False
+                node.next_probe = time.monotonic() + self.probe_interval
+
+    def probed(self, node, healthy):
+        """
+        Records the outcome of a health check of an ejected node.
+        """
+        with self._lock:
+            if healthy:
+                node.healthy = True
+                node.failures = 0
+                node.latency = None
+            else:
+                node.next_probe = time.monotonic() + self.probe_interval
+
+    def call(self, send):
+        """
+        Sends a request with the synchronous transport to the next node.
+
+        :param callable send: Called with the base URI of the node; returns its requests.Response
+        """
+        node = self.acquire()
+        start = time.perf_counter()
+        try:
+            response = send(node.base_uri)
+        except Exception:
+            self.release(node, failed=True)
+            raise
+
+        self.release(node, time.perf_counter() - start, response.status_code in self.failure_statuses)
+        return response
+
+    async def call_async(self, send):
+        """
+        Sends a request with the asynchronous transport to the next node.
+
+        :param callable send: Coroutine function called with the base URI of the node; returns
+                              (status, reason, headers, body)
+        """
+        node = self.acquire()
+        start = time.perf_counter()
+        try:
+            response = await send(node.base_uri)
+        except Exception:
+            self.release(node, failed=True)
+            raise
+        except BaseException:
+            # cancelled; says nothing about the health of the node
+            self.release(node)
+            raise
+
+        self.release(node, time.perf_counter() - start, response[0] in self.failure_statuses)
+        return response
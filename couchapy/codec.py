@@ -0,0 +1,99 @@
+import  json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class JsonCodec():
+    """
+    Encodes request bodies and decodes response bodies using the standard library json module.
+
+    Codecs are interchangeable: dumps returns UTF-8 encoded bytes and loads accepts bytes or str.
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Codec backed by orjson.  Requires the optional orjson dependency.
+
+    Objects orjson cannot encode, such as dicts with non-str keys or integers wider than 64 bits, are encoded
+    with the standard library json module instead.  orjson decodes integers wider than 64 bits as floats.
+    """
+    name = 'orjson'
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj)
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    """
+    Codec backed by ujson.  Requires the optional ujson dependency.
+
+    Objects ujson cannot encode are encoded with the standard library json module instead.
+    """
+    name = 'ujson'
+
+    def dumps(self, obj):
+        try:
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+CODECS = {'orjson': (OrjsonCodec, orjson), 'ujson': (UjsonCodec, ujson), 'json': (JsonCodec, json)}
+
+
+def available_codecs():
+    """
+    :returns list Names of the codecs whose dependency is installed, fastest first
+    """
+    return [name for name, (codec, module) in CODECS.items() if module is not None]
+
+
+def get_codec(codec='json'):
+    """
+    Resolves the codec option of CouchDB.
+
+    :param codec: The name of a codec ('json', 'orjson' or 'ujson'), 'auto' for the fastest installed codec,
+                  or any object with dumps and loads methods.  The faster codecs are opt-in because they do not
+                  accept every value the json module does. (Default: 'json')
+
+    :returns codec instance
+    """
+    if codec == 'auto':
+        codec = available_codecs()[0]
+
+    if not isinstance(codec, str):
+        return codec
+
+    if codec not in CODECS:
+        raise ValueError(f'Unknown JSON codec "{codec}".  Expected one of: auto, {", ".join(CODECS)}')
+
+    codec_class, module = CODECS[codec]
+    if module is None:
+        raise ImportError(f'The "{codec}" JSON codec requires the {codec} package.  Install it with: pip install {codec}')
+
+    return codec_class()
@@ -0,0 +1,42 @@
+import  gzip
+import  io
+
+
+class Compressor():
+    """
+    Compresses large JSON request bodies, e.g. of bulk_save, find or filter_docs, before they are sent.
+
+    Bodies of at least threshold bytes are gzip compressed and sent with a Content-Encoding: gzip header,
+    which CouchDB decompresses transparently.  Smaller bodies are sent as is, since compressing them costs
+    more time than it saves.  Raw bodies, such as streamed attachments, are never compressed.
+
+    Request bodies are only ever gzip compressed: CouchDB rejects request bodies with any other
+    Content-Encoding.  Responses, which a reverse proxy in front of CouchDB can compress, are negotiated with
+    the Accept-Encoding header, gzip and deflate by default, and decompressed by the HTTP client.
+
+    This class is not intended to be instanced directly.  Configure it through the compression_kwargs
+    argument of CouchDB.
+
+    :param int  threshold:          Minimum size, in bytes, of the request bodies that are compressed. (Default: 1024)
+    :param int  level:              gzip compression level, from 1 (fastest) to 9 (smallest). (Default: 6)
+    :param str  accept_encoding:    Accept-Encoding header sent with every request. (Default: 'gzip, deflate')
+    """
+    encoding = 'gzip'
+
+    def __init__(self, **kwargs):
+        self.threshold = kwargs.get('threshold', 1024)
+        self.level = kwargs.get('level', 6)
+        self.accept_encoding = kwargs.get('accept_encoding', 'gzip, deflate')
+
+    def compress(self, body):
+        """
+        :returns bytes the compressed body, or None if the body should be sent as is
+        """
+        if len(body) < self.threshold:
+            return None
+
+        # mtime=0 keeps the output deterministic for identical bodies; gzip.compress only accepts it from Python 3.8
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=self.level, mtime=0) as gzip_file:
+            gzip_file.write(body)
+        return buffer.getvalue()
@@ -1,11 +1,13 @@
 import threading
 
+import couchapy.client
 import couchapy.session
 import couchapy.server
 import couchapy.database
+import couchapy.error
 
 
-class CouchDB():
+class CouchDB(couchapy.client.BaseClient):
     """
     Exposes an interface for interating with a CouchDB server's REST API.
 
@@ -28,6 +30,47 @@ class CouchDB():
 
     :param bool admin_party     Determines whether or not to attempt connections to the CouchDB using Admin Party. (Default: False)
 
+    :param dict transport_kwargs Connection pool settings shared by every server, database and session endpoint.
+                                Supported keys: pool_connections, pool_maxsize, pool_block, max_retries,
+                                keep_alive and timeout.  See couchapy.transport.Transport. (Default: {})
+
+    :param      codec           JSON codec used to encode request bodies and decode responses: 'json' (the standard
+                                library json module), 'orjson' or 'ujson', 'auto' for the fastest installed of them,
+                                or an object with dumps and loads methods.  See couchapy.codec.get_codec. (Default: 'json')
+
+    :param str  response_format Default response format of every endpoint.  'json' decodes response bodies; 'bytes',
+                                'memoryview' and 'stream' return the undecoded body in a RawResponse, e.g. to proxy
+                                responses without parsing them.  Can be overridden per call. (Default: 'json')
+
+    :param dict compression_kwargs Enables gzip compression of large request bodies, which saves bandwidth on slow
+                                links at the cost of client CPU.  Supported keys: threshold, level and accept_encoding.
+                                See couchapy.compression.Compressor.  None disables compression. (Default: None)
+
+    :param list observers       Callables called with the couchapy.metrics.RequestMetrics (endpoint, method, status,
+                                body sizes, and connect, wait, download and decode times) of every request, e.g. a
+                                couchapy.metrics.MetricsAggregator.  Requests are only timed while there are observers;
+                                observers can be added to and removed from the observers attribute at any time.
+                                Observers are called on the requesting thread and must be fast. (Default: [])
+
+    :param dict retry_kwargs    Enables automatic retries of requests that failed with a transient error, with
+                                exponential backoff, jitter and a retry budget.  Only requests that are safe to
+                                repeat are retried.  See couchapy.retry.RetryPolicy for the supported keys.
+                                None disables retries. (Default: None)
+
+    :param list nodes           Addresses of the nodes of a CouchDB cluster, e.g. ['http://10.0.0.1:5984',
+                                'http://10.0.0.2:5984'].  Requests are spread across the nodes instead of being sent
+                                to host and port; nodes that fail are ejected, probed with Server.server_status and
+                                readmitted once they recover.  A single call can be sent to a given node with the
+                                node argument, e.g. server.node_stats(node='http://10.0.0.2:5984'). (Default: None)
+    :param dict cluster_kwargs  Load balancing settings: strategy ('round_robin', 'least_outstanding' or
+                                'latency_weighted'), max_failures and probe_interval.  See
+                                couchapy.cluster.NodePool. (Default: {})
+
+    Thread safety:
+      A single instance can be shared by any number of threads.  Building a request never modifies the
+      instance, its server, db or session namespaces, and every thread draws connections from the same
+      pool (size it with transport_kwargs={'pool_maxsize': <threads>}).
+
     Usage Examples:
       couchDb = CouchDB([name=<user>[, password=<password>][,<arg=<value>])
     """
@@ -35,13 +78,6 @@ class CouchDB():
     def __init__(self, **kwargs):
         self._context_manager = False
 
-        self._headers = {
-            'Content-type': 'application/json',
-            'Accept': 'application/json'
-        }
-
-        self.custom_headers = kwargs.get('custom_headers', {})  # TODO: implement
-
         # automatic session renewal management
         self._auto_renew_worker = None
         self._auto_renew_worker_lock = threading.RLock()
@@ -49,14 +85,10 @@ class CouchDB():
         self.session_timeout = kwargs.get('session_timeout', 0)
         self.keep_alive = kwargs.get('keep_alive', False)
 
-        self.host = kwargs.get('host', 'http://127.0.0.1')
-        self.port = kwargs.get('port', 5984)
-
-        self.name = kwargs.get('name', None)
-        self.password = kwargs.get('password', None)
-
         self._admin_party = kwargs.get('admin_party', False)  # TODO: implement admin party
 
+        super().__init__(**kwargs)
+
         self.session = couchapy.session.Session(self, **kwargs)
         self.server = couchapy.server.Server(self, **kwargs.get('server_kwargs', {}))
         self.db = couchapy.database.Database(self, **kwargs.get('database_kwargs', {}))
@@ -76,6 +108,25 @@ class CouchDB():
 
     def __exit__(self, type, value, traceback):
         self._context_manager = False
+        self.close()
+
+    def close(self):
+        """
+        Releases every pooled connection held by this instance.
+        """
+        self._transport.close()
+
+    def _probe_node(self, node):
+        # health checks run in the background so that the request which triggered them is not delayed
+        def probe():
+            try:
+                healthy = not isinstance(self.server.server_status(node=node.base_uri, retry=False),
+                                         couchapy.error.CouchError)
+            except Exception:
+                healthy = False
+            self._nodes.probed(node, healthy)
+
+        threading.Thread(target=probe, daemon=True).start()
 
     def start_auto_session(self):
         # ensure only one session renewal thread can run
@@ -1,5 +1,15 @@
+import  json
+
+import  couchapy.advisor
+import  couchapy.attachments
+import  couchapy.bulk
+import  couchapy.cache
+import  couchapy.changes
 import  couchapy.decorators as couch
+import  couchapy.deploy
 import  couchapy.error
+import  couchapy.multipart
+import  couchapy.pagination
 
 
 class Database():
@@ -8,6 +18,10 @@ class Database():
         self._db = kwargs.get('db', '_global_changes')
         self._predefined_segments = kwargs.get('predefined_segments', {'db': self._db})
 
+        # opt-in client side document cache, see couchapy.cache.DocumentCache
+        cache_kwargs = kwargs.get('doc_cache', None)
+        self.doc_cache = couchapy.cache.DocumentCache(**cache_kwargs) if cache_kwargs is not None else None
+
     @couch.endpoint('/:db:', method='head')
     def headers(self, couch_data):
         return couch_data
@@ -34,7 +48,7 @@ class Database():
     def delete(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:', method='post', query_keys=couch.AllowedKeys.DATABASE__DB__SAVE__PARAMS)
+    @couch.endpoint('/:db:', method='post', query_keys=couch.AllowedKeys.DATABASE__DB__SAVE__PARAMS, cache='evict')
     def save_doc(self, couch_data):
         """
         Saves a document to the specified database
@@ -59,43 +73,138 @@ class Database():
     def get_doc_info(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/:docid:', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__PARAMS)
+    @couch.endpoint('/:db:/:docid:', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__PARAMS, cache='read')
     def get_doc(self, couch_data):
+        """
+        Retrieves a document.  When the doc_cache database option is enabled, and no query parameters are given,
+        documents are served from the cache and revalidated with a conditional GET once their ttl has passed.
+
+        :returns CouchError if an error occured accessing the couch api
+        """
         return couch_data
 
-    @couch.endpoint('/:db:/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS)
+    def get_doc_with_attachments(self, **kwargs):
+        """
+        Retrieves a document together with the content of its attachments as multipart/related, which avoids the
+        base64 encoding of attachments=true JSON responses.  The document is parsed immediately; attachments are
+        streamed from the response as they are read.
+
+        Accepts the uri_segments and params of get_doc.
+
+        :returns MultipartDocument, which should be closed once its attachments have been read
+        :returns CouchError if an error occured accessing the couch api
+
+        Usage Examples:
+          with couchdb_instance.db.get_doc_with_attachments(uri_segments={'docid': 'somedoc'}) as result:
+              attachments = result.read_attachments()
+        """
+        params = {**kwargs.pop('params', {}), 'attachments': 'true'}
+        response = self.get_doc(params=params, headers={'Accept': 'multipart/related'}, response_format='stream', **kwargs)
+        return couchapy.multipart.read_document(response, self.parent._codec)
+
+    @couch.endpoint('/:db:/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS,
+                    cache='evict')
     def save_named_doc(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS)
+    def save_doc_with_attachments(self, doc, attachments, **kwargs):
+        """
+        Saves a document and its attachments in a single multipart/related request.  Attachment data is streamed
+        from its source while the request is sent.
+
+        :param dict doc:            Document to save, including its _id and, when updating it, its _rev
+        :param dict attachments:    Attachment name -> (content_type, source) or (content_type, source, length).
+                                    source is bytes, a binary file object, or an iterator of bytes, which requires
+                                    the length.  Attachments of doc that are stubs are kept.
+        :param dict uri_segments:   Dynamic URI segments. (Default: {'docid': doc['_id']})
+        :param dict params:         Query parameters.  See AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS. (Default: None)
+
+        :returns dict with the id and new rev of the document
+        :returns CouchError if an error occured accessing the couch api
+
+        Usage Examples:
+          with open('photo.png', 'rb') as photo:
+              couchdb_instance.db.save_doc_with_attachments({'_id': 'somedoc'}, {'photo.png': ('image/png', photo)})
+        """
+        body = couchapy.multipart.RelatedBody(doc, attachments, self.parent._codec)
+        uri_segments = {'docid': doc.get('_id'), **kwargs.pop('uri_segments', {})}
+        return self.save_named_doc(uri_segments=uri_segments, body=body, headers={'Content-Type': body.content_type},
+                                   **kwargs)
+
+    @couch.endpoint('/:db:/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS,
+                    cache='evict')
     def delete_doc(self, couch_data):
         return couch_data
 
-    # TODO: implement custom verb handling in endpoint decorator
-    # TODO: CouchDB COPY command uses custom headers to send data...need to implement a way to handle this too
-    # see https://requests.readthedocs.io/en/master/user/advanced/
-    # @couch.endpoint('/:db:/:docid:', method='copy', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS)
-    # def copy_doc(self, couch_data):
-    #   return couch_data
+    @couch.endpoint('/:db:/:docid:', method='copy', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS,
+                    cache='evict')
+    def copy_doc(self, couch_data):
+        """
+        Copies a document to the id given by the Destination header.  To overwrite an existing document, append
+        its current rev to the destination.
+
+        :returns dict with the id and rev of the copy
+        :returns CouchError if an error occured accessing the couch api
+
+        Usage: couchdb_instance.db.copy_doc(uri_segments={'docid': 'source'}, headers={'Destination': 'target?rev=1-abc'})
+        """
+        return couch_data
 
     @couch.endpoint('/:db:/:docid:/:attname:', method='head', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__INFO_PARAMS)
     def get_attachment_info(self, couch_data):
         return couch_data
 
-    # TODO: implement ability for endpoint to return non-json data
     @couch.endpoint('/:db:/:docid:/:attname:', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__GET__PARAMS)
     def get_attachment(self, couch_data):
         return couch_data
 
-    # TODO: confirm ability to pass custom headers to endpoint decorator
-    @couch.endpoint('/:db:/:docid:/:attname:', method='put', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__SAVE__PARAMS)
+    @couch.endpoint('/:db:/:docid:/:attname:', method='put', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__SAVE__PARAMS,
+                    cache='evict')
     def save_attachment(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/:docid:/:attname:', method='delete', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__DELETE__PARAMS)
+    @couch.endpoint('/:db:/:docid:/:attname:', method='delete', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__DELETE__PARAMS,
+                    cache='evict')
     def delete_attachment(self, couch_data):
         return couch_data
 
+    def download_attachment(self, dest, **kwargs):
+        """
+        Streams an attachment into a file, socket or callback without holding it in memory.
+
+        :param          dest:           File path, writable binary file object, connected socket, or callable
+                                        receiving every chunk
+        :param dict     uri_segments:   Dynamic URI segments, including docid and attname. (Default: {})
+        :param dict     params:         Query parameters.  See AllowedKeys.DATABASE__ATTACHMENT__GET__PARAMS. (Default: None)
+        :param int      chunk_size:     Maximum number of bytes read at a time. (Default: 65536)
+
+        :returns dict with the content_type, length and digest of the attachment
+        :returns CouchError if an error occured accessing the couch api
+
+        Usage Examples:
+          couchdb_instance.db.download_attachment('/tmp/photo.png', uri_segments={'docid': 'somedoc', 'attname': 'photo.png'})
+        """
+        return couchapy.attachments.download(self.get_attachment, self.parent._codec, dest, **kwargs)
+
+    def upload_attachment(self, source, content_type, **kwargs):
+        """
+        Streams an attachment from a file or an iterator of bytes without reading it into memory.
+
+        :param          source:         File path, readable binary file object, bytes, or iterator of bytes
+        :param str      content_type:   MIME type of the attachment
+        :param dict     uri_segments:   Dynamic URI segments, including docid and attname. (Default: {})
+        :param dict     params:         Query parameters, usually the current rev of the document.
+                                        See AllowedKeys.DATABASE__ATTACHMENT__SAVE__PARAMS. (Default: None)
+
+        :returns dict with the id and new rev of the document
+        :returns CouchError if an error occured accessing the couch api
+
+        Usage Examples:
+          couchdb_instance.db.upload_attachment('/tmp/photo.png', 'image/png', params={'rev': rev},
+                                                uri_segments={'docid': 'somedoc', 'attname': 'photo.png'})
+        """
+        return couchapy.attachments.upload(self.save_attachment, source, content_type, **kwargs)
+
     @couch.endpoint('/:db:/_design/:docid:', method='head', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__PARAMS)
     def get_ddoc_info(self, couch_data):
         return couch_data
@@ -108,31 +217,61 @@ class Database():
     def get_ddoc(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS)
+    @couch.endpoint('/:db:/_design/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS,
+                    cache='evict')
     def save_named_ddoc(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS)
+    @couch.endpoint('/:db:/_design/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS,
+                    cache='evict')
     def delete_ddoc(self, couch_data):
         return couch_data
 
-    # TODO: implement custom verb handling in endpoint decorator
-    # TODO: CouchDB COPY command uses custom headers to send data...need to implement a way to handle this too
-    # see https://requests.readthedocs.io/en/master/user/advanced/
-    # @couch.endpoint('/:db:/_design/:docid:', method='copy', query_keys=AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS)
-    # def copy_ddoc(self, couch_data):
-    #   return couch_data
+    @couch.endpoint('/:db:/_design/:docid:', method='copy', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS,
+                    cache='evict')
+    def copy_ddoc(self, couch_data):
+        """
+        Copies a design document to the id given by the Destination header, e.g. _design/target?rev=1-abc.
+        See copy_doc.
+        """
+        return couch_data
+
+    def deploy_ddoc(self, ddoc, doc, **kwargs):
+        """
+        Replaces a design document without stalling the readers of its views (blue/green deployment).
+
+        The new version is saved under a staging id and its indexes are built with warm_up while readers keep
+        using the live version.  The staging design document is then copied over the live id.  Views are
+        indexed by the signature of their definition, so the live id immediately uses the indexes that were
+        just built.  Finally the staging design document is deleted and flush_unused_view_cache removes the
+        indexes of the previous version.
+
+        :param str  ddoc:           Id of the live design document, with or without the _design/ prefix
+        :param dict doc:            New version of the design document; _id and _rev are ignored
+        :param dict uri_segments:   Dynamic URI segments. (Default: {})
+        :param str  staging:        Id of the staging design document. (Default: <ddoc>-staging)
+        :param bool keep_staging:   Keep the staging design document instead of deleting it. (Default: False)
+
+        Also accepts the mango, poll_interval, timeout and on_progress options of couchapy.deploy.IndexWarmer.
+
+        :returns dict with the id and new rev of the live design document
+        :returns CouchError if an error occured accessing the couch api.  Errors deleting the staging design
+                 document or flushing the view cache are returned after the live design document was replaced.
+        :raises TimeoutError if the indexes are not ready within timeout seconds; the live design document is left
+                untouched
+
+        Usage: couchdb_instance.db.deploy_ddoc('orders', {'views': {...}, 'language': 'javascript'}, timeout=3600)
+        """
+        return couchapy.deploy.deploy_ddoc(self, ddoc, doc, **kwargs)
 
     @couch.endpoint('/:db:/_design/:docid:/:attname:', method='head', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__INFO_PARAMS)
     def get_ddoc_attachment_info(self, couch_data):
         return couch_data
 
-    # TODO: implement ability for endpoint to return non-json data
     @couch.endpoint('/:db:/_design/:docid:/:attname:', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__GET__PARAMS)
     def get_ddoc_attachment(self, couch_data):
         return couch_data
 
-    # TODO: confirm ability to pass custom headers to endpoint decorator
     @couch.endpoint('/:db:/_design/:docid:/:attname:', method='put', query_keys=couch.AllowedKeys.DATABASE__ATTACHMENT__SAVE__PARAMS)
     def save_ddoc_attachment(self, couch_data):
         return couch_data
@@ -141,31 +280,98 @@ class Database():
     def delete_ddoc_attachment(self, couch_data):
         return couch_data
 
+    def download_ddoc_attachment(self, dest, **kwargs):
+        """
+        Streams a design document attachment into a file, socket or callback.  See Database.download_attachment.
+        """
+        return couchapy.attachments.download(self.get_ddoc_attachment, self.parent._codec, dest, **kwargs)
+
+    def upload_ddoc_attachment(self, source, content_type, **kwargs):
+        """
+        Streams a design document attachment from a file or an iterator of bytes.  See Database.upload_attachment.
+        """
+        return couchapy.attachments.upload(self.save_ddoc_attachment, source, content_type, **kwargs)
+
+    def index_warmer(self, **kwargs):
+        """
+        Creates a warmer that builds the indexes of design documents ahead of the first query and reports their
+        build progress.
+
+        Accepts uri_segments and the options of couchapy.deploy.IndexWarmer.
+
+        :returns IndexWarmer
+        """
+        return couchapy.deploy.IndexWarmer(self, **kwargs)
+
+    def warm_up(self, ddocs, **kwargs):
+        """
+        Starts the index build of every view of the given design documents, and waits until their indexes are
+        current, e.g. before switching traffic over to a new deployment.
+
+        Accepts uri_segments and the mango, poll_interval, timeout and on_progress options of
+        couchapy.deploy.IndexWarmer.
+
+        :param list ddocs:  Design document ids, with or without the _design/ prefix
+
+        :returns dict of couchapy.deploy.BuildProgress by design document id, once every index is ready
+        :returns CouchError if an error occured accessing the couch api
+        :raises TimeoutError if the indexes are not ready within timeout seconds
+
+        Usage: couchdb_instance.db.warm_up(['orders'], timeout=3600, on_progress=lambda progress: print(progress))
+        """
+        return self.index_warmer(ddocs=ddocs, **kwargs).run()
+
     @couch.endpoint('/:db:/_design/:docid:/_view/:view:', query_keys=couch.AllowedKeys.VIEW__PARAMS)
     def get_view(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design/:docid:/_view/:view:', method='post', data_keys=couch.AllowedKeys.DATABASE__VIEW_BY_KEY__DATA)
+    @couch.endpoint('/:db:/_design/:docid:/_view/:view:', method='post',
+                    data_keys=couch.AllowedKeys.DATABASE__VIEW_BY_KEY__DATA, idempotent=True)
     def filter_view(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design/:docid:/_view/:view:/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__VIEW_QUERIES__DATA)
+    @couch.endpoint('/:db:/_design/:docid:/_view/:view:/queries', method='post',
+                    data_keys=couch.AllowedKeys.DATABASE__VIEW_QUERIES__DATA, idempotent=True)
     def filter_view_with_queries(self, couch_data):
         return couch_data
 
+    def iter_view(self, **kwargs):
+        """
+        Iterates every row of a view using keyset pagination, prefetching the next page in the background.
+
+        Accepts the same params and uri_segments as get_view, as well as the page_size and prefetch options of
+        couchapy.pagination.ViewPager.
+
+        :returns ViewPager iterable of rows
+
+        Usage: for row in couchdb_instance.db.iter_view(uri_segments={'docid': 'ddoc', 'view': 'by_date'}, page_size=5000):
+        """
+        return couchapy.pagination.ViewPager(self.get_view, **kwargs)
+
     @couch.endpoint('/:db:/_all_docs', query_keys=couch.AllowedKeys.VIEW__PARAMS)
     def get_docs(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_all_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__ALL_DOCS__DATA)
+    @couch.endpoint('/:db:/_all_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__ALL_DOCS__DATA, idempotent=True)
     def filter_docs(self, couch_data):
         return couch_data
 
+    def iter_docs(self, **kwargs):
+        """
+        Iterates every row of _all_docs using keyset pagination, prefetching the next page in the background.
+
+        Accepts the same params and uri_segments as get_docs, as well as the page_size and prefetch options of
+        couchapy.pagination.ViewPager.
+
+        :returns ViewPager iterable of rows
+        """
+        return couchapy.pagination.ViewPager(self.get_docs, docid_keys=False, **kwargs)
+
     @couch.endpoint('/:db:/_all_docs', query_keys=couch.AllowedKeys.DATABASE__LOCAL_DOCS__PARAMS)
     def get_local_docs(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_all_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__LOCAL_DOCS__DATA)
+    @couch.endpoint('/:db:/_all_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__LOCAL_DOCS__DATA, idempotent=True)
     def get_local_docs_by_key(self, couch_data):
         return couch_data
 
@@ -173,55 +379,132 @@ class Database():
     def get_local_doc(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_local/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS)
+    @couch.endpoint('/:db:/_local/:docid:', method='put', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__NAMED_DOC__PARAMS,
+                    cache='evict')
     def save_local_named_doc(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_local/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS)
+    @couch.endpoint('/:db:/_local/:docid:', method='delete', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__DELETE__PARAMS,
+                    cache='evict')
     def delete_local_doc(self, couch_data):
         return couch_data
 
-    # TODO: implement custom verb handling in endpoint decorator
-    # TODO: CouchDB COPY command uses custom headers to send data...need to implement a way to handle this too
-    # see https://requests.readthedocs.io/en/master/user/advanced/
-    # @couch.endpoint('/:db:/_local/:docid:', method='copy', query_keys=AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS)
-    # def copy_local_doc(self, couch_data):
-    #   return couch_data
+    @couch.endpoint('/:db:/_local/:docid:', method='copy', query_keys=couch.AllowedKeys.DATABASE__DOCUMENT__COPY__PARAMS,
+                    cache='evict')
+    def copy_local_doc(self, couch_data):
+        """
+        Copies a local document to the id given by the Destination header, e.g. _local/target.  See copy_doc.
+        """
+        return couch_data
 
     @couch.endpoint('/:db:/_design_docs', query_keys=couch.AllowedKeys.VIEW__PARAMS)
     def get_design_docs(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__DESIGN_DOCS__DATA)
+    @couch.endpoint('/:db:/_design_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__DESIGN_DOCS__DATA,
+                    idempotent=True)
     def get_design_docs_by_key(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_all_docs/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__ALL_DOCS_QUERIES__DATA)
+    def iter_design_docs(self, **kwargs):
+        """
+        Iterates every row of _design_docs using keyset pagination, prefetching the next page in the background.
+
+        Accepts the same params and uri_segments as get_design_docs, as well as the page_size and prefetch options
+        of couchapy.pagination.ViewPager.
+
+        :returns ViewPager iterable of rows
+        """
+        return couchapy.pagination.ViewPager(self.get_design_docs, docid_keys=False, **kwargs)
+
+    @couch.endpoint('/:db:/_all_docs/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__ALL_DOCS_QUERIES__DATA,
+                    idempotent=True)
     def filter_docs_with_queries(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_design_docs/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__DESIGN_DOCS_QUERIES__DATA)
+    @couch.endpoint('/:db:/_design_docs/queries', method='post',
+                    data_keys=couch.AllowedKeys.DATABASE__DESIGN_DOCS_QUERIES__DATA, idempotent=True)
     def filter_ddocs_with_queries(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_local_docs/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__LOCAL_DOCS_QUERIES__DATA)
+    @couch.endpoint('/:db:/_local_docs/queries', method='post', data_keys=couch.AllowedKeys.DATABASE__LOCAL_DOCS_QUERIES__DATA,
+                    idempotent=True)
     def filter_local_docs_with_queries(self, couch_data):
         return couch_data
 
     @couch.endpoint('/:db:/_bulk_get', method='post',
                     data_keys=couch.AllowedKeys.DATABASE__BULK_GET__DATA,
-                    query_keys=couch.AllowedKeys.DATABASE__BULK_GET__PARAMS)
+                    query_keys=couch.AllowedKeys.DATABASE__BULK_GET__PARAMS, idempotent=True)
     def bulk_get(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_bulk_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__BULK_DOCS__DATA)
+    def bulk_get_with_attachments(self, **kwargs):
+        """
+        Reads several documents together with the content of their attachments, as multipart/mixed, e.g. to copy
+        attachments between databases without base64 encoding them.
+
+        Accepts the uri_segments, params and data of bulk_get.  Documents must be consumed in order: moving to the
+        next document discards the unread attachments of the previous one.
+
+        :yields MultipartDocument for every document
+        :yields CouchError for every document that could not be read, or if an error occured accessing the couch api
+
+        Usage Examples:
+          for result in couchdb_instance.db.bulk_get_with_attachments(data={'docs': [{'id': 'a'}, {'id': 'b'}]}):
+              for attachment in result.attachments:
+                  target.upload_attachment(attachment.iter_chunks(), attachment.content_type, ...)
+        """
+        params = {**kwargs.pop('params', {}), 'attachments': 'true'}
+        response = self.bulk_get(params=params, headers={'Accept': 'multipart/mixed'}, response_format='stream', **kwargs)
+        return couchapy.multipart.iter_bulk_get(response, self.parent._codec)
+
+    def bulk_loader(self, **kwargs):
+        """
+        Creates a loader that batches individual document lookups into bulk_get requests.
+
+        Accepts uri_segments, params and the batching options of couchapy.bulk.BulkLoader.
+
+        :returns BulkLoader
+
+        Usage: with couchdb_instance.db.bulk_loader(batch_size=200) as loader:
+        """
+        return couchapy.bulk.BulkLoader(self, **kwargs)
+
+    @couch.endpoint('/:db:/_bulk_docs', method='post', data_keys=couch.AllowedKeys.DATABASE__BULK_DOCS__DATA, retry_docs=True,
+                    cache='evict')
     def bulk_save(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_find', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA)
+    def bulk_writer(self, **kwargs):
+        """
+        Creates a writer that buffers documents and saves them in chunks with concurrent bulk_save requests.
+
+        Accepts uri_segments, data and the chunking options of couchapy.bulk.BulkWriter.
+
+        :returns BulkWriter
+
+        Usage: with couchdb_instance.db.bulk_writer(max_docs=1000, max_workers=8) as writer:
+        """
+        return couchapy.bulk.BulkWriter(self, **kwargs)
+
+    @couch.endpoint('/:db:/_find', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA, idempotent=True)
     def find(self, couch_data):
         return couch_data
 
+    def iter_find(self, **kwargs):
+        """
+        Iterates every document matching a Mango selector, following bookmarks from page to page and prefetching
+        the next page in the background.
+
+        Accepts the same data and uri_segments as find, as well as the page_size and prefetch options of
+        couchapy.pagination.FindCursor.
+
+        :returns FindCursor iterable of documents, exposing the bookmark, warning and execution_stats of its pages
+
+        Usage: for doc in couchdb_instance.db.iter_find(data={'selector': {'type': 'order'}}, page_size=500):
+        """
+        return couchapy.pagination.FindCursor(self.find, **kwargs)
+
     # TODO: confirm body or query parameters.  couchdb docs suggest query parameters and not json body data
     @couch.endpoint('/:db:/_index', method='post', data_keys=couch.AllowedKeys.DATABASE__INDEX__DATA)
     def save_index(self, couch_data):
@@ -239,10 +522,171 @@ class Database():
     def delete_index(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_explain', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA)
+    @couch.endpoint('/:db:/_explain', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA, idempotent=True)
     def explain(self, couch_data):
         return couch_data
 
+    @couch.endpoint('/:db:/_partition/:partition:')
+    def get_partition(self, couch_data):
+        """
+        Retrieves the document count and size of a partition of a partitioned database.
+        """
+        return couch_data
+
+    @couch.endpoint('/:db:/_partition/:partition:/_all_docs', query_keys=couch.AllowedKeys.VIEW__PARAMS)
+    def get_partition_docs(self, couch_data):
+        """
+        Queries _all_docs of a single partition, which is answered by the one shard holding the partition.
+        """
+        return couch_data
+
+    @couch.endpoint('/:db:/_partition/:partition:/_design/:docid:/_view/:view:', query_keys=couch.AllowedKeys.VIEW__PARAMS)
+    def get_partition_view(self, couch_data):
+        """
+        Queries a partitioned view for a single partition, which is answered by the one shard holding the partition.
+        """
+        return couch_data
+
+    @couch.endpoint('/:db:/_partition/:partition:/_find', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA,
+                    idempotent=True)
+    def find_partition(self, couch_data):
+        """
+        Runs a Mango query against a single partition, which is answered by the one shard holding the partition.
+        """
+        return couch_data
+
+    @couch.endpoint('/:db:/_partition/:partition:/_explain', method='post', data_keys=couch.AllowedKeys.DATABASE__FIND__DATA,
+                    idempotent=True)
+    def explain_partition(self, couch_data):
+        return couch_data
+
+    def _scan_concurrency(self, uri_segments):
+        # one request per shard range keeps every shard busy without queuing requests on any of them
+        shards = self.get_shards(uri_segments=uri_segments)
+        if isinstance(shards, couchapy.error.CouchError) or not shards.get('shards'):
+            return 4
+
+        return len(shards['shards'])
+
+    @staticmethod
+    def _range_slices(uri_segments, params, split_keys):
+        params = dict(params)
+        start = {key: params.pop(key) for key in ['startkey', 'start_key', 'startkey_docid', 'start_key_doc_id']
+                 if key in params}
+        end = {key: params.pop(key) for key in ['endkey', 'end_key', 'endkey_docid', 'end_key_doc_id', 'inclusive_end']
+               if key in params}
+
+        # only split keys strictly inside the requested range are used; the requested bounds are the outer edges
+        first = next((json.loads(start[key]) for key in ['startkey', 'start_key'] if key in start), None)
+        last = next((json.loads(end[key]) for key in ['endkey', 'end_key'] if key in end), None)
+        try:
+            split_keys = [key for key in split_keys
+                          if (first is None or key > first) and (last is None or key < last)]
+        except TypeError:
+            raise ValueError('split_keys must be comparable to the startkey and endkey of params')
+
+        bounds = [None] + [json.dumps(key) for key in split_keys] + [None]
+        slices = []
+        for index, (low, high) in enumerate(zip(bounds, bounds[1:])):
+            slice_params = dict(params)
+            slice_params.update(start if index == 0 else {'startkey': low})
+            slice_params.update(end if high is None else {'endkey': high, 'inclusive_end': 'false'})
+            slices.append((uri_segments, slice_params))
+
+        return slices
+
+    def scan_docs(self, **kwargs):
+        """
+        Reads every row of _all_docs with several concurrent requests instead of a single coordinator request,
+        and yields the rows in document id order.
+
+        Documents of a partitioned database are read one partition per request, straight from the shard that
+        holds each partition.  Otherwise _all_docs is split into disjoint document id ranges at split_keys,
+        which by default divide the space of the hexadecimal UUIDs that CouchDB assigns to new documents into
+        one range per concurrent request.  Every range or partition is read with keyset pagination.
+
+        :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+        :param dict     params:         Query parameters of every request, e.g. {'include_docs': 'true'}.
+                                        See AllowedKeys.VIEW__PARAMS.  descending, skip and limit are not supported.
+        :param list     partitions:     Partitions to read, for partitioned databases. (Default: None)
+        :param list     split_keys:     Document ids at which _all_docs is split into ranges, in ascending order.
+                                        Split keys outside the startkey and endkey of params are ignored.
+                                        (Default: hexadecimal prefixes)
+        :param int      concurrency:    Maximum number of requests in flight.  (Default: the number of shard
+                                        ranges of the database, as reported by get_shards)
+        :param int      page_size:      Number of rows requested per page. (Default: 1000)
+
+        :returns ParallelScan iterable of rows
+
+        Usage Examples:
+          for row in couchdb_instance.db.scan_docs(params={'include_docs': 'true'}):
+          for row in couchdb_instance.db.scan_docs(partitions=['sensor-1', 'sensor-2']):
+        """
+        return self._scan(self.get_docs, self.get_partition_docs, lambda row: row['id'], docid_keys=False, **kwargs)
+
+    def scan_view(self, **kwargs):
+        """
+        Reads every row of a view with several concurrent requests instead of a single coordinator request.
+
+        For partitioned views, every partition is read with its own requests and the rows are merged with
+        merge_key, which must order rows the way CouchDB collates view keys; the default, (row['key'], row['id']),
+        is correct for keys of a single JSON type such as strings or numbers.  For global views, the view is split
+        into disjoint key ranges at split_keys and the rows are yielded in view order.
+
+        :param dict     uri_segments:   Dynamic URI segments, including docid and view. (Default: {})
+        :param dict     params:         Query parameters of every request.  See AllowedKeys.VIEW__PARAMS.
+                                        descending, skip and limit are not supported.
+        :param list     partitions:     Partitions to read, for partitioned views. (Default: None)
+        :param list     split_keys:     View keys at which a global view is split into ranges, in ascending order.
+                                        Split keys outside the startkey and endkey of params are ignored.
+                                        Required unless partitions are given.
+        :param callable merge_key:      Merge key of a row of a partitioned view.
+        :param int      concurrency:    Maximum number of requests in flight.  (Default: the number of shard
+                                        ranges of the database, as reported by get_shards)
+        :param int      page_size:      Number of rows requested per page. (Default: 1000)
+
+        :returns ParallelScan iterable of rows
+        """
+        if kwargs.get('partitions') is None and kwargs.get('split_keys') is None:
+            raise ValueError('scan_view requires either partitions or split_keys')
+
+        merge_key = kwargs.pop('merge_key', lambda row: (row['key'], row['id']))
+        return self._scan(self.get_view, self.get_partition_view, merge_key, **kwargs)
+
+    def _scan(self, query, partition_query, merge_key, **kwargs):
+        uri_segments = kwargs.pop('uri_segments', {})
+        params = kwargs.pop('params', {})
+        partitions = kwargs.pop('partitions', None)
+        split_keys = kwargs.pop('split_keys', None)
+
+        if params.get('descending') in [True, 'true'] or 'skip' in params or 'limit' in params:
+            raise ValueError('descending, skip and limit are not supported by parallel scans')
+
+        concurrency = kwargs.pop('concurrency', None) or self._scan_concurrency(uri_segments)
+
+        if partitions is not None:
+            slices = [({**uri_segments, 'partition': partition}, params) for partition in partitions]
+            return couchapy.pagination.ParallelScan(partition_query, slices, key=merge_key, concurrency=concurrency,
+                                                    **kwargs)
+
+        if split_keys is None:
+            split_keys = [format(index * 16 ** 4 // concurrency, '04x') for index in range(1, concurrency)]
+
+        slices = self._range_slices(uri_segments, params, split_keys)
+        return couchapy.pagination.ParallelScan(query, slices, concurrency=concurrency, **kwargs)
+
+    def index_advisor(self, **kwargs):
+        """
+        Creates an advisor that reports Mango queries doing full scans and suggests indexes for them.
+
+        Accepts uri_segments and the options of couchapy.advisor.IndexAdvisor.
+
+        :returns IndexAdvisor
+
+        Usage: reports = couchdb_instance.db.index_advisor(max_ratio=5).analyze(queries)
+        """
+        return couchapy.advisor.IndexAdvisor(self, **kwargs)
+
     @couch.endpoint('/:db:/_shards')
     def get_shards(self, couch_data):
         return couch_data
@@ -260,10 +704,43 @@ class Database():
         return couch_data
 
     # TODO: make note in this doc string about the lack of data_keys since it supports query keys as well as find data keys
-    @couch.endpoint('/:db:/_changes', method='post', query_keys=couch.AllowedKeys.DATABASE__CHANGES__PARAMS)
+    @couch.endpoint('/:db:/_changes', method='post', query_keys=couch.AllowedKeys.DATABASE__CHANGES__PARAMS, idempotent=True)
     def get_filtered_changes(self, couch_data):
         return couch_data
 
+    @couch.endpoint('/:db:/_changes', query_keys=couch.AllowedKeys.DATABASE__CHANGES__PARAMS, stream=True)
+    def _changes_stream(self, couch_data):
+        return couch_data
+
+    @couch.endpoint('/:db:/_changes', method='post', query_keys=couch.AllowedKeys.DATABASE__CHANGES__PARAMS, stream=True)
+    def _filtered_changes_stream(self, couch_data):
+        return couch_data
+
+    def iter_changes(self, **kwargs):
+        """
+        Streams the _changes feed one row at a time, reading the response incrementally.
+
+        Accepts the same params and uri_segments as get_changes, as well as data (see get_filtered_changes)
+        and the reconnection options of couchapy.changes.ChangesFeed.
+
+        :returns ChangesFeed iterable of change rows.  Its last_seq attribute can be used to resume the feed.
+
+        Usage: for change in couchdb_instance.db.iter_changes(params={'feed': 'continuous', 'heartbeat': 10000}):
+        """
+        return couchapy.changes.ChangesFeed(self, **kwargs)
+
+    def cache_invalidator(self, **kwargs):
+        """
+        Creates an invalidator that follows the _changes feed and evicts changed documents from doc_cache.
+
+        Accepts uri_segments and the options of couchapy.cache.CacheInvalidator.
+
+        :returns CacheInvalidator, not yet started
+
+        Usage: with couchdb_instance.db.cache_invalidator(refresh=True):
+        """
+        return couchapy.cache.CacheInvalidator(self, **kwargs)
+
     @couch.endpoint('/:db:/_compact', method='post')
     def compact(self, couch_data):
         return couch_data
@@ -296,11 +773,11 @@ class Database():
     def set_purge_tracking_limit(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_missing_revs', method='post')
+    @couch.endpoint('/:db:/_missing_revs', method='post', idempotent=True)
     def check_missing_revs(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/:db:/_revs_diff', method='post')
+    @couch.endpoint('/:db:/_revs_diff', method='post', idempotent=True)
     def get_revs_diff(self, couch_data):
         return couch_data
 
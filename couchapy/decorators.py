@@ -1,8 +1,12 @@
 from functools import wraps
+import re
+import time
 import requests
-from re import sub
+import urllib.parse
 
 import  couchapy.error
+import  couchapy.metrics
+import  couchapy.stream
 
 
 def _process_filter_format(filter_format, filter):
@@ -12,87 +16,491 @@ def _process_filter_format(filter_format, filter):
                 raise couchapy.error.InvalidKeysException("The provided filter does not meet the expected format.")
 
 
-def _build_uri(template: str, segments: dict):
-    def replace_with_segment(matches):
+class UriTemplate():
+    """
+    Endpoint URI template, parsed once into a format string and the names of its dynamic segments.
+
+    :param str template: URI template with dynamic segments in the form :name:, e.g. /:db:/:docid:
+    """
+    _segment_pattern = re.compile(r':(\w+):')
+
+    def __init__(self, template):
+        parts = self._segment_pattern.split(template)
+
+        self.template = template
+        self.segments = tuple(parts[1::2])
+        self._format = '{}'.join(part.replace('{', '{{').replace('}', '}}') for part in parts[0::2])
+
+    def format(self, segments):
+        """
+        :returns str the URI with every dynamic segment replaced by its value in segments
+        """
+        if not self.segments:
+            return self.template
+
+        try:
+            return self._format.format(*[segments[name] for name in self.segments])
+        except (KeyError, TypeError):
+            raise self._missing_segment_error(segments) from None
+
+    def _missing_segment_error(self, segments):
         #  dynamic segments are expected, but not provided at all
-        if segments is None and len(matches.groups()) > 0:
-            identifier = matches.group(1)
-            raise Exception((
+        if not segments:
+            return Exception((
                 'Invalid URI. This endpoint contains dynamic segments, but none were provided.  '
-                f'Expected segment definition for "{identifier}".  '
+                f'Expected segment definition for "{self.segments[0]}".  '
                 'Did you forget to pass a uri_segments dict?'))
 
         # a specific segment not provided
-        elif len(matches.groups()) == 1 and matches.group(1) not in segments:
-            identifier = matches.group(1)
-            raise Exception(f'Invalid URI. Expected a dynamic segment for "{identifier}", but none was provided.')
+        identifier = next(name for name in self.segments if name not in segments)
+        return Exception(f'Invalid URI. Expected a dynamic segment for "{identifier}", but none was provided.')
+
+
+RESPONSE_FORMATS = ['json', 'bytes', 'memoryview', 'stream', 'rows']
+
+
+class RawResponse():
+    """
+    Undecoded response returned by endpoints called with a response_format other than json.
+
+    The decorated function of the endpoint is not called, and error statuses are not converted to
+    CouchError; check status_code instead.
+
+    :param int      status_code:    HTTP status code
+    :param str      reason:         HTTP reason phrase
+    :param          headers:        Case-insensitive mapping of response headers
+    :param          body:           bytes, a memoryview, or a readable file-like object for the stream format.
+                                    Bodies are decompressed if the server compressed them.
+    """
+    def __init__(self, status_code, reason, headers, body, close=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self._close = close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        Yields the body in chunks of at most chunk_size bytes, reading streamed bodies incrementally.
+        """
+        if not hasattr(self.body, 'read'):
+            yield bytes(self.body)
+            return
+
+        # read1 returns whatever has arrived instead of waiting for chunk_size bytes
+        read = getattr(self.body, 'read1', self.body.read)
+        while True:
+            chunk = read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """
+        Releases the connection of a streamed body back to the pool.
+        """
+        if self._close is not None:
+            self._close()
+
+
+class Endpoint():
+    """
+    Declaration of a single CouchDB API endpoint, as passed to the endpoint decorator.
+
+    Building a request and interpreting its response are kept independent of the HTTP client that
+    sends it, so that every client (see couchapy.aio) is generated from the same declarations.
+
+    :param str      template:   URI template of the endpoint, with dynamic segments in the form :name:
+    :param function fn:         Decorated function that post-processes the couch data of a response
+    :param str      method:     HTTP verb (Default: get)
+    :param dict     query_keys: Allowed query parameter keys (Default: None, any key is allowed)
+    :param dict     data_keys:  Allowed request body keys (Default: None, any key is allowed)
+    :param bool     stream:     Hand the unread response to the decorated function instead of its decoded JSON
+                                body, so that it can be consumed incrementally.  Errors are still returned as
+                                CouchError. (Default: False)
+    :param str      cache:      How the endpoint uses the document cache of the instance it is called on, if any.
+                                'read' serves documents from the cache and revalidates them with If-None-Match;
+                                'evict' drops every document the request writes from the cache after it succeeds.
+                                (Default: None)
+    :param bool     idempotent: The request can be repeated safely when it fails, see couchapy.retry.RetryPolicy.
+                                By default, GET and HEAD requests are, and PUT and DELETE requests are when they
+                                carry a rev. (Default: None)
+    :param bool     retry_docs: The endpoint saves documents in bulk; documents that failed with a transient error
+                                are re-sent by the retry policy. (Default: False)
+
+    Every endpoint also accepts a retry keyword argument at call time; retry=False disables the retry policy of
+    the CouchDB instance for the call.  The node keyword argument sends the call to the given node address
+    instead of the host and port, or the load balanced nodes, of the CouchDB instance.
+
+    Every endpoint also accepts a response_format keyword argument at call time, which defaults to the
+    response_format of the CouchDB instance: 'json' decodes the body; 'bytes', 'memoryview' and 'stream'
+    skip decoding and return a RawResponse; 'rows' returns a couchapy.stream.JsonArrayStream that parses the
+    rows, docs or results of a view, _all_docs or _find response one at a time as they are received, or a
+    CouchError.  A JsonArrayStream releases its connection once iterated to the end, or when closed.
+
+    A raw request body (bytes, a file object or an iterator of bytes) can be sent in place of the JSON
+    encoded data with the body keyword argument, and the headers keyword argument adds or overrides
+    request headers, e.g. headers={'Content-Type': 'image/png'}.
+    """
+    def __init__(self, template, fn, **kwargs):
+        self.template = template
+        self.uri = UriTemplate(template)
+        self.fn = fn
+        self.method = kwargs.get('method', 'get')
+        self.query_keys = kwargs.get('query_keys', None)
+        self.data_keys = kwargs.get('data_keys', None)
+        self.stream = kwargs.get('stream', False)
+        self.cache = kwargs.get('cache', None)
+        # design and local documents are cached under their full id, e.g. _design/orders
+        self._docid_prefix = next((prefix for prefix in ['_design/', '_local/'] if f'/{prefix}:docid:' in template), '')
+        self._idempotent = kwargs.get('idempotent', None)
+        self.retry_docs = kwargs.get('retry_docs', False)
+
+    def prepare(self, instance, kwargs):
+        """
+        Builds the URI and request arguments for a call made on instance with the given keyword arguments.
+
+        :returns tuple (uri, request keyword arguments)
+        """
+        # merged into a new dict; the predefined segments are shared by every thread using the instance
+        dynamic_segments = {**getattr(instance, '_predefined_segments', {}), **kwargs.get('uri_segments', {})}
+        cookies = {'AuthSession': instance.parent.session.auth_token or None}
+        uri = instance.parent._base_uri + self.uri.format(dynamic_segments)
+
+        if ('data' in kwargs):
+            _process_filter_format(self.data_keys, kwargs.get('data'))
+
+        if ('params' in kwargs):
+            _process_filter_format(self.query_keys, kwargs.get('params'))
+
+        headers = instance.parent._headers
+        if kwargs.get('headers'):
+            # header names are case-insensitive; drop the defaults that are overridden
+            overridden = {name.lower() for name in kwargs['headers']}
+            headers = {**{name: value for name, value in headers.items() if name.lower() not in overridden},
+                       **kwargs['headers']}
+
+        request_kwargs = {'headers': headers,
+                          'cookies': cookies,
+                          'params': kwargs.get('params', None)}
+
+        if kwargs.get('body') is not None:
+            # sent as is; files and iterators are streamed instead of being read into memory
+            request_kwargs['data'] = kwargs.get('body')
+        elif self.method in ['post', 'put', 'head'] and kwargs.get('data') is not None:
+            request_kwargs['data'] = instance.parent._codec.dumps(kwargs.get('data'))
+
+            compressor = getattr(instance.parent, '_compressor', None)
+            compressed = compressor.compress(request_kwargs['data']) if compressor is not None else None
+            if compressed is not None:
+                request_kwargs['data'] = compressed
+                request_kwargs['headers'] = {**headers, 'Content-Encoding': compressor.encoding}
+
+        if self.stream or self.response_format(instance, kwargs) in ['stream', 'rows']:
+            request_kwargs['stream'] = True
+
+        return uri, request_kwargs
+
+    def idempotent(self, kwargs):
+        """
+        :returns bool True if the call can be repeated without changing its outcome
+        """
+        if self._idempotent is not None:
+            return self._idempotent
+
+        if self.method in ['get', 'head']:
+            return True
+
+        # a stale rev makes a repeated write fail with a conflict instead of applying it twice
+        data = kwargs.get('data')
+        return self.method in ['put', 'delete'] and \
+            ('rev' in (kwargs.get('params') or {}) or (isinstance(data, dict) and '_rev' in data))
+
+    def retry_policy(self, instance, kwargs):
+        """
+        :returns RetryPolicy of the CouchDB instance, or None if the call must not be retried
+        """
+        if kwargs.get('retry', True) is False:
+            return None
+
+        # streamed bodies cannot be sent twice
+        body = kwargs.get('body')
+        if body is not None and not isinstance(body, (bytes, bytearray, memoryview, str)):
+            return None
+
+        return getattr(instance.parent, '_retry_policy', None)
+
+    def response_format(self, instance, kwargs):
+        response_format = kwargs.get('response_format', getattr(instance.parent, 'response_format', 'json'))
+
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f'Unknown response format "{response_format}".  Expected one of: {", ".join(RESPONSE_FORMATS)}')
+
+        return response_format
+
+    def raw(self, instance, status_code, reason, headers, body, close=None):
+        """
+        Wraps an undecoded response in a RawResponse.
+        """
+        if (status_code in [requests.codes['ok'], requests.codes['created'], requests.codes['accepted']]):
+            instance.parent.session.set_auth_token_from_headers(headers)
+
+        return RawResponse(status_code, reason, headers, body, close)
+
+    def rows(self, instance, response):
+        """
+        Wraps a streamed response in a JsonArrayStream of its rows, docs or results.
+        """
+        if response.status_code not in [requests.codes['ok'], requests.codes['created'], requests.codes['accepted']]:
+            with response:
+                return couchapy.error.from_raw_response(response, instance.parent._codec)
+
+        return couchapy.stream.JsonArrayStream(response.iter_chunks(), close=response.close, codec=instance.parent._codec)
+
+    def observe(self, instance, status_code, request_kwargs, response_bytes, timings):
+        """
+        Reports the metrics of a call to every observer of the CouchDB instance.
+        """
+        data = request_kwargs.get('data')
+        request_bytes = len(data) if hasattr(data, '__len__') else None if data is not None else 0
+
+        metrics = couchapy.metrics.RequestMetrics(self.template, self.method, status_code, request_bytes,
+                                                  response_bytes, timings)
+        for observer in instance.parent.observers:
+            observer(metrics)
+
+    def cache_key(self, instance, kwargs):
+        """
+        :returns tuple (DocumentCache, (db, docid)) when the call uses the document cache of instance,
+                 otherwise (None, None)
+        """
+        cache = getattr(instance, 'doc_cache', None) if self.cache else None
+
+        # query parameters such as rev or attachments change the representation of the document
+        if cache is None or (self.cache == 'read' and kwargs.get('params')):
+            return None, None
+
+        segments = {**getattr(instance, '_predefined_segments', {}), **kwargs.get('uri_segments', {})}
+        docid = segments.get('docid')
+        return cache, (segments.get('db'), None if docid is None else self._docid_prefix + docid)
+
+    def written_ids(self, kwargs, couch_data):
+        """
+        :returns set of the ids of the documents written by a successful call: the document of the URI, the
+                 Destination of a COPY, and the documents of the request and response bodies
+        """
+        segments = kwargs.get('uri_segments', {})
+        ids = set()
+
+        if self.method != 'copy' and segments.get('docid') is not None:
+            ids.add(self._docid_prefix + segments['docid'])
+
+        destination = next((value for name, value in (kwargs.get('headers') or {}).items()
+                            if name.lower() == 'destination'), None)
+        if destination:
+            ids.add(urllib.parse.unquote(destination.split('?', 1)[0]))
+
+        data = kwargs.get('data')
+        docs = [data] + data.get('docs', []) if isinstance(data, dict) else []
+        results = couch_data if isinstance(couch_data, list) else [couch_data]
+        ids.update(doc['_id'] for doc in docs if isinstance(doc, dict) and '_id' in doc)
+        ids.update(result['id'] for result in results if isinstance(result, dict) and 'id' in result)
+
+        return ids
+
+    def cache_generation(self, instance, kwargs):
+        """
+        :returns int eviction generation of the document cache before a reading call is sent, see
+                 DocumentCache.generation, or None if the call does not read from the cache
+        """
+        cache, _ = self.cache_key(instance, kwargs)
+        return cache.generation() if cache is not None and self.cache == 'read' else None
+
+    def update_cache(self, instance, kwargs, couch_data, response, generation=None):
+        """
+        Caches the document read by a successful call, unless it was evicted after generation, or evicts the
+        documents it wrote.
+        """
+        cache, key = self.cache_key(instance, kwargs)
+        if cache is None or isinstance(couch_data, couchapy.error.CouchError):
+            return
+
+        if self.cache == 'read':
+            # cached encoded, so that every hit decodes a copy the caller is free to modify
+            cache.put(key, response.content, response.headers.get('ETag'), len(response.content), generation)
+            return
+
+        for docid in self.written_ids(kwargs, couch_data):
+            cache.evict((key[0], docid))
+
+    def process(self, instance, status_code, reason, headers, load_json, stream=None):
+        """
+        Converts a response into the couch data handed to the decorated function.
+
+        :param callable load_json:  Returns the decoded JSON body of the response
+        :param          stream:     Unread response returned as the couch data of streaming endpoints
+        """
+        if self.method == 'head':
+            return headers.get('ETag')
+
+        if (status_code in [requests.codes['ok'], requests.codes['created'], requests.codes['accepted']]):
+            instance.parent.session.set_auth_token_from_headers(headers)
+            if self.stream:
+                return stream
+
+            ret_val = load_json()
+            if isinstance(ret_val, str):
+                ret_val = {'data': ret_val}
         else:
-            return segments[matches.group(1)]
+            result = load_json()
+
+            if isinstance(result, str):
+                result = {'data': result}
+                ret_val = couchapy.error.CouchError(**result)
+            else:
+                ret_val = couchapy.error.CouchError(error=reason, reason=reason, status_code=status_code)
 
-    return sub(':([\w_]+):', replace_with_segment, template)
+        return ret_val
 
 
-def endpoint(*args, **kwargs):
-    endpoint = args[0]
+def _send(instance, spec, kwargs, uri, request_kwargs, timings):
+    def request(absolute_uri):
+        return instance.parent._transport.request(spec.method, absolute_uri, timings=timings, **request_kwargs)
+
+    return instance.parent._dispatch(request, uri, kwargs.get('node'), spec.retry_policy(instance, kwargs),
+                                     spec.idempotent(kwargs))
+
+
+def _raw_call(instance, spec, kwargs, uri, request_kwargs, timings, response_format):
+    """
+    Performs a call with a response format other than json.
+
+    :returns RawResponse, JsonArrayStream or CouchError
+    """
+    response = _send(instance, spec, kwargs, uri, request_kwargs, timings)
+
+    if response_format in ['stream', 'rows']:
+        if timings is not None:
+            spec.observe(instance, response.status_code, request_kwargs, None, timings)
+
+        response.raw.decode_content = True
+        raw = spec.raw(instance, response.status_code, response.reason, response.headers, response.raw, response.close)
+        return raw if response_format == 'stream' else spec.rows(instance, raw)
+
+    if timings is not None:
+        spec.observe(instance, response.status_code, request_kwargs, len(response.content), timings)
+
+    body = response.content if response_format == 'bytes' else memoryview(response.content)
+    return spec.raw(instance, response.status_code, response.reason, response.headers, body)
+
 
-    allowed_query_parameter_keys = kwargs.get('query_keys', None)
-    allowed_data_keys = kwargs.get('data_keys', None)
+def _cached_call(instance, spec, kwargs, uri, request_kwargs, timings):
+    """
+    Serves a call from the document cache: fresh documents without a request, stale ones once the server
+    confirms them with 304 Not Modified.
 
-    request_method = kwargs.get('method', 'get')
-    request_action = getattr(requests, request_method)
+    :returns tuple (response or None, cached couch data or None)
+    """
+    cache, key = spec.cache_key(instance, kwargs)
+    entry = cache.get(key) if cache is not None and spec.cache == 'read' else None
+
+    if entry is None:
+        return _send(instance, spec, kwargs, uri, request_kwargs, timings), None
+
+    if cache.is_fresh(entry):
+        return None, instance.parent._codec.loads(entry.body)
+
+    if entry.etag:
+        request_kwargs['headers'] = {**request_kwargs['headers'], 'If-None-Match': entry.etag}
+
+    response = _send(instance, spec, kwargs, uri, request_kwargs, timings)
+    if response.status_code != requests.codes['not_modified']:
+        return response, None
+
+    if timings is not None:
+        spec.observe(instance, response.status_code, request_kwargs, 0, timings)
+
+    cache.touch(key)
+    return None, instance.parent._codec.loads(entry.body)
+
+
+def _couch_data(instance, spec, response, request_kwargs, timings):
+    """
+    Decodes a response into the couch data handed to the decorated function, and reports its metrics.
+    """
+    codec = instance.parent._codec
+
+    def load_json():
+        if timings is None:
+            return codec.loads(response.content)
+
+        start = time.perf_counter()
+        try:
+            return codec.loads(response.content)
+        finally:
+            timings['decode'] = time.perf_counter() - start
+
+    couch_data = spec.process(instance, response.status_code, response.reason, response.headers,
+                              load_json, stream=response)
+
+    if spec.stream and couch_data is not response:
+        response.close()
+
+    if timings is not None:
+        spec.observe(instance, response.status_code, request_kwargs,
+                     None if couch_data is response else len(response.content), timings)
+
+    return couch_data
+
+
+def _resend_failed_docs(instance, spec, kwargs, couch_data, call):
+    """
+    Re-sends the documents of a bulk save that failed with a transient error, see RetryPolicy.resend_failed_docs.
+    """
+    policy = spec.retry_policy(instance, kwargs) if spec.retry_docs else None
+    if policy is None or not isinstance(couch_data, list) or not isinstance(kwargs.get('data'), dict):
+        return couch_data
+
+    return policy.resend_failed_docs(lambda data: call(instance, **{**kwargs, 'data': data, 'retry': False}),
+                                     kwargs['data'], couch_data)
+
+
+def endpoint(*args, **kwargs):
+    template = args[0]
 
     def set_endpoint(*eargs):
         fn = eargs[0]
+        spec = Endpoint(template, fn, **kwargs)
 
         @wraps(fn)
         def wrapper(self, *query_params, **kwargs):
-            dynamic_segments = getattr(self, '_predefined_segments', {})
-            dynamic_segments.update(kwargs.get('uri_segments', {}))
-            cookies = {'AuthSession': self.parent.session.auth_token or None}
-            uri = f'{self.parent.host}:{self.parent.port}{_build_uri(endpoint, dynamic_segments)}'
-
-            if ('data' in kwargs):
-                _process_filter_format(allowed_data_keys, kwargs.get('data'))
-
-            if ('params' in kwargs):
-                _process_filter_format(allowed_query_parameter_keys, kwargs.get('params'))
-
-            if (request_method == 'post'or request_method == 'put'):
-                response = request_action(uri,
-                                          headers=self.parent._headers,
-                                          cookies=cookies,
-                                          params=kwargs.get('params', None),
-                                          json=kwargs.get('data'))
-
-            elif request_method == 'head':
-                response = request_action(uri,
-                                          headers=self.parent._headers,
-                                          cookies=cookies,
-                                          params=kwargs.get('params', None),
-                                          json=kwargs.get('data'))
-
-                return fn(self, response.headers.get('ETag'))
-            else:
-                response = request_action(uri,
-                                          headers=self.parent._headers,
-                                          cookies=cookies,
-                                          params=kwargs.get('params', None))
-
-            if (response.status_code in [requests.codes['ok'], requests.codes['created'], requests.codes['accepted']]):
-                self.parent.session.set_auth_token_from_headers(response.headers)
-                ret_val = response.json()
-                if isinstance(ret_val, str):
-                    ret_val = {'data': ret_val}
-            else:
-                result = response.json()
+            uri, request_kwargs = spec.prepare(self, kwargs)
+            response_format = spec.response_format(self, kwargs)
+            timings = {} if self.parent.observers else None
+
+            if response_format != 'json':
+                return _raw_call(self, spec, kwargs, uri, request_kwargs, timings, response_format)
+
+            # captured before the request, so that a document evicted while it is read is not cached
+            generation = spec.cache_generation(self, kwargs)
+            response, cached = _cached_call(self, spec, kwargs, uri, request_kwargs, timings)
+            if response is None:
+                return fn(self, cached)
+
+            couch_data = _couch_data(self, spec, response, request_kwargs, timings)
+            couch_data = _resend_failed_docs(self, spec, kwargs, couch_data, wrapper)
+            spec.update_cache(self, kwargs, couch_data, response, generation)
 
-                if isinstance(result, str):
-                    result = {'data': result}
-                    ret_val = couchapy.error.CouchError(**result)
-                else:
-                    ret_val = couchapy.error.CouchError(error=response.reason, reason=response.reason, status_code=response.status_code)
+            return fn(self, couch_data)
 
-            return fn(self, ret_val)
+        # exposes the declaration so that other clients can be generated from it
+        wrapper.endpoint = spec
         return wrapper
     return set_endpoint
 
@@ -120,7 +528,7 @@ class AllowedKeys():
     SERVER__SCHEDULER_DOCS__PARAMS = {'limit': int, 'skip': int}
     SERVER__UUIDS__PARAMS = {'count': int}
 
-    DATABASE__DB__CREATE_PARAMS = {'q': int, 'n': int}
+    DATABASE__DB__CREATE_PARAMS = {'q': int, 'n': int, 'partitioned': bool}
     DATABASE__DB__SAVE__PARAMS = {'batch': str}
 
     VIEW__PARAMS = {'conflicts': bool, 'descending': bool,
@@ -140,7 +548,7 @@ class AllowedKeys():
     DATABASE__DESIGN_DOCS_QUERIES__DATA = {'queries': []}
     DATABASE__DESIGN_DOCS__DATA = {'keys': []}
     DATABASE__LOCAL_DOCS_QUERIES__DATA = {'queries': []}
-    DATABASE__BULK_GET__PARAMS = {'revs': bool}
+    DATABASE__BULK_GET__PARAMS = {'revs': bool, 'attachments': bool, 'latest': bool}
     DATABASE__BULK_GET__DATA = {'docs': [{}]}
     DATABASE__BULK_DOCS__DATA = {'docs': [{}], 'new_edits': bool}
     DATABASE__FIND__DATA = {'selector': {}, 'limit': int, 'skip': int,
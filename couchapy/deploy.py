@@ -0,0 +1,269 @@
+import  time
+
+import  couchapy.error
+
+
+def _ddoc_id(ddoc):
+    return ddoc if ddoc.startswith('_design/') else f'_design/{ddoc}'
+
+
+def _ddoc_name(ddoc):
+    return ddoc[len('_design/'):] if ddoc.startswith('_design/') else ddoc
+
+
+def _task_database(task):
+    # clustered indexer tasks name the shard file, e.g. shards/00000000-7fffffff/somedb.1590000000
+    database = task.get('database', '')
+    if database.startswith('shards/'):
+        return database.split('/')[-1].rsplit('.', 1)[0]
+    return database
+
+
+class BuildProgress():
+    """
+    Build progress of the indexes of a single design document, summed over every shard.
+
+    Attributes:
+    :param str      design_document:    Design document id, e.g. _design/orders
+    :param int      changes_done:       Changes indexed so far by the running indexer tasks
+    :param int      total_changes:      Changes the running indexer tasks have to index
+    :param float    percent:            Build progress, from 0 to 100
+    :param float    eta:                Estimated seconds until the build completes, or None until it can be estimated
+    :param bool     ready:              The indexes are current and can be queried without waiting
+    """
+    def __init__(self, design_document, changes_done=0, total_changes=0, eta=None, ready=False):
+        self.design_document = design_document
+        self.changes_done = changes_done
+        self.total_changes = total_changes
+        self.eta = eta
+        self.ready = ready
+
+    @property
+    def percent(self):
+        if self.ready:
+            return 100.0
+        return 100.0 * self.changes_done / self.total_changes if self.total_changes else 0.0
+
+    def __repr__(self):
+        eta = 'None' if self.eta is None else f'{self.eta:.0f}s'
+        return f'BuildProgress({self.design_document!r}, {self.percent:.1f}%, eta={eta}, ready={self.ready})'
+
+
+class IndexWarmer():
+    """
+    Builds the view and Mango indexes of design documents ahead of the first query, and reports their build
+    progress, e.g. to switch traffic over to a new deployment only once its indexes are ready.
+
+    trigger queries every view of every design document with update=lazy and limit=0, which starts the index
+    build in the background without waiting for it.  Views of a design document share a single index, so the
+    build of all of them starts with the first request.  wait then polls Server.active_tasks for the indexer
+    tasks of every design document and get_ddoc_details for a running updater, and estimates the remaining
+    time from the rate at which changes are indexed.  A design document is ready once neither reports any
+    activity and a query of one of its views, which brings its index up to date, answers.
+
+    This class is not intended to be instanced directly.  See Database.index_warmer and Database.warm_up.
+
+    :param Database database:       Database of the design documents
+    :param list     ddocs:          Design document ids, with or without the _design/ prefix. (Default: [])
+    :param bool     mango:          Also build every Mango index of the database, as listed by get_indices.
+                                    (Default: False)
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param float    poll_interval:  Seconds between two progress polls. (Default: 5)
+    :param float    timeout:        Seconds after which wait raises TimeoutError, or None to wait for as long as it
+                                    takes. (Default: None)
+    :param callable on_progress:    Called with the dict of BuildProgress by design document id after every poll.
+                                    (Default: None)
+
+    Usage Examples:
+      warmer = couchdb_instance.db.index_warmer(ddocs=['orders'], mango=True)
+      warmer.trigger()
+      for ddoc, progress in warmer.progress().items():
+          print(ddoc, progress.percent, progress.eta)
+    """
+    def __init__(self, database, **kwargs):
+        self.database = database
+        self.ddocs = [_ddoc_id(ddoc) for ddoc in kwargs.get('ddocs', [])]
+        self.mango = kwargs.get('mango', False)
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.poll_interval = kwargs.get('poll_interval', 5)
+        self.timeout = kwargs.get('timeout', None)
+        self.on_progress = kwargs.get('on_progress', None)
+
+        self.views = {}
+        self._samples = {}
+
+    def _segments(self, ddoc, **segments):
+        return {**self.uri_segments, 'docid': _ddoc_name(ddoc), **segments}
+
+    def _db_name(self):
+        return self.uri_segments.get('db', self.database._predefined_segments.get('db'))
+
+    def trigger(self):
+        """
+        Starts the index build of every design document.
+
+        :returns dict view names by design document id
+        :returns CouchError if an error occured accessing the couch api
+        """
+        ddocs = list(self.ddocs)
+
+        if self.mango:
+            indexes = self.database.get_indices(uri_segments=self.uri_segments)
+            if isinstance(indexes, couchapy.error.CouchError):
+                return indexes
+            ddocs += [index['ddoc'] for index in indexes.get('indexes', [])
+                      if index.get('ddoc') and index['ddoc'] not in ddocs]
+
+        for ddoc in ddocs:
+            doc = self.database.get_ddoc(uri_segments=self._segments(ddoc))
+            if isinstance(doc, couchapy.error.CouchError):
+                return doc
+
+            self.views[ddoc] = list(doc.get('views', {}))
+            for view in self.views[ddoc]:
+                result = self.database.get_view(uri_segments=self._segments(ddoc, view=view),
+                                                params={'update': 'lazy', 'limit': 0})
+                if isinstance(result, couchapy.error.CouchError):
+                    return result
+
+        return self.views
+
+    def _estimate(self, ddoc, changes_done, total_changes):
+        now = time.monotonic()
+        samples = self._samples.setdefault(ddoc, [])
+
+        # indexer tasks restart their counters for every batch; start over when the work left grows
+        if samples and total_changes - changes_done > samples[-1][2] - samples[-1][1]:
+            samples.clear()
+
+        samples.append((now, changes_done, total_changes))
+        first = samples[0]
+        if now <= first[0] or changes_done <= first[1]:
+            return None
+
+        rate = (changes_done - first[1]) / (now - first[0])
+        return (total_changes - changes_done) / rate
+
+    def progress(self):
+        """
+        Polls the build progress of every design document once.  Design documents that look idle are confirmed
+        ready by querying one of their views.
+
+        :returns dict of BuildProgress by design document id
+        :returns CouchError if an error occured accessing the couch api
+        """
+        tasks = self.database.parent.server.active_tasks()
+        if isinstance(tasks, couchapy.error.CouchError):
+            return tasks
+
+        db_name = self._db_name()
+        indexers = [task for task in tasks
+                    if task.get('type') == 'indexer' and _task_database(task) == db_name]
+
+        progress = {}
+        for ddoc, views in self.views.items():
+            ddoc_tasks = [task for task in indexers if task.get('design_document') == ddoc]
+            changes_done = sum(task.get('changes_done', 0) for task in ddoc_tasks)
+            total_changes = sum(task.get('total_changes', 0) for task in ddoc_tasks)
+
+            busy = bool(ddoc_tasks)
+            if not busy:
+                details = self.database.get_ddoc_details(uri_segments=self._segments(ddoc))
+                if isinstance(details, couchapy.error.CouchError):
+                    return details
+                busy = details.get('view_index', {}).get('updater_running', False)
+
+            ready = False
+            if not busy:
+                # the default update=true brings the index up to date before answering
+                ready = not views or not isinstance(
+                    self.database.get_view(uri_segments=self._segments(ddoc, view=views[0]), params={'limit': 0}),
+                    couchapy.error.CouchError)
+
+            eta = 0.0 if ready else (self._estimate(ddoc, changes_done, total_changes) if ddoc_tasks else None)
+            progress[ddoc] = BuildProgress(ddoc, changes_done, total_changes, eta, ready)
+
+        return progress
+
+    def wait(self):
+        """
+        Polls the build progress until every design document is ready.
+
+        :returns dict of BuildProgress by design document id
+        :returns CouchError if an error occured accessing the couch api
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        while True:
+            progress = self.progress()
+            if isinstance(progress, couchapy.error.CouchError):
+                return progress
+
+            if self.on_progress is not None:
+                self.on_progress(progress)
+
+            if all(build.ready for build in progress.values()):
+                return progress
+
+            if deadline is not None and time.monotonic() + self.poll_interval > deadline:
+                raise TimeoutError(f'Indexes not ready after {self.timeout} seconds: '
+                                   f'{", ".join(ddoc for ddoc, build in progress.items() if not build.ready)}')
+
+            time.sleep(self.poll_interval)
+
+    def run(self):
+        """
+        Starts the index build of every design document and waits until every one is ready.
+
+        :returns dict of BuildProgress by design document id
+        :returns CouchError if an error occured accessing the couch api
+        """
+        views = self.trigger()
+        if isinstance(views, couchapy.error.CouchError):
+            return views
+
+        return self.wait()
+
+
+def _rev(etag):
+    return etag.strip('"') if etag else None
+
+
+def deploy_ddoc(database, ddoc, doc, **kwargs):
+    """
+    Saves doc as a staging design document, builds its indexes, and copies it over the live design document.
+    See Database.deploy_ddoc.
+    """
+    uri_segments = kwargs.pop('uri_segments', {})
+    live = _ddoc_name(ddoc)
+    staging = _ddoc_name(kwargs.pop('staging', f'{live}-staging'))
+    keep_staging = kwargs.pop('keep_staging', False)
+
+    body = {key: value for key, value in doc.items() if key not in ['_id', '_rev']}
+    staging_rev = _rev(database.get_ddoc_info(uri_segments={**uri_segments, 'docid': staging}))
+    saved = database.save_named_ddoc(uri_segments={**uri_segments, 'docid': staging}, data=body,
+                                     params={'rev': staging_rev} if staging_rev else {})
+    if isinstance(saved, couchapy.error.CouchError):
+        return saved
+
+    progress = IndexWarmer(database, ddocs=[staging], uri_segments=uri_segments, **kwargs).run()
+    if isinstance(progress, couchapy.error.CouchError):
+        return progress
+
+    live_rev = _rev(database.get_ddoc_info(uri_segments={**uri_segments, 'docid': live}))
+    destination = f'_design/{live}?rev={live_rev}' if live_rev else f'_design/{live}'
+    copied = database.copy_ddoc(uri_segments={**uri_segments, 'docid': staging}, headers={'Destination': destination})
+    if isinstance(copied, couchapy.error.CouchError):
+        return copied
+
+    if not keep_staging:
+        # the live design document shares the indexes by signature; deleting the staging copy keeps them
+        deleted = database.delete_ddoc(uri_segments={**uri_segments, 'docid': staging}, params={'rev': saved['rev']})
+        if isinstance(deleted, couchapy.error.CouchError):
+            return deleted
+
+    flushed = database.flush_unused_view_cache(uri_segments=uri_segments)
+    if isinstance(flushed, couchapy.error.CouchError):
+        return flushed
+
+    return copied
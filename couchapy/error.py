@@ -6,6 +6,21 @@ class CouchError():
         self.status_code = kwargs.get('status_code', None)
 
 
+def from_raw_response(response, codec):
+    """
+    Converts an unsuccessful RawResponse into a CouchError, using the error and reason of its JSON body if any.
+    """
+    try:
+        result = codec.loads(b''.join(response.iter_chunks()))
+    except ValueError:
+        result = None
+
+    if not isinstance(result, dict):
+        result = {'error': response.reason, 'reason': response.reason}
+
+    return CouchError(error=result.get('error'), reason=result.get('reason'), status_code=response.status_code)
+
+
 class InvalidKeysException(Exception):
     """The passed data contains keys that are not allowed"""
     pass
@@ -0,0 +1,149 @@
+import  math
+import  threading
+
+
+class RequestMetrics():
+    """
+    Measurements of a single endpoint call, handed to every observer of the CouchDB instance.
+
+    Durations are in seconds.  connect is 0 when a pooled connection was reused, and download is 0 for
+    streamed responses, which are read after the endpoint returns.
+
+    Attributes:
+    :param str   endpoint:          URI template of the endpoint, e.g. /:db:/:docid:
+    :param str   method:            HTTP verb
+    :param int   status_code:       HTTP status code of the response
+    :param int   request_bytes:     Size of the request body, or None if it was streamed from a file or iterator
+    :param int   response_bytes:    Size of the (decompressed) response body, or None if it was streamed
+    :param float connect:           Time spent opening a connection, including the TLS handshake
+    :param float wait:              Time from sending the request to receiving the response headers
+    :param float download:          Time spent reading the response body
+    :param float decode:            Time spent decoding the JSON response body
+    """
+    __slots__ = ['endpoint', 'method', 'status_code', 'request_bytes', 'response_bytes',
+                 'connect', 'wait', 'download', 'decode']
+
+    def __init__(self, endpoint, method, status_code, request_bytes, response_bytes, timings):
+        self.endpoint = endpoint
+        self.method = method
+        self.status_code = status_code
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.connect = timings.get('connect', 0.0)
+        self.wait = timings.get('wait', 0.0)
+        self.download = timings.get('download', 0.0)
+        self.decode = timings.get('decode', 0.0)
+
+    @property
+    def total(self):
+        return self.connect + self.wait + self.download + self.decode
+
+
+class Histogram():
+    """
+    Fixed-precision histogram of durations with logarithmic buckets.  Memory grows with the range of the
+    recorded values rather than their number, and percentiles are within 2 ** (1 / precision) - 1 of the
+    exact value (about 4.5% with the default precision).
+
+    :param int precision:   Number of buckets per doubling of the duration. (Default: 16)
+    """
+    minimum = 1e-6
+
+    def __init__(self, precision=16):
+        self._scale = precision / math.log(2)
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = int(math.log(value / self.minimum) * self._scale) if value > self.minimum else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """
+        :returns float The approximate duration below which percent percent of the values fall, or None if
+                 no values were recorded
+        """
+        if not self.count:
+            return None
+
+        if percent >= 100:
+            return self.max
+
+        rank = percent / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # geometric middle of the bucket
+                return min(self.minimum * math.exp((index + 0.5) / self._scale), self.max)
+
+        return self.max
+
+    def summary(self):
+        return {'p50': self.percentile(50), 'p95': self.percentile(95), 'p99': self.percentile(99),
+                'mean': self.sum / self.count if self.count else None, 'max': self.max}
+
+
+class MetricsAggregator():
+    """
+    Observer that aggregates the metrics of every endpoint call in memory, with a latency histogram per
+    endpoint and timing phase.
+
+    Recording a call costs a few microseconds; set enabled to False, or remove the aggregator from the
+    observers of the CouchDB instance, to turn it off.
+
+    :param bool enabled:    Record the calls that are observed. (Default: True)
+    :param int  precision:  Histogram buckets per doubling of the duration.  See Histogram. (Default: 16)
+
+    Usage Examples:
+      metrics = MetricsAggregator()
+      couch = CouchDB(observers=[metrics])
+      ...
+      metrics.summary()['GET /:db:/:docid:']['total']['p99']
+    """
+    phases = ['total', 'connect', 'wait', 'download', 'decode']
+
+    def __init__(self, **kwargs):
+        self.enabled = kwargs.get('enabled', True)
+        self.precision = kwargs.get('precision', 16)
+
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def __call__(self, metrics):
+        if not self.enabled:
+            return
+
+        key = f'{metrics.method.upper()} {metrics.endpoint}'
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = {'count': 0, 'errors': 0, 'request_bytes': 0, 'response_bytes': 0,
+                                                'histograms': {phase: Histogram(self.precision) for phase in self.phases}}
+
+            stats['count'] += 1
+            stats['errors'] += 1 if metrics.status_code >= 400 else 0
+            stats['request_bytes'] += metrics.request_bytes or 0
+            stats['response_bytes'] += metrics.response_bytes or 0
+            for phase, histogram in stats['histograms'].items():
+                histogram.add(getattr(metrics, phase))
+
+    def summary(self):
+        """
+        :returns dict "<METHOD> <endpoint template>" -> count, errors (status codes of 400 and above),
+                 request_bytes, response_bytes, and the p50, p95, p99, mean and max seconds of every phase
+        """
+        with self._lock:
+            return {key: {'count': stats['count'], 'errors': stats['errors'],
+                          'request_bytes': stats['request_bytes'], 'response_bytes': stats['response_bytes'],
+                          **{phase: histogram.summary() for phase, histogram in stats['histograms'].items()}}
+                    for key, stats in self._endpoints.items()}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
@@ -0,0 +1,369 @@
+from    email.parser import BytesHeaderParser
+import  os
+import  uuid
+
+import  requests
+
+import  couchapy.bulk
+import  couchapy.error
+
+
+def _header_message(value):
+    """
+    Parses raw header lines into an email.message.Message, which knows how to read header parameters such as
+    the boundary of a Content-Type or the filename of a Content-Disposition.
+    """
+    return BytesHeaderParser().parsebytes(value)
+
+
+def content_type_message(content_type):
+    return _header_message(b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n')
+
+
+class Part():
+    """
+    A single part of a multipart body.  The headers are read eagerly; the body is read lazily, from the
+    underlying response, as it is consumed.
+
+    Parts must be read in order: moving to the next part of the body discards whatever is left of this one.
+
+    This class is not intended to be instanced directly.
+
+    Attributes:
+    :param Message  headers:        Headers of the part
+    :param str      content_type:   MIME type of the part, e.g. application/json
+    :param str      name:           Attachment name, for attachment parts of a document
+    """
+    def __init__(self, reader, headers):
+        self.headers = headers
+        self.content_type = headers.get_content_type()
+        self.name = headers.get_filename()
+        self._reader = reader
+        self._done = False
+
+    def read(self, size=-1):
+        """
+        :returns bytes Up to size bytes of the body, or the rest of it if size is negative.  b'' once the part
+                 is exhausted.
+        """
+        if size is None or size < 0:
+            return b''.join(self.iter_chunks())
+
+        if self._done or size == 0:
+            return b''
+
+        chunk = self._reader._read_part(size)
+        if not chunk:
+            self._done = True
+        return chunk
+
+    def iter_chunks(self, chunk_size=65536):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def drain(self):
+        for _ in self.iter_chunks():
+            pass
+
+
+class MultipartReader():
+    """
+    Incremental parser of multipart bodies (RFC 2046) that never holds more than a chunk of the body in memory.
+
+    This class is not intended to be instanced directly.
+
+    :param iterable chunks:     Chunks of the body, e.g. RawResponse.iter_chunks()
+    :param str      boundary:   Boundary parameter of the Content-Type of the body
+
+    :yields Part for every part of the body
+    """
+    def __init__(self, chunks, boundary):
+        self._chunks = iter(chunks)
+        # the first delimiter is not preceded by a line break
+        self._buffer = bytearray(b'\r\n')
+        self._delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self._part = None
+        self._finished = False
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        return False
+
+    def _find(self, needle, start=0):
+        while True:
+            index = self._buffer.find(needle, start)
+            if index >= 0:
+                return index
+
+            start = max(0, len(self._buffer) - len(needle) + 1)
+            if not self._fill():
+                raise ValueError('Truncated multipart body')
+
+    def _read_part(self, size):
+        while True:
+            index = self._buffer.find(self._delimiter)
+            # keep enough bytes to recognize a delimiter split across chunks
+            available = index if index >= 0 else len(self._buffer) - len(self._delimiter) + 1
+
+            if available > 0:
+                chunk = bytes(self._buffer[:min(size, available)])
+                del self._buffer[:len(chunk)]
+                return chunk
+
+            if index == 0:
+                return b''
+
+            if not self._fill():
+                raise ValueError('Truncated multipart body')
+
+    def __iter__(self):
+        while not self._finished:
+            if self._part is not None:
+                self._part.drain()
+
+            index = self._find(self._delimiter)
+            del self._buffer[:index + len(self._delimiter)]
+
+            while len(self._buffer) < 2:
+                if not self._fill():
+                    raise ValueError('Truncated multipart body')
+
+            if self._buffer[:2] == b'--':
+                self._finished = True
+                return
+
+            # skip transport padding up to the end of the delimiter line, then read the headers
+            del self._buffer[:self._find(b'\r\n') + 2]
+
+            if self._buffer[:2] == b'\r\n':
+                raw_headers = b''
+                del self._buffer[:2]
+            else:
+                end = self._find(b'\r\n\r\n')
+                raw_headers = bytes(self._buffer[:end + 2])
+                del self._buffer[:end + 4]
+
+            self._part = Part(self, _header_message(raw_headers + b'\r\n'))
+            yield self._part
+
+
+class MultipartDocument():
+    """
+    A document fetched together with its attachments as multipart/related.  The document is parsed as soon as
+    it is received, while its attachments are streamed from the response as they are iterated.
+
+    Attachments must be consumed in order, before the next document of a bulk_get response.
+
+    This class is not intended to be instanced directly.  See Database.get_doc_with_attachments and
+    Database.bulk_get_with_attachments.
+
+    Attributes:
+    :param dict     doc:            The document.  Its _attachments list the attachments that follow it.
+
+    Usage Examples:
+      with couchdb_instance.db.get_doc_with_attachments(uri_segments={'docid': 'somedoc'}) as result:
+          for attachment in result.attachments:
+              with open(attachment.name, 'wb') as file:
+                  for chunk in attachment.iter_chunks():
+                      file.write(chunk)
+    """
+    def __init__(self, doc, parts=None, response=None):
+        self.doc = doc
+        self._parts = parts
+        self._response = response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def attachments(self):
+        """
+        :yields Part for every attachment that follows the document, with the name and content_type of the attachment
+        """
+        if self._parts is None:
+            return
+
+        following = [name for name, info in self.doc.get('_attachments', {}).items() if info.get('follows')]
+
+        for index, part in enumerate(self._parts):
+            if part.name is None and index < len(following):
+                part.name = following[index]
+            yield part
+
+    def read_attachments(self):
+        """
+        Reads every remaining attachment into memory.
+
+        :returns dict attachment name -> bytes
+        """
+        return {part.name: part.read() for part in self.attachments}
+
+    def close(self):
+        if self._response is not None:
+            self._response.close()
+
+
+def read_related(chunks, boundary, codec, response=None):
+    """
+    :returns MultipartDocument from a multipart/related body whose first part is the document JSON
+    """
+    parts = iter(MultipartReader(chunks, boundary))
+    doc = codec.loads(next(parts).read())
+    return MultipartDocument(doc, parts, response)
+
+
+def read_document(response, codec):
+    """
+    Reads the response of a document requested with Accept: multipart/related.  CouchDB answers with plain JSON
+    when the document has no attachments to send.
+
+    :returns MultipartDocument
+    :returns CouchError if an error occured accessing the couch api
+    """
+    if response.status_code != requests.codes['ok']:
+        with response:
+            return couchapy.error.from_raw_response(response, codec)
+
+    message = content_type_message(response.headers.get('Content-Type', 'application/json'))
+    if message.get_content_type() == 'multipart/related':
+        return read_related(response.iter_chunks(), message.get_param('boundary'), codec, response)
+
+    with response:
+        return MultipartDocument(codec.loads(b''.join(response.iter_chunks())))
+
+
+def iter_bulk_get(response, codec):
+    """
+    Reads the response of a bulk_get request made with Accept: multipart/mixed.
+
+    :yields MultipartDocument for every document
+    :yields CouchError for every document that could not be read, or if an error occured accessing the couch api
+    """
+    with response:
+        if response.status_code != requests.codes['ok']:
+            yield couchapy.error.from_raw_response(response, codec)
+            return
+
+        message = content_type_message(response.headers.get('Content-Type', 'application/json'))
+        if message.get_content_type() == 'multipart/mixed':
+            yield from iter_mixed(response.iter_chunks(), message.get_param('boundary'), codec)
+            return
+
+        for result in codec.loads(b''.join(response.iter_chunks())).get('results', []):
+            doc = couchapy.bulk._bulk_get_result(result)
+            yield doc if isinstance(doc, couchapy.error.CouchError) else MultipartDocument(doc)
+
+
+def iter_mixed(chunks, boundary, codec):
+    """
+    Parses a multipart/mixed bulk_get response.
+
+    :yields MultipartDocument for every document
+    :yields CouchError for every document that could not be read
+    """
+    for part in MultipartReader(chunks, boundary):
+        if part.content_type == 'multipart/related':
+            yield read_related(part.iter_chunks(), part.headers.get_param('boundary'), codec)
+            continue
+
+        result = codec.loads(part.read())
+        if part.headers.get_param('error') == 'true' or ('error' in result and '_id' not in result):
+            yield couchapy.error.CouchError(error=result.get('error'), reason=result.get('reason'), status_code=404
+                                            if result.get('error') == 'not_found' else None)
+        else:
+            yield MultipartDocument(result)
+
+
+def _source_length(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+
+    if hasattr(source, 'seek') and source.seekable():
+        position = source.tell()
+        length = source.seek(0, os.SEEK_END) - position
+        source.seek(position)
+        return length
+
+    raise ValueError('The length of attachments read from iterators must be given')
+
+
+def _source_chunks(source, chunk_size=65536):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+class RelatedBody():
+    """
+    Streamed multipart/related request body of a document and its attachments.
+
+    The length of the body is known up front, as CouchDB requires, so it is sent with a Content-Length header
+    rather than chunked transfer encoding.  Attachment data is only read while the body is being sent.
+
+    This class is not intended to be instanced directly.  See Database.save_doc_with_attachments.
+
+    :param dict doc:            Document to save.  Its _attachments are replaced by the attachments that follow it.
+    :param dict attachments:    Attachment name -> (content_type, source) or (content_type, source, length).
+                                source is bytes, a binary file object, or an iterator of bytes, which requires
+                                the length.
+    :param      codec:          JSON codec used to encode the document
+    """
+    def __init__(self, doc, attachments, codec):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/related; boundary="{self.boundary}"'
+
+        self._sources = []
+        stubs = {}
+        for name, attachment in attachments.items():
+            content_type, source = attachment[0], attachment[1]
+            length = attachment[2] if len(attachment) > 2 else _source_length(source)
+
+            stubs[name] = {'follows': True, 'content_type': content_type, 'length': length}
+            self._sources.append((content_type, source, length))
+
+        # CouchDB pairs the parts with the attachments that follow in the order they are listed, so replaced
+        # attachments are dropped from the kept stubs rather than updated where they were
+        doc = dict(doc)
+        doc['_attachments'] = {**{name: info for name, info in doc.get('_attachments', {}).items()
+                                  if info.get('stub') and name not in stubs}, **stubs}
+
+        self._doc = codec.dumps(doc)
+        self._length = len(self._head('application/json', first=True)) + len(self._doc) + len(self._tail())
+        for content_type, source, length in self._sources:
+            self._length += len(self._head(content_type)) + length
+
+    def _head(self, content_type, first=False):
+        # CouchDB expects the body to start with the first delimiter, without a preamble
+        head = f'--{self.boundary}\r\nContent-Type: {content_type}\r\n\r\n'.encode('latin-1')
+        return head if first else b'\r\n' + head
+
+    def _tail(self):
+        return f'\r\n--{self.boundary}--'.encode('latin-1')
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        yield self._head('application/json', first=True) + self._doc
+
+        for content_type, source, length in self._sources:
+            yield self._head(content_type)
+            yield from _source_chunks(source)
+
+        yield self._tail()
@@ -0,0 +1,352 @@
+from    concurrent.futures import ThreadPoolExecutor
+import  heapq
+import  itertools
+import  json
+import  queue
+import  threading
+
+import  couchapy.error
+
+
+class ViewPager():
+    """
+    Iterates every row of a view, _all_docs or _design_docs one page at a time, using keyset
+    pagination (startkey/startkey_docid) instead of skip, so every page costs the server the same.
+
+    While the rows of a page are being consumed, the next page is already being fetched on a
+    background thread.  At most two pages are held in memory at any time.
+
+    This class is not intended to be instanced directly.  See Database.iter_view, Database.iter_docs
+    and Database.iter_design_docs.
+
+    :param callable query:          Bound endpoint method used to fetch a page, e.g. Database.get_view
+    :param dict     params:         Query parameters.  See AllowedKeys.VIEW__PARAMS.  skip is ignored and limit
+                                    caps the total number of rows returned. (Default: {})
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param int      page_size:      Number of rows requested per page. (Default: 1000)
+    :param bool     prefetch:       Fetch the next page while the current one is being consumed. (Default: True)
+    :param bool     docid_keys:     Also page on the document id of the last row, which is required when keys
+                                    are not unique, e.g. for map views. (Default: True)
+
+    Attributes:
+    :param dict     meta:           Members of the most recent page other than rows, e.g. total_rows and offset
+
+    :yields dict for every row
+    :yields CouchError if an error occured accessing the couch api, after which iteration stops
+    """
+    def __init__(self, query, **kwargs):
+        self.query = query
+        self.params = dict(kwargs.get('params', {}))
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.page_size = kwargs.get('page_size', 1000)
+        self.prefetch = kwargs.get('prefetch', True)
+        self.docid_keys = kwargs.get('docid_keys', True)
+
+        self.meta = {}
+
+    def _fetch(self, params):
+        return self.query(uri_segments=self.uri_segments, params=params)
+
+    def _page_params(self, params, remaining):
+        # one extra row is requested; it becomes the first row of the next page
+        page_params = dict(params)
+        page_params['limit'] = (self.page_size if remaining is None else min(self.page_size, remaining)) + 1
+        return page_params
+
+    def _next_params(self, params, row):
+        params = dict(params)
+        for key in ['start_key', 'start_key_doc_id', 'startkey_docid']:
+            params.pop(key, None)
+
+        params['startkey'] = json.dumps(row['key'])
+        if self.docid_keys and 'id' in row:
+            params['startkey_docid'] = row['id']
+
+        return params
+
+    def __iter__(self):
+        params = dict(self.params)
+        params.pop('skip', None)
+        remaining = params.pop('limit', None)
+
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+
+        try:
+            page = self._fetch(self._page_params(params, remaining))
+
+            while True:
+                if isinstance(page, couchapy.error.CouchError):
+                    yield page
+                    return
+
+                rows = page.pop('rows', [])
+                self.meta = page
+
+                limit = self.page_size if remaining is None else min(self.page_size, remaining)
+                page_rows = rows[:limit]
+                next_row = rows[limit] if len(rows) > limit else None
+                del rows
+
+                if remaining is not None:
+                    remaining -= len(page_rows)
+
+                next_page = None
+                if next_row is not None and remaining != 0:
+                    params = self._next_params(params, next_row)
+                    if executor is not None:
+                        next_page = executor.submit(self._fetch, self._page_params(params, remaining))
+
+                yield from page_rows
+
+                if next_row is None or remaining == 0:
+                    return
+
+                page = next_page.result() if next_page is not None else self._fetch(self._page_params(params, remaining))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+
+_DONE = object()
+
+
+class _SliceFailed(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+class _SliceReader():
+    """
+    Reads the rows of one slice of a ParallelScan one page at a time, as tasks of the executor shared by every
+    slice, so that a slice only occupies a worker while one of its pages is being fetched.  At most buffer_pages
+    pages are fetched ahead of the consumer.
+    """
+    def __init__(self, scan, executor, stop, uri_segments, params):
+        self.page_size = scan.page_size
+        self.buffer_pages = max(scan.buffer_pages, 1)
+        self.executor = executor
+        self.stop = stop
+        self.rows = iter(ViewPager(scan.query, uri_segments=uri_segments, params=params, page_size=scan.page_size,
+                                   prefetch=False, docid_keys=scan.docid_keys))
+
+        self.pages = queue.Queue()
+        self.lock = threading.Lock()
+        # pages fetched that the consumer has not taken yet
+        self.buffered = 0
+        self.fetching = False
+        self.finished = False
+
+    def start(self):
+        with self.lock:
+            self._fill()
+
+    def _fill(self):
+        # called with the lock held; a single page is fetched at a time, since the pager is not thread-safe
+        if not (self.fetching or self.finished or self.stop.is_set()) and self.buffered < self.buffer_pages:
+            self.fetching = True
+            self.executor.submit(self._fetch)
+
+    def _fetch(self):
+        if self.stop.is_set():
+            return
+
+        try:
+            page = list(itertools.islice(self.rows, self.page_size))
+            finished = len(page) < self.page_size or isinstance(page[-1], couchapy.error.CouchError)
+        except Exception as exception:
+            page, finished = exception, True
+
+        with self.lock:
+            if page:
+                self.pages.put(page)
+                self.buffered += 1
+            if finished:
+                self.pages.put(_DONE)
+
+            self.fetching = False
+            self.finished = finished
+            self._fill()
+
+    def __iter__(self):
+        while True:
+            page = self.pages.get()
+            if page is _DONE:
+                return
+            if isinstance(page, Exception):
+                raise page
+
+            with self.lock:
+                self.buffered -= 1
+                self._fill()
+
+            for row in page:
+                if isinstance(row, couchapy.error.CouchError):
+                    raise _SliceFailed(row)
+                yield row
+
+
+class ParallelScan():
+    """
+    Scans several independent slices of a key space concurrently, e.g. the partitions of a partitioned database
+    or disjoint key ranges of _all_docs, and yields their rows as a single stream in key order.
+
+    Every slice is paged with a ViewPager, at most buffer_pages pages ahead of the consumer.  Pages are fetched
+    by a pool of concurrency threads shared by every slice, so that no more than concurrency page requests are
+    in flight at any time, however many slices there are.
+
+    When key is None the slices must be disjoint and given in key order, and their rows are yielded one slice
+    after the other; slices are started as the consumer reaches them, at most concurrency slices ahead.
+    Otherwise the rows of every slice are merged with heapq.merge on key(row), which must order rows the way
+    CouchDB collates them, e.g. row['id'] for _all_docs.  Merging needs the next row of every slice, so every
+    slice is started at once and buffers up to buffer_pages pages: memory grows with the number of slices.
+
+    This class is not intended to be instanced directly.  See Database.scan_docs and Database.scan_view.
+
+    :param callable query:          Bound endpoint method used to fetch a page, e.g. Database.get_docs
+    :param list     slices:         (uri_segments, params) of every slice
+    :param          key:            Callable returning the merge key of a row, or None to concatenate the slices
+                                    in order. (Default: None)
+    :param int      concurrency:    Maximum number of page requests in flight. (Default: 4)
+    :param int      page_size:      Number of rows requested per page. (Default: 1000)
+    :param int      buffer_pages:   Number of pages fetched ahead of the consumer per slice. (Default: 2)
+    :param bool     docid_keys:     See ViewPager. (Default: True)
+
+    :yields dict for every row
+    :yields CouchError if an error occured accessing the couch api, after which iteration stops
+    """
+    def __init__(self, query, slices, **kwargs):
+        self.query = query
+        self.slices = list(slices)
+        self.key = kwargs.get('key', None)
+        self.concurrency = kwargs.get('concurrency', 4)
+        self.page_size = kwargs.get('page_size', 1000)
+        self.buffer_pages = kwargs.get('buffer_pages', 2)
+        self.docid_keys = kwargs.get('docid_keys', True)
+
+    def _chain(self, readers):
+        for index, reader in enumerate(readers):
+            for ahead in readers[index:index + self.concurrency]:
+                ahead.start()
+            yield from reader
+
+    def _merge(self, readers):
+        for reader in readers:
+            reader.start()
+        yield from heapq.merge(*readers, key=self.key)
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        stop = threading.Event()
+        readers = [_SliceReader(self, executor, stop, uri_segments, params) for uri_segments, params in self.slices]
+
+        try:
+            yield from self._chain(readers) if self.key is None else self._merge(readers)
+        except _SliceFailed as failure:
+            yield failure.error
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+
+class FindCursor():
+    """
+    Iterates every document matching a Mango selector one page at a time, following the bookmark returned
+    with every page of Database.find.  While the documents of a page are being consumed, the next page is
+    already being fetched on a background thread.  Iteration stops at the first empty page.
+
+    With execution_stats enabled in data, the statistics of every page are collected, so that selectors which
+    examine many more documents than they return, e.g. because no index covers them, can be spotted.
+
+    This class is not intended to be instanced directly.  See Database.iter_find.
+
+    :param callable query:          Bound endpoint method used to fetch a page, e.g. Database.find
+    :param dict     data:           Request body.  See AllowedKeys.DATABASE__FIND__DATA.  skip is ignored, limit caps
+                                    the total number of documents returned and bookmark resumes an earlier cursor.
+                                    (Default: {})
+    :param dict     uri_segments:   Dynamic URI segments. (Default: {})
+    :param int      page_size:      Number of documents requested per page. (Default: 1000)
+    :param bool     prefetch:       Fetch the next page while the current one is being consumed. (Default: True)
+
+    Attributes:
+    :param str      bookmark:       Bookmark of the most recent page; resumes iteration after its last document
+    :param str      warning:        Warning returned with the most recent page, e.g. that no index was used
+    :param list     execution_stats: execution_stats of every page fetched so far
+
+    :yields dict for every document
+    :yields CouchError if an error occured accessing the couch api, after which iteration stops
+
+    Usage Examples:
+      cursor = couchdb_instance.db.iter_find(data={'selector': {'type': 'order'}, 'execution_stats': True})
+      for doc in cursor:
+          ...
+      cursor.totals['total_docs_examined'] / max(cursor.totals['results_returned'], 1)
+    """
+    def __init__(self, query, **kwargs):
+        self.query = query
+        self.data = dict(kwargs.get('data', {}))
+        self.uri_segments = kwargs.get('uri_segments', {})
+        self.page_size = kwargs.get('page_size', 1000)
+        self.prefetch = kwargs.get('prefetch', True)
+
+        self.bookmark = self.data.pop('bookmark', None)
+        self.warning = None
+        self.execution_stats = []
+
+    @property
+    def totals(self):
+        """
+        :returns dict the sum of every numeric member of the execution_stats of the pages fetched so far
+        """
+        totals = {}
+        for stats in self.execution_stats:
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _fetch(self, bookmark, remaining):
+        data = {key: value for key, value in self.data.items() if key not in ['skip', 'limit']}
+        data['limit'] = self.page_size if remaining is None else min(self.page_size, remaining)
+        if bookmark is not None:
+            data['bookmark'] = bookmark
+
+        return self.query(uri_segments=self.uri_segments, data=data)
+
+    def __iter__(self):
+        remaining = self.data.get('limit')
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+
+        try:
+            page = self._fetch(self.bookmark, remaining)
+
+            while True:
+                if isinstance(page, couchapy.error.CouchError):
+                    yield page
+                    return
+
+                docs = page.get('docs', [])[:remaining]
+                self.warning = page.get('warning')
+                if 'execution_stats' in page:
+                    self.execution_stats.append(page['execution_stats'])
+
+                if not docs:
+                    return
+
+                self.bookmark = page.get('bookmark', self.bookmark)
+                if remaining is not None:
+                    remaining -= len(docs)
+
+                next_page = None
+                if remaining != 0 and executor is not None:
+                    next_page = executor.submit(self._fetch, self.bookmark, remaining)
+
+                yield from docs
+
+                if remaining == 0:
+                    return
+
+                page = next_page.result() if next_page is not None else self._fetch(self.bookmark, remaining)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
@@ -0,0 +1,235 @@
+import  asyncio
+import  random
+import  threading
+import  time
+
+import  requests
+import  urllib3
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+RETRYABLE_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        requests.exceptions.ChunkedEncodingError)
+
+ASYNC_RETRYABLE_EXCEPTIONS = (aiohttp.ClientConnectionError, asyncio.TimeoutError) if aiohttp is not None else \
+                             (asyncio.TimeoutError,)
+
+
+def _not_sent(exception):
+    """
+    :returns bool True if the request failed before it reached the server, so that retrying it is always safe
+    """
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+
+    if aiohttp is not None and isinstance(exception, aiohttp.ClientConnectorError):
+        return True
+
+    reason = getattr(exception.args[0], 'reason', None) if exception.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After')) if headers is not None and headers.get('Retry-After') else None
+    except ValueError:
+        # HTTP dates are not worth parsing; fall back to the backoff
+        return None
+
+
+class RetryPolicy():
+    """
+    Retries requests that failed with a transient error: a connection error or timeout, or one of the
+    retryable status codes, e.g. during cluster rebalances.
+
+    Retries are delayed with exponential backoff and full jitter, so that clients do not retry in lockstep,
+    and honour the Retry-After header of 429 and 503 responses.  A retry budget caps retries at a fraction
+    of the requests made, so that an overloaded cluster is not flooded with retries.
+
+    Only requests that are safe to repeat are retried: GET and HEAD, PUT and DELETE with a rev, and read-only
+    POST endpoints such as bulk_get, find and view queries.  Any request is retried when it provably never
+    reached the server, or was rejected with 429 Too Many Requests.  Requests whose body is streamed from a
+    file or iterator are never retried.  bulk_save re-sends only the documents that failed with a transient
+    per-document error.
+
+    Retries can be disabled for a single call with retry=False.
+
+    This class is not intended to be instanced directly.  Configure it through the retry_kwargs argument
+    of CouchDB.
+
+    :param int   max_retries:       Maximum number of retries of a request. (Default: 3)
+    :param float backoff:           Seconds before the first retry; doubled for every further retry. (Default: 0.1)
+    :param float max_backoff:       Maximum number of seconds between two attempts. (Default: 10)
+    :param bool  jitter:            Pick every delay at random between 0 and the backoff. (Default: True)
+    :param list  statuses:          Retryable HTTP status codes. (Default: [429, 500, 502, 503, 504])
+    :param list  doc_errors:        Per-document bulk_save errors that are retried.
+                                    (Default: ['unknown_error', 'timeout', 'internal_server_error', 'service_unavailable'])
+    :param float budget_ratio:      Retries allowed per request made, over time. (Default: 0.2)
+    :param int   budget_reserve:    Retries allowed at any time regardless of the ratio, e.g. when the client
+                                    starts. (Default: 10)
+    """
+    def __init__(self, **kwargs):
+        self.max_retries = kwargs.get('max_retries', 3)
+        self.backoff = kwargs.get('backoff', 0.1)
+        self.max_backoff = kwargs.get('max_backoff', 10)
+        self.jitter = kwargs.get('jitter', True)
+        self.statuses = set(kwargs.get('statuses', [429, 500, 502, 503, 504]))
+        self.doc_errors = set(kwargs.get('doc_errors', ['unknown_error', 'timeout', 'internal_server_error',
+                                                        'service_unavailable']))
+        self.budget_ratio = kwargs.get('budget_ratio', 0.2)
+        self.budget_reserve = kwargs.get('budget_reserve', 10)
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.budget_reserve)
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :returns float Seconds to wait before retry number attempt (starting at 0)
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+
+        return delay
+
+    def _deposit(self):
+        with self._lock:
+            self._tokens = min(self.budget_reserve, self._tokens + self.budget_ratio)
+
+    def _withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def retry_delay(self, attempt, idempotent, status_code=None, headers=None, exception=None):
+        """
+        :returns float Seconds to wait before retrying, or None if the request should not be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if exception is not None:
+            if not (idempotent or _not_sent(exception)):
+                return None
+        elif status_code not in self.statuses or not (idempotent or status_code == 429):
+            return None
+
+        if not self._withdraw():
+            return None
+
+        return self.delay(attempt, _retry_after(headers))
+
+    def call(self, send, idempotent):
+        """
+        Sends a request with the synchronous transport, retrying it as needed.
+
+        :param callable send:       Sends the request and returns its requests.Response
+        :param bool     idempotent: The request can be repeated safely
+        """
+        self._deposit()
+        attempt = 0
+
+        while True:
+            try:
+                response = send()
+            except RETRYABLE_EXCEPTIONS as exception:
+                delay = self.retry_delay(attempt, idempotent, exception=exception)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(attempt, idempotent, response.status_code, response.headers)
+                if delay is None:
+                    return response
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, send, idempotent):
+        """
+        Sends a request with the asynchronous transport, retrying it as needed.
+
+        :param callable send:       Coroutine function sending the request and returning (status, reason, headers, body)
+        :param bool     idempotent: The request can be repeated safely
+        """
+        self._deposit()
+        attempt = 0
+
+        while True:
+            try:
+                response = await send()
+            except ASYNC_RETRYABLE_EXCEPTIONS as exception:
+                delay = self.retry_delay(attempt, idempotent, exception=exception)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(attempt, idempotent, response[0], response[2])
+                if delay is None:
+                    return response
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _failed_docs(self, results, count):
+        return [index for index, result in enumerate(results[:count])
+                if isinstance(result, dict) and result.get('error') in self.doc_errors]
+
+    def resend_failed_docs(self, send, data, results):
+        """
+        Re-sends the documents of a bulk_save request that failed with a transient error, until they succeed,
+        fail permanently, or retries run out.
+
+        :param callable send:       Saves a _bulk_docs request body and returns its per-document results
+        :param dict     data:       The original request body
+        :param list     results:    The per-document results of the original request
+
+        :returns list Per-document results, in the order of the documents of data
+        """
+        docs = data.get('docs', [])
+        results = list(results)
+
+        for attempt in range(self.max_retries):
+            failed = self._failed_docs(results, len(docs))
+            if not failed or not self._withdraw():
+                break
+
+            time.sleep(self.delay(attempt))
+            retried = send({**data, 'docs': [docs[index] for index in failed]})
+            if not isinstance(retried, list):
+                break
+
+            for index, result in zip(failed, retried):
+                results[index] = result
+
+        return results
+
+    async def resend_failed_docs_async(self, send, data, results):
+        """
+        Async counterpart of resend_failed_docs; send is a coroutine function.
+        """
+        docs = data.get('docs', [])
+        results = list(results)
+
+        for attempt in range(self.max_retries):
+            failed = self._failed_docs(results, len(docs))
+            if not failed or not self._withdraw():
+                break
+
+            await asyncio.sleep(self.delay(attempt))
+            retried = await send({**data, 'docs': [docs[index] for index in failed]})
+            if not isinstance(retried, list):
+                break
+
+            for index, result in zip(failed, retried):
+                results[index] = result
+
+        return results
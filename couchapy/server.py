@@ -23,7 +23,7 @@ class Server():
     def database_names(self, couch_data):
         return couch_data
 
-    @couch.endpoint('/_dbs_info', method='post', data_keys=couch.AllowedKeys.SERVER__DBS_INFO__PARAMS)
+    @couch.endpoint('/_dbs_info', method='post', data_keys=couch.AllowedKeys.SERVER__DBS_INFO__PARAMS, idempotent=True)
     def databases(self, couch_data):
         return couch_data
 
@@ -0,0 +1,242 @@
+import  codecs
+import  json
+import  re
+
+import  couchapy.codec
+
+_whitespace = ' \t\n\r'
+# text up to the next bracket, skipping complete strings; stops at the opening quote of an unterminated string
+_outside = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+# rest of a string, up to its closing quote
+_string_body = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+# end of a number, true, false or null
+_scalar_end = re.compile(r'[\s,\]}:]')
+
+
+def _nested_containers(depth):
+    """
+    :returns str pattern of a complete object or array nested at most depth levels deep.  Every repetition
+             starts with a quote or a bracket, so that a failed match backtracks in linear time.
+    """
+    atoms, string = r'[^"\[\]{}]*', r'"[^"\\]*(?:\\.[^"\\]*)*"'
+    items = string
+    for _ in range(depth):
+        container = r'[\[{]' + atoms + r'(?:(?:' + items + r')' + atoms + r')*[\]}]'
+        items = string + '|' + container
+    return container
+
+
+# finds the end of most values in a single match; deeper or incomplete values are scanned bracket by bracket
+_container = re.compile(_nested_containers(8), re.DOTALL)
+
+
+class _NeedMoreData(Exception):
+    pass
+
+
+def iter_lines(chunks):
+    """
+    Splits an iterable of byte chunks into decoded lines, as soon as each line is complete.
+
+    Empty lines are yielded as empty strings; CouchDB uses them as heartbeats.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+
+        for line in lines:
+            yield line.rstrip('\r')
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+
+class JsonArrayStream():
+    """
+    Incrementally parses a JSON object and yields the items of one of its array members as soon as
+    each item has been read, so that the whole document never has to be held in memory.
+
+    Every other member of the object (e.g. total_rows, offset, last_seq) is collected into meta.
+    Members that appear after the array are only available once iteration has finished.
+
+    :param iterable chunks:     Byte chunks of the JSON document, e.g. response.iter_content(None)
+    :param list     array_keys: Names of the members whose items are streamed.  The first one found is used.
+                                (Default: ['rows', 'docs', 'results'])
+    :param callable close:      Releases the underlying response; called once the document has been read, or
+                                by close. (Default: None)
+    :param          codec:      JSON codec used to decode every item, see couchapy.codec. (Default: json)
+
+    Usage Examples:
+      rows = JsonArrayStream(response.iter_content(None))
+      for row in rows:
+          ...
+      rows.meta.get('total_rows')
+
+      with couchdb_instance.db.get_view(uri_segments={...}, response_format='rows') as rows:
+          for row in rows:
+              ...
+    """
+    def __init__(self, chunks, array_keys=None, close=None, codec=None):
+        self.array_keys = array_keys or ['rows', 'docs', 'results']
+        self.array_key = None
+        self.meta = {}
+        self._close = close
+        self._codec = codec or couchapy.codec.get_codec('json')
+
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Releases the underlying response, e.g. when iteration is abandoned early.
+        """
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __iter__(self):
+        try:
+            yield from self._items()
+        finally:
+            self.close()
+
+    def _items(self):
+        self._expect('{')
+
+        while True:
+            if self._skip(',') == '}':
+                self._pos += 1
+                return
+
+            key = self._value()
+            self._expect(':')
+
+            if key in self.array_keys and self.array_key is None:
+                self.array_key = key
+                self._expect('[')
+
+                while self._skip(',') != ']':
+                    yield self._value()
+
+                self._pos += 1
+            else:
+                self.meta[key] = self._value()
+
+    def _read(self):
+        """Decodes the next chunk.  Raises _NeedMoreData when the input is exhausted."""
+        if self._exhausted:
+            raise _NeedMoreData()
+
+        try:
+            return self._decoder.decode(next(self._chunks))
+        except StopIteration:
+            self._exhausted = True
+            return self._decoder.decode(b'', final=True)
+
+    def _fill(self):
+        """Reads the next chunk into the buffer.  Raises _NeedMoreData when the input is exhausted."""
+        chunk = self._read()
+
+        # drop consumed text so that memory use stays proportional to a single item
+        if self._pos > 65536 or self._pos > len(self._buffer) // 2:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+        self._buffer += chunk
+
+    def _skip(self, separators=''):
+        """Skips whitespace and separators and returns the next significant character."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _whitespace + separators:
+                self._pos += 1
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            try:
+                self._fill()
+            except _NeedMoreData:
+                raise json.JSONDecodeError('Unexpected end of JSON stream', self._buffer, self._pos)
+
+    def _expect(self, char):
+        if self._skip() != char:
+            raise json.JSONDecodeError(f'Expected "{char}"', self._buffer, self._pos)
+        self._pos += 1
+
+    def _scan(self, text, position, scalar, state):
+        """
+        Scans text from position for the end of the current value.
+
+        :param bool scalar: The value is a number, true, false or null
+        :param list state:  [depth, in_string] of the scan, carried over between chunks
+        :returns tuple (end of the value or None if it continues in the next chunk, position to resume from)
+        """
+        if scalar:
+            # numbers, true, false and null end at the next delimiter, or with the document
+            match = _scalar_end.search(text, position)
+            if match is not None:
+                return match.start(), match.start()
+            return (len(text) if self._exhausted else None), len(text)
+
+        if state == [0, False]:
+            match = _container.match(text, position)
+            if match is not None:
+                return match.end(), match.end()
+
+        while True:
+            position = (_string_body if state[1] else _outside).match(text, position).end()
+            if position >= len(text) - (1 if state[1] and text.endswith('\\') else 0):
+                # the value, or an escape sequence, continues in the next chunk
+                return None, position
+
+            char = text[position]
+            position += 1
+            if char == '"':
+                state[1] = not state[1]
+            elif char in '{[':
+                state[0] += 1
+            else:
+                state[0] -= 1
+
+            if state[0] == 0 and not state[1]:
+                return position, position
+
+    def _value(self):
+        """
+        Reads the next value.  The text of a value that spans several chunks is collected and scanned a chunk
+        at a time, and decoded once the value is complete.
+        """
+        self._skip()
+        text, start = self._buffer, self._pos
+        scalar, state, parts = text[start] not in '{["', [0, text[start] == '"'], []
+        # the scan of a string starts inside it, so that it ends with its closing quote
+        position = start + 1 if state[1] else start
+
+        while True:
+            end, position = self._scan(text, position, scalar, state)
+            if end is not None:
+                break
+
+            parts.append(text[start:position])
+            try:
+                text, start = text[position:] + self._read(), 0
+            except _NeedMoreData:
+                raise json.JSONDecodeError('Unexpected end of JSON stream', ''.join(parts) + text, 0)
+            position = 0
+
+        parts.append(text[start:end])
+        self._buffer, self._pos = text, end
+        return self._codec.loads(''.join(parts))
@@ -0,0 +1,124 @@
+from    http.cookiejar import DefaultCookiePolicy
+import  threading
+import  time
+
+import  requests
+import  requests.adapters
+import  urllib3
+
+
+class _ConnectClock(threading.local):
+    """
+    Seconds the current thread spent opening connections since it was last reset.
+    """
+    seconds = 0.0
+
+
+_connect_clock = _ConnectClock()
+
+
+class _TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_clock.seconds += time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_clock.seconds += time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter whose connections record the time spent connecting (including the TLS handshake).
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class Transport():
+    """
+    Pooled, keep-alive HTTP transport shared by every endpoint of a CouchDB instance.
+
+    This class is not intended to be instanced directly.  Configure it through the
+    transport_kwargs argument of CouchDB.
+
+    :param int  pool_connections:   Number of per-host connection pools to cache. (Default: 10)
+    :param int  pool_maxsize:       Maximum number of connections kept open to a single host. (Default: 10)
+    :param bool pool_block:         Block when all pooled connections to a host are in use, instead of opening
+                                    a throwaway connection. (Default: False)
+    :param int  max_retries:        Number of times a request is retried when a connection cannot be established.
+                                    (Default: 0)
+    :param bool keep_alive:         Keep connections open between requests.  When False, every request asks the
+                                    server to close the connection. (Default: True)
+    :param      timeout:            Connect/read timeout passed to every request, as a number of seconds or a
+                                    (connect, read) tuple. (Default: None)
+    """
+    def __init__(self, **kwargs):
+        self.pool_connections = kwargs.get('pool_connections', 10)
+        self.pool_maxsize = kwargs.get('pool_maxsize', 10)
+        self.pool_block = kwargs.get('pool_block', False)
+        self.max_retries = kwargs.get('max_retries', 0)
+        self.keep_alive = kwargs.get('keep_alive', True)
+        self.timeout = kwargs.get('timeout', None)
+
+        self._session = requests.Session()
+
+        # the CouchDB session object is the single source of truth for the AuthSession cookie,
+        # so never let the underlying requests session remember cookies between requests
+        self._session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        if self.keep_alive is False:
+            self._session.headers['Connection'] = 'close'
+
+        adapter = _TimedHTTPAdapter(pool_connections=self.pool_connections,
+                                    pool_maxsize=self.pool_maxsize,
+                                    max_retries=self.max_retries,
+                                    pool_block=self.pool_block)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def request(self, method, uri, timings=None, **kwargs):
+        """
+        :param dict timings: When given, receives the seconds spent opening a connection (connect), waiting for the
+                             response headers (wait) and reading the response body (download)
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if timings is None:
+            return self._session.request(method.upper(), uri, **kwargs)
+
+        _connect_clock.seconds = 0.0
+        start = time.perf_counter()
+        response = self._session.request(method.upper(), uri, **kwargs)
+        total = time.perf_counter() - start
+
+        # elapsed covers sending the request up to parsing the response headers, including connecting
+        elapsed = response.elapsed.total_seconds()
+        timings['connect'] = _connect_clock.seconds
+        timings['wait'] = max(elapsed - _connect_clock.seconds, 0.0)
+        timings['download'] = max(total - elapsed, 0.0)
+        return response
+
+    def close(self):
+        """
+        Closes every pooled connection.  The transport can still be used afterwards; new connections
+        are opened on demand.
+        """
+        self._session.close()
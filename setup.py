@@ -34,4 +34,8 @@ setuptools.setup(
         "Natural Language :: English",
     ],
     python_requires='>=3.6',
+    extras_require={
+        'async': ['aiohttp'],
+        'fast-json': ['orjson'],
+    },
 )
@@ -0,0 +1,17 @@
+import  asyncio
+import  pytest
+
+
+@pytest.fixture
+def run_async():
+    """ runs a coroutine to completion on a new event loop; asyncio.run only exists from Python 3.7 """
+    def run(coroutine):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    return run
@@ -0,0 +1,144 @@
+import  couchapy
+from    couchapy.advisor import IndexAdvisor, suggest_index, suggest_selector
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+SCAN_QUERY = {'selector': {'type': 'order', 'total': {'$gt': 100}}, 'sort': ['created'], 'limit': 10}
+INDEXED_QUERY = {'selector': {'customer': {'id': 'customer:1'}}, 'limit': 10}
+BROKEN_QUERY = {'selector': {'a': {'$foo': 1}}}
+
+ALL_DOCS_INDEX = {"ddoc": None, "name": "_all_docs", "type": "special", "def": {"fields": [{"_id": "asc"}]}}
+CUSTOMER_INDEX = {"ddoc": "_design/by-customer", "name": "by-customer", "type": "json",
+                  "def": {"fields": [{"customer.id": "asc"}]}}
+
+
+def _serve(httpserver):
+    def explain(request):
+        selector = json.loads(request.get_data())['selector']
+        if '$foo' in json.dumps(selector):
+            return Response(json.dumps({"error": "invalid_operator", "reason": "Invalid operator: $foo"}), status=400,
+                            content_type='application/json')
+        index = ALL_DOCS_INDEX if 'type' in selector else CUSTOMER_INDEX
+        return Response(json.dumps({"dbname": "somedb", "index": index, "selector": selector}),
+                        content_type='application/json')
+
+    def find(request):
+        data = json.loads(request.get_data())
+        assert data['execution_stats'] is True
+        examined = 5000 if 'type' in data['selector'] else 10
+        return Response(json.dumps({"docs": [{"_id": "a"}] * 10, "bookmark": "g1",
+                                    "execution_stats": {"total_keys_examined": 0, "total_docs_examined": examined,
+                                                        "results_returned": 10, "execution_time_ms": 40.2}}),
+                        content_type='application/json')
+
+    httpserver.expect_request("/somedb/_explain", method="POST").respond_with_handler(explain)
+    httpserver.expect_request("/somedb/_find", method="POST").respond_with_handler(find)
+    httpserver.expect_request("/somedb/_index", method="GET").respond_with_json(
+        {"total_rows": 2, "indexes": [ALL_DOCS_INDEX, CUSTOMER_INDEX]})
+
+
+def test_suggest_index_orders_equality_sort_and_range_fields():
+    assert suggest_index(SCAN_QUERY) == {'index': {'fields': ['type', 'created', 'total']},
+                                         'ddoc': 'advisor-type-created-total', 'name': 'advisor-type-created-total',
+                                         'type': 'json'}
+
+    nested = {'selector': {'$and': [{'customer': {'address': {'city': 'Springfield'}}}, {'status': {'$eq': 'new'}}],
+                           'notes': {'$exists': False}, '$or': [{'a': 1}, {'b': 2}]},
+              'sort': [{'created': 'desc'}]}
+    assert suggest_index(nested)['index']['fields'] == ['customer.address.city', 'status', 'created']
+
+    assert suggest_index({'selector': {'name': {'$regex': '^a'}}}) is None
+
+
+def test_sort_fields_the_selector_does_not_reference_are_added_to_it():
+    # the planner ignores an index unless the selector references all of its fields
+    assert suggest_selector(SCAN_QUERY) == {'type': 'order', 'total': {'$gt': 100}, 'created': {'$exists': True}}
+
+    referenced = {'selector': {'$and': [{'type': 'order'}, {'created': {'$gt': '2020'}}]}, 'sort': ['created']}
+    assert suggest_selector(referenced) is None
+    assert suggest_index(referenced)['index']['fields'] == ['type', 'created']
+
+    nested = {'selector': {'customer': {'id': 'customer:1'}, 'notes': {'$exists': False}, '$or': [{'created': 1}]},
+              'sort': [{'customer.id': 'asc'}, {'notes': 'asc'}, {'created': 'asc'}]}
+    assert suggest_selector(nested) == {**nested['selector'], 'notes': {'$exists': True}, 'created': {'$exists': True}}
+    assert suggest_selector({'selector': {'type': 'order'}}) is None
+
+
+def test_analyze_reports_full_scans_and_suggests_indexes(httpserver: test_server.HTTPServer):
+    _serve(httpserver)
+
+    reports = couch.db.index_advisor().analyze([SCAN_QUERY, INDEXED_QUERY, BROKEN_QUERY])
+
+    scan, indexed, broken = reports
+    assert scan.full_scan and scan.slow and scan.ratio == 500
+    assert scan.suggestion['index']['fields'] == ['type', 'created', 'total']
+    assert scan.selector == {'type': 'order', 'total': {'$gt': 100}, 'created': {'$exists': True}}
+
+    assert not indexed.full_scan and not indexed.slow and indexed.ratio == 1
+    assert indexed.index['name'] == 'by-customer' and indexed.suggestion is None and indexed.selector is None
+
+    assert isinstance(broken.error, couchapy.CouchError) and not broken.slow
+
+
+def test_existing_indexes_are_not_suggested_again(httpserver: test_server.HTTPServer):
+    _serve(httpserver)
+
+    reports = couch.db.index_advisor(max_ratio=0.5).analyze([INDEXED_QUERY])
+    assert reports[0].slow and reports[0].suggestion is None
+
+
+def test_create_indexes_saves_each_suggestion_once(httpserver: test_server.HTTPServer):
+    _serve(httpserver)
+    httpserver.expect_request("/somedb/_index", method="POST").respond_with_json(
+        {"result": "created", "id": "_design/advisor-type-created-total", "name": "advisor-type-created-total"})
+
+    advisor = couch.db.index_advisor()
+    results = advisor.create_indexes(advisor.analyze([SCAN_QUERY, dict(SCAN_QUERY, limit=20), INDEXED_QUERY]))
+
+    assert [result['result'] for result in results] == ['created']
+    saved = [json.loads(request.get_data()) for request, _ in httpserver.log
+             if request.path == '/somedb/_index' and request.method == 'POST']
+    assert saved == [suggest_index(SCAN_QUERY)]
+
+
+def test_analysis_can_be_recorded_and_replayed_offline(httpserver: test_server.HTTPServer, tmp_path):
+    _serve(httpserver)
+
+    live = couch.db.index_advisor()
+    live_reports = live.analyze([SCAN_QUERY, INDEXED_QUERY, BROKEN_QUERY])
+    live.save_recording(tmp_path / 'queries.json')
+    requests_made = len(httpserver.log)
+
+    recorded = json.loads((tmp_path / 'queries.json').read_text())
+    assert all('docs' not in entry['find'] for entry in recorded['queries'] if entry['find'])
+
+    offline = IndexAdvisor(recording=str(tmp_path / 'queries.json'))
+    reports = offline.analyze()
+
+    assert len(httpserver.log) == requests_made
+    assert [(report.slow, report.ratio, report.suggestion) for report in reports] == \
+        [(report.slow, report.ratio, report.suggestion) for report in live_reports]
+    assert isinstance(reports[2].error, couchapy.CouchError)
+
+    with pytest.raises(KeyError):
+        offline.analyze([{'selector': {'unknown': 1}}])
+    with pytest.raises(ValueError):
+        offline.create_indexes(reports)
+    with pytest.raises(ValueError):
+        IndexAdvisor()
@@ -0,0 +1,124 @@
+import  asyncio
+import  couchapy
+import  couchapy.aio
+import  couchapy.client
+import  couchapy.database
+import  couchapy.server
+import  couchapy.session
+import  pytest
+import  pytest_httpserver as test_server
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def _endpoint_names(cls):
+    return {name for name, attr in vars(cls).items() if hasattr(attr, 'endpoint') and not attr.endpoint.stream}
+
+
+def test_async_namespaces_mirror_every_endpoint():
+    for source, mirrored in [(couchapy.server.Server, couchapy.aio.AsyncServer),
+                             (couchapy.database.Database, couchapy.aio.AsyncDatabase),
+                             (couchapy.session.Session, couchapy.aio.AsyncSession)]:
+        names = _endpoint_names(source)
+
+        assert len(names) > 0
+        assert names == _endpoint_names(mirrored)
+        for name in names:
+            assert asyncio.iscoroutinefunction(getattr(mirrored, name))
+            assert getattr(mirrored, name).endpoint is getattr(source, name).endpoint
+
+
+def test_both_clients_read_their_options_the_same_way():
+    observer = print
+    options = {'host': 'http://couch.local', 'port': 6984, 'name': 'user', 'password': 'secret', 'codec': 'json',
+               'response_format': 'bytes', 'observers': [observer], 'retry_kwargs': {'max_retries': 5},
+               'compression_kwargs': {'threshold': 10}, 'nodes': ['http://10.0.0.1:5984', 'http://10.0.0.2:5984']}
+    sync, async_ = couchapy.CouchDB(**options), couchapy.AsyncCouchDB(**options)
+
+    for couch in [sync, async_]:
+        assert isinstance(couch, couchapy.client.BaseClient)
+        assert couch._base_uri == 'http://couch.local:6984'
+        assert (couch.name, couch.password, couch.response_format, couch.observers) == ('user', 'secret', 'bytes', [observer])
+        assert couch._headers == sync._headers and couch._headers['Accept-Encoding'] == 'gzip, deflate'
+        assert couch._retry_policy.max_retries == 5 and couch._compressor.threshold == 10
+        assert [node.base_uri for node in couch._nodes.nodes] == ['http://10.0.0.1:5984', 'http://10.0.0.2:5984']
+
+    assert isinstance(async_._transport, couchapy.aio.AsyncTransport) and async_.asynchronous is True
+
+
+def test_endpoints_return_the_same_couch_data_as_the_sync_client(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/_uuids", method="GET").respond_with_json({"uuids": ["75480ca477454894678e22eec6002413"]})
+    httpserver.expect_request("/_local/testdoc", method="GET").respond_with_json({"_id": "testdoc"})
+    httpserver.expect_request("/_local/testdoc", method="HEAD").respond_with_json({}, headers={'ETag': 'revidhere'})
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": '_local'}) as couch:
+            return (await couch.server.generate_uuids(),
+                    await couch.db.get_doc(uri_segments={'docid': 'testdoc'}),
+                    await couch.db.get_doc_info(uri_segments={'docid': 'testdoc'}))
+
+    assert run_async(run()) == ('75480ca477454894678e22eec6002413', {"_id": "testdoc"}, 'revidhere')
+
+
+def test_errors_and_invalid_keys(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/_up", method="GET").respond_with_json({}, status=404)
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000) as couch:
+            response = await couch.server.server_status()
+            assert isinstance(response, couchapy.CouchError) is True
+            assert response.status_code == 404
+
+            with pytest.raises(couchapy.InvalidKeysException):
+                await couch.server.database_names(params={'nonexisting_key': ''})
+
+    run_async(run())
+
+
+def test_auto_connect_sets_the_auth_token(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_oneshot_request("/_session", method="POST") \
+              .respond_with_json({"ok": True, "name": "root", "roles": ["_admin"]},
+                                 headers={'Set-Cookie': 'AuthSession=sometoken; Version=1; Path=/; HttpOnly'})
+    httpserver.expect_oneshot_request("/_session", method="GET").respond_with_json({"ok": True})
+
+    async def run():
+        async with couchapy.AsyncCouchDB(name="test", password="test", host="http://127.0.0.1", port=8000,
+                                         auto_connect=True) as couch:
+            assert couch.session.auth_token == 'sometoken'
+            assert await couch.session.renew_session() == {"ok": True}
+
+    run_async(run())
+    assert httpserver.log[1][0].cookies.get('AuthSession') == 'sometoken'
+
+
+def test_concurrent_requests_share_the_connection_pool(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/_up", method="GET").respond_with_json({"status": "ok"})
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000,
+                                         transport_kwargs={'pool_limit': 5}) as couch:
+            results = await asyncio.gather(*[couch.server.server_status() for _ in range(50)])
+            assert couch._transport._session.connector.limit == 5
+            return results
+
+    assert run_async(run()) == [{"status": "ok"}] * 50
+
+
+def test_raw_response_formats(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/somedb/testdoc", method="GET").respond_with_data(b'{"_id":"testdoc"}')
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'}) as couch:
+            response = await couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='bytes')
+            assert response.body == b'{"_id":"testdoc"}'
+
+            response = await couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='memoryview')
+            assert response.body.tobytes() == b'{"_id":"testdoc"}'
+
+            with pytest.raises(ValueError):
+                await couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='stream')
+
+    run_async(run())
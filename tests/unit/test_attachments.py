@@ -0,0 +1,106 @@
+import  couchapy
+import  io
+import  pytest
+import  pytest_httpserver as test_server
+import  socket
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+BLOB = bytes(range(256)) * 4096
+
+
+def _couch():
+    return couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+
+
+def test_download_streams_chunks_to_a_callback(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/somedoc/blob.bin", method="GET") \
+              .respond_with_data(BLOB, content_type='application/octet-stream', headers={'Content-MD5': 'abc=='})
+
+    chunks = []
+    result = _couch().db.download_attachment(chunks.append, chunk_size=4096,
+                                             uri_segments={'docid': 'somedoc', 'attname': 'blob.bin'})
+
+    assert result == {'content_type': 'application/octet-stream', 'length': len(BLOB), 'digest': 'abc=='}
+    assert max(len(chunk) for chunk in chunks) <= 4096
+    assert b''.join(chunks) == BLOB
+    assert httpserver.log[0][0].headers.get('Accept') == '*/*'
+
+
+def test_download_to_a_path_a_file_and_a_socket(httpserver: test_server.HTTPServer, tmp_path):
+    httpserver.expect_request("/somedb/_design/ddoc/blob.bin", method="GET").respond_with_data(BLOB)
+    couch = _couch()
+    segments = {'docid': 'ddoc', 'attname': 'blob.bin'}
+
+    couch.db.download_ddoc_attachment(str(tmp_path / 'blob.bin'), uri_segments=segments)
+    assert (tmp_path / 'blob.bin').read_bytes() == BLOB
+
+    file = io.BytesIO()
+    couch.db.download_ddoc_attachment(file, uri_segments=segments)
+    assert file.getvalue() == BLOB
+
+    left, right = socket.socketpair()
+    with left, right:
+        right.setblocking(False)
+        received = bytearray()
+
+        class Sink():
+            def sendall(self, chunk):
+                left.sendall(chunk)
+                received.extend(right.recv(len(chunk)))
+
+        couch.db.download_ddoc_attachment(Sink(), uri_segments=segments, chunk_size=1024)
+
+    assert bytes(received) == BLOB
+
+
+def test_download_errors_are_couch_errors(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/somedoc/missing", method="GET") \
+              .respond_with_json({"error": "not_found", "reason": "Document is missing attachment"}, status=404)
+
+    chunks = []
+    result = _couch().db.download_attachment(chunks.append, uri_segments={'docid': 'somedoc', 'attname': 'missing'})
+
+    assert isinstance(result, couchapy.CouchError) is True
+    assert result.status_code == 404
+    assert result.reason == 'Document is missing attachment'
+    assert chunks == []
+
+
+def test_upload_streams_files_and_iterators(httpserver: test_server.HTTPServer, tmp_path):
+    received = []
+
+    def handler(request):
+        received.append((request.headers.get('Content-Type'), request.headers.get('Transfer-Encoding'),
+                         request.args.get('rev'), request.get_data()))
+        return Response('{"ok": true, "id": "somedoc", "rev": "2-def"}', status=201, content_type='application/json')
+
+    httpserver.expect_request("/somedb/somedoc/blob.bin", method="PUT").respond_with_handler(handler)
+    couch = _couch()
+    segments = {'docid': 'somedoc', 'attname': 'blob.bin'}
+    (tmp_path / 'blob.bin').write_bytes(BLOB)
+
+    result = couch.db.upload_attachment(str(tmp_path / 'blob.bin'), 'application/octet-stream',
+                                        uri_segments=segments, params={'rev': '1-abc'})
+    assert result == {"ok": True, "id": "somedoc", "rev": "2-def"}
+
+    chunks = (BLOB[i:i + 65536] for i in range(0, len(BLOB), 65536))
+    couch.db.upload_attachment(chunks, 'image/png', uri_segments=segments, params={'rev': '2-def'})
+
+    assert received[0] == ('application/octet-stream', None, '1-abc', BLOB)
+    assert received[1] == ('image/png', 'chunked', '2-def', BLOB)
+
+
+def test_upload_ddoc_attachment_from_a_file_object(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_design/ddoc/index.html", method="PUT", data=b'<html></html>',
+                              headers={'Content-Type': 'text/html'}) \
+              .respond_with_json({"ok": True}, status=201)
+
+    result = _couch().db.upload_ddoc_attachment(io.BytesIO(b'<html></html>'), 'text/html',
+                                                uri_segments={'docid': 'ddoc', 'attname': 'index.html'})
+    assert result == {"ok": True}
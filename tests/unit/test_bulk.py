@@ -0,0 +1,189 @@
+import  asyncio
+import  couchapy
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+import  threading
+import  time
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+def _bulk_docs_handler(chunks):
+    lock = threading.Lock()
+
+    def handler(request):
+        body = json.loads(request.data)
+        with lock:
+            chunks.append(body)
+
+        results = []
+        for doc in body['docs']:
+            if doc.get('conflict'):
+                results.append({"id": doc['_id'], "error": "conflict", "reason": "Document update conflict."})
+            else:
+                results.append({"ok": True, "id": doc['_id'], "rev": "1-abc"})
+        return Response(json.dumps(results), status=201, content_type='application/json')
+    return handler
+
+
+def test_documents_are_chunked_by_count_and_results_keep_their_order(httpserver: test_server.HTTPServer):
+    chunks = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_bulk_docs_handler(chunks))
+    docs = [{"_id": f"doc{i:03}", "conflict": i % 7 == 0} for i in range(95)]
+
+    with couch.db.bulk_writer(max_docs=10, max_workers=3) as writer:
+        indices = [writer.add(doc) for doc in docs]
+
+    assert indices == list(range(95))
+    assert sorted(len(chunk['docs']) for chunk in chunks) == [5] + [10] * 9
+    assert [result['id'] for result in writer.results] == [doc['_id'] for doc in docs]
+    assert [result.get('error') for result in writer.results] == ['conflict' if doc['conflict'] else None for doc in docs]
+
+
+def test_documents_are_chunked_by_size(httpserver: test_server.HTTPServer):
+    chunks = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_bulk_docs_handler(chunks))
+    doc_size = len(couch._codec.dumps({"_id": "doc0", "payload": "x" * 100})) + 1
+
+    writer = couch.db.bulk_writer(max_bytes=doc_size * 3, data={'new_edits': True})
+    for i in range(7):
+        writer.add({"_id": f"doc{i}", "payload": "x" * 100})
+    results = writer.close()
+
+    assert len(results) == 7
+    assert sorted(len(chunk['docs']) for chunk in chunks) == [1, 3, 3]
+    assert all(chunk['new_edits'] is True for chunk in chunks)
+
+
+def test_buffered_documents_are_flushed_after_the_interval(httpserver: test_server.HTTPServer):
+    chunks = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_bulk_docs_handler(chunks))
+
+    writer = couch.db.bulk_writer(flush_interval=0.1)
+    writer.add({"_id": "doc1"})
+    time.sleep(0.5)
+
+    assert len(chunks) == 1
+    writer.close()
+    assert len(chunks) == 1
+
+
+def test_failed_chunks_report_the_couch_error_for_each_document(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_json({}, status=413)
+
+    with couch.db.bulk_writer(max_docs=2) as writer:
+        for i in range(3):
+            writer.add({"_id": f"doc{i}"})
+
+    assert len(writer.results) == 3
+    assert all(isinstance(result, couchapy.CouchError) and result.status_code == 413 for result in writer.results)
+
+    with pytest.raises(RuntimeError):
+        writer.add({"_id": "late"})
+
+
+def test_chunks_that_raise_do_not_lose_the_results_of_other_chunks(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_bulk_docs_handler([]))
+    bulk_save = couch.db.bulk_save
+
+    def flaky_bulk_save(**kwargs):
+        if kwargs['data']['docs'][0]['_id'] == 'doc2':
+            raise ConnectionError('connection reset')
+        return bulk_save(**kwargs)
+
+    couch.db.bulk_save = flaky_bulk_save
+    with couch.db.bulk_writer(max_docs=2) as writer:
+        for i in range(5):
+            writer.add({"_id": f"doc{i}"})
+
+    assert [result['id'] for result in writer.results[:2] + writer.results[4:]] == ['doc0', 'doc1', 'doc4']
+    assert all(isinstance(result, couchapy.CouchError) and result.error == 'ConnectionError'
+               and result.reason == 'connection reset' for result in writer.results[2:4])
+
+
+def _bulk_get_handler(batches):
+    lock = threading.Lock()
+
+    def handler(request):
+        ids = [doc['id'] for doc in json.loads(request.data)['docs']]
+        with lock:
+            batches.append(ids)
+
+        results = []
+        for docid in ids:
+            if docid.startswith('missing'):
+                docs = [{"error": {"id": docid, "rev": "undefined", "error": "not_found", "reason": "missing"}}]
+            else:
+                docs = [{"ok": {"_id": docid, "_rev": "1-abc"}}]
+            results.append({"id": docid, "docs": docs})
+        return Response(json.dumps({"results": results}), content_type='application/json')
+    return handler
+
+
+def test_lookups_from_many_threads_are_batched_and_deduplicated(httpserver: test_server.HTTPServer):
+    batches = []
+    httpserver.expect_request("/somedb/_bulk_get", method="POST").respond_with_handler(_bulk_get_handler(batches))
+    results = {}
+
+    with couch.db.bulk_loader(batch_size=10, batch_window=0.2) as loader:
+        def worker(i):
+            results[i] = loader.get(f"doc{i % 5}")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(batches) == 1
+    assert sorted(batches[0]) == [f"doc{i}" for i in range(5)]
+    assert all(results[i] == {"_id": f"doc{i % 5}", "_rev": "1-abc"} for i in range(20))
+
+
+def test_batches_are_capped_by_size_and_missing_documents_are_errors(httpserver: test_server.HTTPServer):
+    batches = []
+    httpserver.expect_request("/somedb/_bulk_get", method="POST").respond_with_handler(_bulk_get_handler(batches))
+
+    with couch.db.bulk_loader(batch_size=3, batch_window=0.1) as loader:
+        docs = loader.get_many(['doc1', 'doc2', 'missing1', 'doc3', 'doc4'])
+
+    assert sorted(len(batch) for batch in batches) == [2, 3]
+    assert docs[0] == {"_id": "doc1", "_rev": "1-abc"}
+    assert isinstance(docs[2], couchapy.CouchError) and docs[2].status_code == 404 and docs[2].error == 'not_found'
+    assert docs[4] == {"_id": "doc4", "_rev": "1-abc"}
+
+
+def test_lookups_from_asyncio_tasks(httpserver: test_server.HTTPServer, run_async):
+    batches = []
+    httpserver.expect_request("/somedb/_bulk_get", method="POST").respond_with_handler(_bulk_get_handler(batches))
+
+    async def run(loader):
+        return await asyncio.gather(*[loader.load_async(f"doc{i}") for i in range(8)])
+
+    with couch.db.bulk_loader(batch_size=100, batch_window=0.05) as loader:
+        docs = run_async(run(loader))
+
+    assert len(batches) == 1
+    assert [doc['_id'] for doc in docs] == [f"doc{i}" for i in range(8)]
+
+
+def test_failed_requests_are_delivered_to_every_caller(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_bulk_get", method="POST").respond_with_json({}, status=401)
+
+    with couch.db.bulk_loader() as loader:
+        docs = loader.get_many(['doc1', 'doc2'])
+
+    assert all(isinstance(doc, couchapy.CouchError) and doc.status_code == 401 for doc in docs)
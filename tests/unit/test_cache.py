@@ -0,0 +1,249 @@
+import  couchapy
+import  couchapy.cache
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+import  time
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def _couch(**cache_kwargs):
+    return couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000,
+                            database_kwargs={"db": 'somedb', 'doc_cache': cache_kwargs})
+
+
+def test_cache_evicts_least_recently_used_entries():
+    cache = couchapy.cache.DocumentCache(max_entries=2)
+    cache.put(('db', 'a'), {}, '"1-a"')
+    cache.put(('db', 'b'), {}, '"1-b"')
+    cache.get(('db', 'a'))
+    cache.put(('db', 'c'), {}, '"1-c"')
+
+    assert ('db', 'a') in cache and ('db', 'c') in cache
+    assert ('db', 'b') not in cache
+
+
+def test_cache_respects_the_byte_budget():
+    cache = couchapy.cache.DocumentCache(max_bytes=100)
+    cache.put(('db', 'a'), {}, None, 60)
+    cache.put(('db', 'b'), {}, None, 30)
+    cache.put(('db', 'c'), {}, None, 30)
+    cache.put(('db', 'huge'), {}, None, 101)
+
+    assert len(cache) == 2 and cache.size == 60
+    assert ('db', 'a') not in cache and ('db', 'huge') not in cache
+
+    cache.evict(('db', 'b'))
+    assert cache.size == 30
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_cache_drops_bodies_read_before_an_eviction():
+    cache = couchapy.cache.DocumentCache(max_entries=2)
+    before = cache.generation()
+    cache.evict(('db', 'a'))
+    after = cache.generation()
+
+    cache.put(('db', 'a'), b'{}', None, generation=before)
+    cache.put(('db', 'b'), b'{}', None, generation=before)
+    assert ('db', 'a') not in cache and ('db', 'b') in cache
+
+    cache.put(('db', 'a'), b'{}', None, generation=after)
+    assert ('db', 'a') in cache
+
+    # once the eviction of a is forgotten, every body read before it is dropped
+    cache.evict(('db', 'b'))
+    cache.evict(('db', 'c'))
+    cache.put(('db', 'd'), b'{}', None, generation=before)
+    cache.put(('db', 'e'), b'{}', None, generation=after)
+    assert ('db', 'd') not in cache and ('db', 'e') in cache
+
+    current = cache.generation()
+    cache.clear()
+    cache.put(('db', 'a'), b'{}', None, generation=current)
+    assert len(cache) == 0
+
+
+def test_database_without_doc_cache_option_has_no_cache():
+    assert couchapy.CouchDB().db.doc_cache is None
+
+
+def test_documents_are_revalidated_with_if_none_match(httpserver: test_server.HTTPServer):
+    couch = _couch()
+    doc = {"_id": "config", "_rev": "1-abc", "value": 1}
+    httpserver.expect_oneshot_request("/somedb/config", method="GET").respond_with_json(doc, headers={'ETag': '"1-abc"'})
+    httpserver.expect_oneshot_request("/somedb/config", method="GET", headers={'If-None-Match': '"1-abc"'}) \
+              .respond_with_data('', status=304)
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == doc
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == doc
+    assert len(httpserver.log) == 2
+    assert ('somedb', 'config') in couch.db.doc_cache
+
+
+def test_fresh_documents_are_served_without_a_request(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=0.3)
+    httpserver.expect_oneshot_request("/somedb/config", method="GET").respond_with_json({"value": 1}, headers={'ETag': '"1-abc"'})
+    httpserver.expect_oneshot_request("/somedb/config", method="GET").respond_with_json({"value": 2}, headers={'ETag': '"2-abc"'})
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 1}
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 1}
+    assert len(httpserver.log) == 1
+
+    time.sleep(0.35)
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 2}
+
+
+def test_writes_evict_and_params_bypass_the_cache(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=60)
+    httpserver.expect_request("/somedb/config", method="GET").respond_with_json({"value": 1}, headers={'ETag': '"1-abc"'})
+    httpserver.expect_request("/somedb/config", method="PUT").respond_with_json({"ok": True, "rev": "2-abc"}, status=201)
+    httpserver.expect_request("/somedb/config", method="DELETE").respond_with_json({}, status=409)
+
+    couch.db.get_doc(uri_segments={'docid': 'config'})
+    couch.db.get_doc(uri_segments={'docid': 'config'}, params={'revs': True})
+    assert len(httpserver.log) == 2
+
+    couch.db.delete_doc(uri_segments={'docid': 'config'}, params={'rev': '1-abc'})
+    assert ('somedb', 'config') in couch.db.doc_cache
+
+    couch.db.save_named_doc(uri_segments={'docid': 'config'}, data={"value": 2})
+    assert ('somedb', 'config') not in couch.db.doc_cache
+
+
+def test_every_written_document_is_evicted(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=60)
+    for docid in ['a', 'b', 'c', 'copy', '_design/orders']:
+        couch.db.doc_cache.put(('somedb', docid), b'{}', None)
+
+    httpserver.expect_request("/somedb", method="POST").respond_with_json({"ok": True, "id": "a", "rev": "1-a"}, status=201)
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_json(
+        [{"ok": True, "id": "b", "rev": "2-b"}, {"id": "c", "error": "conflict", "reason": "conflict"}], status=201)
+    httpserver.expect_request("/somedb/a", method="COPY").respond_with_json({"ok": True, "id": "copy", "rev": "1-c"},
+                                                                            status=201)
+    httpserver.expect_request("/somedb/_design/orders", method="PUT").respond_with_json({"ok": True}, status=201)
+
+    couch.db.save_doc(data={"_id": "a"})
+    assert ('somedb', 'a') not in couch.db.doc_cache
+
+    couch.db.bulk_save(data={"docs": [{"_id": "b"}, {"_id": "c"}]})
+    assert ('somedb', 'b') not in couch.db.doc_cache and ('somedb', 'c') not in couch.db.doc_cache
+
+    couch.db.copy_doc(uri_segments={'docid': 'a'}, headers={'Destination': 'copy?rev=1-x'})
+    assert ('somedb', 'copy') not in couch.db.doc_cache
+
+    couch.db.save_named_ddoc(uri_segments={'docid': 'orders'}, data={"views": {}})
+    assert len(couch.db.doc_cache) == 0
+
+
+def test_cached_documents_are_copies(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=60)
+    httpserver.expect_oneshot_request("/somedb/config", method="GET").respond_with_json({"value": 1})
+
+    couch.db.get_doc(uri_segments={'docid': 'config'})['value'] = 2
+    doc = couch.db.get_doc(uri_segments={'docid': 'config'})
+    doc['value'] = 3
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 1}
+    assert len(httpserver.log) == 1
+
+
+def test_errors_are_not_cached(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=60)
+    httpserver.expect_request("/somedb/missing", method="GET").respond_with_json({}, status=404)
+
+    assert isinstance(couch.db.get_doc(uri_segments={'docid': 'missing'}), couchapy.CouchError)
+    assert len(couch.db.doc_cache) == 0
+
+
+def _changes_handler(pages):
+    def handler(request):
+        time.sleep(0.02)
+        return Response(json.dumps(pages.get(request.args.get('since'), {"results": [], "last_seq": request.args.get('since'),
+                                                                        "pending": 0})),
+                        content_type='application/json')
+    return handler
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_invalidator_evicts_changed_documents(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=3600)
+    couch.db.doc_cache.put(('somedb', 'config'), {"value": 1}, '"1-abc"')
+    couch.db.doc_cache.put(('somedb', 'other'), {"value": 1}, '"1-abc"')
+    pages = {"5-g1": {"results": [{"seq": "6-g1", "id": "config", "changes": [{"rev": "2-abc"}]}], "last_seq": "6-g1", "pending": 0}}
+    httpserver.expect_request("/somedb", method="GET").respond_with_json({"db_name": "somedb", "update_seq": "5-g1"})
+    httpserver.expect_request("/somedb/_changes", method="GET").respond_with_handler(_changes_handler(pages))
+
+    with couch.db.cache_invalidator(poll_timeout=100) as invalidator:
+        assert _wait_for(lambda: ('somedb', 'config') not in couch.db.doc_cache)
+        assert _wait_for(lambda: invalidator.last_seq == '6-g1')
+
+    assert ('somedb', 'other') in couch.db.doc_cache
+    assert invalidator.running is False
+    assert httpserver.log[1][0].args['since'] == '5-g1' and httpserver.log[1][0].args['feed'] == 'longpoll'
+
+
+def test_invalidator_refreshes_changed_documents(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=3600)
+    couch.db.doc_cache.put(('somedb', 'config'), {"value": 1}, '"1-abc"')
+    pages = {"5-g1": {"results": [{"seq": "6-g1", "id": "config", "changes": [{"rev": "2-abc"}]}], "last_seq": "6-g1", "pending": 0}}
+    httpserver.expect_request("/somedb", method="GET").respond_with_json({"db_name": "somedb", "update_seq": "5-g1"})
+    httpserver.expect_request("/somedb/_changes", method="GET").respond_with_handler(_changes_handler(pages))
+    httpserver.expect_request("/somedb/config", method="GET").respond_with_json({"value": 2}, headers={'ETag': '"2-abc"'})
+
+    with couch.db.cache_invalidator(poll_timeout=100, refresh=True):
+        assert _wait_for(lambda: getattr(couch.db.doc_cache.get(('somedb', 'config')), 'etag', None) == '"2-abc"')
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 2}
+
+
+def test_documents_changed_while_they_are_read_are_not_cached(httpserver: test_server.HTTPServer):
+    couch = _couch(ttl=3600)
+    invalidator = couch.db.cache_invalidator()
+
+    def read_then_change(request):
+        # the change arrives after the server answered, but before the client caches the answer
+        invalidator._apply({"seq": "6-g1", "id": "config", "changes": [{"rev": "2-abc"}]})
+        return Response(json.dumps({"value": 1}), content_type='application/json', headers={'ETag': '"1-abc"'})
+
+    httpserver.expect_oneshot_request("/somedb/config", method="GET").respond_with_handler(read_then_change)
+    httpserver.expect_oneshot_request("/somedb/config", method="GET") \
+              .respond_with_json({"value": 2}, headers={'ETag': '"2-abc"'})
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 1}
+    assert ('somedb', 'config') not in couch.db.doc_cache
+
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 2}
+    assert couch.db.get_doc(uri_segments={'docid': 'config'}) == {"value": 2}
+    assert len(httpserver.log) == 2
+
+
+@pytest.mark.parametrize('page', [{"results": [], "last_seq": "2-g1", "pending": 0},
+                                  {"results": [], "last_seq": "6-g1", "pending": 50000}])
+def test_invalidator_flushes_the_cache_on_reset_or_lag(httpserver: test_server.HTTPServer, page):
+    couch = _couch(ttl=3600)
+    couch.db.doc_cache.put(('somedb', 'config'), {"value": 1}, '"1-abc"')
+    httpserver.expect_request("/somedb", method="GET").respond_with_json({"db_name": "somedb", "update_seq": "5-g1"})
+    httpserver.expect_request("/somedb/_changes", method="GET").respond_with_handler(_changes_handler({"5-g1": page}))
+
+    with couch.db.cache_invalidator(poll_timeout=100, retry_delay=10) as invalidator:
+        assert _wait_for(lambda: len(couch.db.doc_cache) == 0)
+
+    assert invalidator.last_seq is None
+
+
+def test_invalidator_requires_a_cache():
+    with pytest.raises(ValueError):
+        couchapy.CouchDB().db.cache_invalidator()
@@ -0,0 +1,105 @@
+import  couchapy
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+import  requests
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+def _row(seq, docid):
+    return {"seq": seq, "id": docid, "changes": [{"rev": "1-967a00dff5e02add41819138abb3284d"}]}
+
+
+def test_normal_feed_is_streamed_and_tracks_last_seq(httpserver: test_server.HTTPServer):
+    body = '{"results":[\n' + ',\n'.join(json.dumps(_row(f'{i}-g1', f'doc{i}')) for i in range(1, 4)) + \
+           '\n],\n"last_seq":"3-g1","pending":0}\n'
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET").respond_with_data(body, content_type='application/json')
+
+    feed = couch.db.iter_changes()
+
+    assert [row['id'] for row in feed] == ['doc1', 'doc2', 'doc3']
+    assert feed.last_seq == '3-g1'
+    assert feed.pending == 0
+
+
+def test_continuous_feed_skips_heartbeats(httpserver: test_server.HTTPServer):
+    body = json.dumps(_row('1-g1', 'doc1')) + '\n\n\n' + json.dumps(_row('2-g1', 'doc2')) + '\n' + \
+           '{"last_seq":"2-g1","pending":0}\n'
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET",
+                                      query_string="feed=continuous&heartbeat=1000") \
+              .respond_with_data(body, content_type='application/json')
+
+    feed = couch.db.iter_changes(params={'feed': 'continuous', 'heartbeat': 1000})
+
+    assert [row['id'] for row in feed] == ['doc1', 'doc2']
+    assert feed.last_seq == '2-g1'
+
+
+def test_follow_resumes_from_last_seq(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET", query_string="feed=longpoll") \
+              .respond_with_data(json.dumps({"results": [_row('1-g1', 'doc1')], "last_seq": "1-g1", "pending": 0}))
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET", query_string="feed=longpoll&since=1-g1") \
+              .respond_with_data(json.dumps({"results": [_row('2-g1', 'doc2')], "last_seq": "2-g1", "pending": 0}))
+
+    rows = []
+    for row in couch.db.iter_changes(params={'feed': 'longpoll'}, follow=True):
+        rows.append(row)
+        if len(rows) == 2:
+            break
+
+    assert [row['id'] for row in rows] == ['doc1', 'doc2']
+
+
+def test_reconnects_after_a_dropped_connection(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET", query_string="since=1-g1") \
+              .respond_with_data(json.dumps({"results": [_row('2-g1', 'doc2')], "last_seq": "2-g1", "pending": 0}))
+
+    changes_stream = couch.db._changes_stream
+    calls = []
+
+    def dropping_changes_stream(**kwargs):
+        calls.append(kwargs['params'])
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError('connection reset')
+        return changes_stream(**kwargs)
+
+    couch.db._changes_stream = dropping_changes_stream
+    feed = couch.db.iter_changes(params={'since': '1-g1'}, reconnect_delay=0)
+
+    assert [row['id'] for row in feed] == ['doc2']
+    assert calls == [{'since': '1-g1'}, {'since': '1-g1'}]
+
+    couch.db._changes_stream = lambda **kwargs: (_ for _ in ()).throw(requests.exceptions.ConnectionError())
+    with pytest.raises(requests.exceptions.ConnectionError):
+        list(couch.db.iter_changes(reconnect_attempts=1, reconnect_delay=0))
+
+
+def test_filtered_feed_posts_doc_ids(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/_changes", method="POST", json={"doc_ids": ["doc1"]}) \
+              .respond_with_data(json.dumps({"results": [_row('1-g1', 'doc1')], "last_seq": "1-g1", "pending": 0}))
+
+    assert [row['id'] for row in couch.db.iter_changes(data={'doc_ids': ['doc1']})] == ['doc1']
+
+
+def test_errors_are_yielded_as_couch_errors(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/_changes", method="GET").respond_with_json({}, status=401)
+
+    rows = list(couch.db.iter_changes())
+
+    assert len(rows) == 1
+    assert isinstance(rows[0], couchapy.CouchError) is True
+
+    with pytest.raises(couchapy.InvalidKeysException):
+        list(couch.db.iter_changes(params={'nonexisting_key': ''}))
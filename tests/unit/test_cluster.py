@@ -0,0 +1,138 @@
+import  asyncio
+import  couchapy
+from    couchapy.cluster import LatencyWeighted, LeastOutstanding, Node, NodePool, RoundRobin
+import  pytest
+import  pytest_httpserver as test_server
+import  requests
+import  time
+
+
+LIVE_NODE = 'http://127.0.0.1:8000'
+DEAD_NODE = 'http://127.0.0.1:1'
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_strategies_pick_healthy_nodes():
+    nodes = [Node('http://a:5984'), Node('http://b:5984/'), Node('http://c:5984')]
+    assert nodes[1].base_uri == 'http://b:5984'
+
+    round_robin = RoundRobin()
+    assert [round_robin.choose(nodes).base_uri[7] for _ in range(4)] == ['a', 'b', 'c', 'a']
+
+    nodes[0].outstanding, nodes[1].outstanding, nodes[2].outstanding = 2, 0, 1
+    assert all(LeastOutstanding().choose(nodes) is nodes[1] for _ in range(10))
+
+    nodes[0].latency, nodes[1].latency, nodes[2].latency = 0.001, 1.0, None
+    nodes[0].outstanding = nodes[1].outstanding = nodes[2].outstanding = 0
+    picks = [LatencyWeighted().choose(nodes) for _ in range(1000)]
+    assert picks.count(nodes[1]) < 20
+    assert picks.count(nodes[2]) > 300
+
+    with pytest.raises(ValueError):
+        NodePool(['http://a:5984'], strategy='fastest')
+
+
+def test_failing_nodes_are_ejected_and_readmitted_after_a_probe():
+    probed = []
+    pool = NodePool(['http://a:5984', 'http://b:5984'], probe=probed.append, max_failures=2, probe_interval=0)
+    a, b = pool.nodes
+
+    for _ in range(2):
+        node = pool.acquire()
+        pool.release(node, failed=node is a)
+    assert a.healthy and a.failures == 1
+
+    node = pool.acquire()
+    pool.release(node, failed=True)
+    assert node is a and not a.healthy
+    assert pool.healthy_nodes == [b]
+
+    assert pool.acquire() is b
+    assert probed == [a]
+    assert b.outstanding == 1
+
+    pool.probed(a, False)
+    assert not a.healthy
+    pool.probed(a, True)
+    assert a.healthy and a.failures == 0
+
+
+def test_requests_are_spread_across_nodes(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/doc").respond_with_json({"_id": "doc"})
+
+    couch = couchapy.CouchDB(nodes=[LIVE_NODE, 'http://localhost:8000'], database_kwargs={"db": 'somedb'})
+    for _ in range(4):
+        assert couch.db.get_doc(uri_segments={'docid': 'doc'}) == {"_id": "doc"}
+
+    assert sorted(request.host for request, _ in httpserver.log) == ['127.0.0.1:8000'] * 2 + ['localhost:8000'] * 2
+    assert all(node.outstanding == 0 and node.latency is not None for node in couch._nodes.nodes)
+
+
+def test_dead_nodes_are_ejected_and_retried_requests_fail_over(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/_up").respond_with_json({"status": "ok"})
+    httpserver.expect_request("/somedb/doc").respond_with_json({"_id": "doc"})
+
+    couch = couchapy.CouchDB(nodes=[DEAD_NODE, LIVE_NODE], database_kwargs={"db": 'somedb'},
+                             cluster_kwargs={'max_failures': 1, 'probe_interval': 60},
+                             retry_kwargs={'backoff': 0})
+
+    for _ in range(3):
+        assert couch.db.get_doc(uri_segments={'docid': 'doc'}) == {"_id": "doc"}
+
+    dead, live = couch._nodes.nodes
+    assert not dead.healthy and live.healthy
+    assert len(httpserver.log) == 3
+
+    # the dead node comes back on the address of the live one
+    dead.base_uri, dead.next_probe = 'http://localhost:8000', 0
+    couch.db.get_doc(uri_segments={'docid': 'doc'})
+    assert _wait_for(lambda: dead.healthy)
+    assert any(request.path == '/_up' and request.host == 'localhost:8000' for request, _ in httpserver.log)
+
+
+def test_node_argument_targets_a_single_node(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/_node/_local/_stats").respond_with_json({"couchdb": {}})
+
+    couch = couchapy.CouchDB(nodes=[DEAD_NODE], cluster_kwargs={'max_failures': 1})
+    assert couch.server.node_stats(node=LIVE_NODE + '/') == {"couchdb": {}}
+    assert couch._nodes.nodes[0].healthy
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        couch.server.node_stats()
+    assert not couch._nodes.nodes[0].healthy
+
+
+def test_async_client_spreads_requests_across_nodes(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/_up").respond_with_json({"status": "ok"})
+    httpserver.expect_request("/somedb/doc").respond_with_json({"_id": "doc"})
+
+    async def run():
+        async with couchapy.AsyncCouchDB(nodes=[DEAD_NODE, LIVE_NODE], database_kwargs={"db": 'somedb'},
+                                         cluster_kwargs={'max_failures': 1, 'probe_interval': 0},
+                                         retry_kwargs={'backoff': 0}) as couch:
+            docs = [await couch.db.get_doc(uri_segments={'docid': 'doc'}) for _ in range(3)]
+            dead = couch._nodes.nodes[0]
+            ejected = not dead.healthy
+
+            dead.base_uri = 'http://localhost:8000'
+            await couch.db.get_doc(uri_segments={'docid': 'doc'})
+            for _ in range(100):
+                if dead.healthy:
+                    break
+                await asyncio.sleep(0.01)
+            return docs, ejected, dead.healthy
+
+    docs, ejected, readmitted = run_async(run())
+    assert docs == [{"_id": "doc"}] * 3
+    assert ejected and readmitted
@@ -0,0 +1,58 @@
+import  couchapy
+import  couchapy.codec
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+DOCS = {"docs": [{"_id": f"doc{i}", "name": "café", "count": i, "ratio": i / 3, "tags": ["a", None, True]} for i in range(10)]}
+
+
+@pytest.mark.parametrize('name', couchapy.codec.available_codecs())
+def test_codecs_round_trip_to_utf8_bytes(name):
+    codec = couchapy.codec.get_codec(name)
+    encoded = codec.dumps(DOCS)
+
+    assert codec.name == name
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded.decode('utf-8')) == DOCS
+    assert codec.loads(encoded) == DOCS
+    assert codec.loads(encoded.decode('utf-8')) == DOCS
+
+
+def test_json_is_the_default_and_auto_picks_the_fastest_installed_codec():
+    assert couchapy.codec.available_codecs()[-1] == 'json'
+    assert couchapy.codec.get_codec().name == 'json'
+    assert couchapy.CouchDB()._codec.name == 'json'
+    assert couchapy.codec.get_codec('auto').name == couchapy.codec.available_codecs()[0]
+    assert couchapy.CouchDB(codec='auto')._codec.name == couchapy.codec.available_codecs()[0]
+
+
+@pytest.mark.parametrize('name', couchapy.codec.available_codecs())
+def test_codecs_encode_what_the_json_module_accepts(name):
+    codec = couchapy.codec.get_codec(name)
+
+    assert json.loads(codec.dumps({1: 'int key', 'big': 2 ** 70})) == {'1': 'int key', 'big': 2 ** 70}
+
+
+def test_unknown_or_custom_codecs():
+    with pytest.raises(ValueError):
+        couchapy.codec.get_codec('yaml')
+
+    custom = couchapy.codec.JsonCodec()
+    assert couchapy.CouchDB(codec=custom)._codec is custom
+
+
+@pytest.mark.parametrize('name', couchapy.codec.available_codecs())
+def test_codec_is_used_for_request_and_response_bodies(httpserver: test_server.HTTPServer, name):
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, codec=name, database_kwargs={'db': 'somedb'})
+    httpserver.expect_oneshot_request("/somedb/_bulk_docs", method="POST", json=DOCS,
+                                      headers={'Content-type': 'application/json'}) \
+              .respond_with_json([{"ok": True, "id": "doc0", "rev": "1-abc"}], status=201)
+
+    assert couch.db.bulk_save(data=DOCS) == [{"ok": True, "id": "doc0", "rev": "1-abc"}]
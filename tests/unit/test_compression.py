@@ -0,0 +1,100 @@
+import  couchapy
+from    couchapy.compression import Compressor
+import  gzip
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+from    werkzeug.wrappers import Response
+import  zlib
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+DOCS = {'docs': [{'_id': f'doc{i}', 'type': 'order', 'status': 'shipped'} for i in range(200)]}
+
+
+def _recording_handler(received):
+    def handler(request):
+        body = request.get_data()
+        encoding = request.headers.get('Content-Encoding')
+        received.append((encoding, request.headers.get('Accept-Encoding'), len(body),
+                         json.loads(gzip.decompress(body) if encoding == 'gzip' else body)))
+        return Response('[]', status=201, content_type='application/json')
+    return handler
+
+
+def test_compressor_threshold():
+    compressor = Compressor(threshold=100, level=1)
+
+    assert compressor.compress(b'x' * 99) is None
+    assert gzip.decompress(compressor.compress(b'x' * 100)) == b'x' * 100
+    assert compressor.compress(b'x' * 1000) == compressor.compress(b'x' * 1000)
+
+
+def test_compressed_bodies_are_gzip_members_without_a_timestamp():
+    body = json.dumps(DOCS).encode()
+    compressed = Compressor(threshold=0, level=9).compress(body)
+
+    # a gzip member starts with the magic bytes and the compression method, followed by a 4 byte mtime
+    assert compressed[:3] == b'\x1f\x8b\x08'
+    assert compressed[4:8] == b'\x00\x00\x00\x00'
+    assert gzip.decompress(compressed) == body
+    assert len(compressed) < len(body) / 4
+
+
+def test_large_bodies_are_gzip_compressed(httpserver: test_server.HTTPServer):
+    received = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_recording_handler(received))
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                             compression_kwargs={'threshold': 1024, 'accept_encoding': 'gzip'})
+    couch.db.bulk_save(data=DOCS)
+    couch.db.bulk_save(data={'docs': [{'_id': 'small'}]})
+
+    encoding, accept_encoding, size, body = received[0]
+    assert (encoding, accept_encoding, body) == ('gzip', 'gzip', DOCS)
+    assert size < len(json.dumps(DOCS)) / 4
+
+    assert received[1][0] is None
+    assert received[1][3] == {'docs': [{'_id': 'small'}]}
+
+
+def test_deflate_and_gzip_responses_are_decompressed(httpserver: test_server.HTTPServer):
+    body = json.dumps(DOCS).encode()
+    httpserver.expect_request("/somedb/deflated").respond_with_data(zlib.compress(body), content_type='application/json',
+                                                                    headers={'Content-Encoding': 'deflate'})
+    httpserver.expect_request("/somedb/gzipped").respond_with_data(gzip.compress(body), content_type='application/json',
+                                                                   headers={'Content-Encoding': 'gzip'})
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                             compression_kwargs={})
+    assert couch.db.get_doc(uri_segments={'docid': 'deflated'}) == DOCS
+    assert couch.db.get_doc(uri_segments={'docid': 'gzipped'}) == DOCS
+    assert all(request.headers['Accept-Encoding'] == 'gzip, deflate' for request, _ in httpserver.log)
+
+
+def test_compression_is_opt_in(httpserver: test_server.HTTPServer):
+    received = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_recording_handler(received))
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    couch.db.bulk_save(data=DOCS)
+
+    assert received[0][0] is None
+    assert received[0][3] == DOCS
+
+
+def test_async_client_compresses_large_bodies(httpserver: test_server.HTTPServer, run_async):
+    received = []
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(_recording_handler(received))
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                                         compression_kwargs={}) as couch:
+            await couch.db.bulk_save(data=DOCS)
+
+    run_async(run())
+    assert (received[0][0], received[0][1], received[0][3]) == ('gzip', 'gzip, deflate', DOCS)
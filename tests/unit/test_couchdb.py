@@ -1,6 +1,10 @@
 import  couchapy
+from    concurrent.futures import ThreadPoolExecutor
+import  json
 import  pytest
 import  pytest_httpserver as test_server
+import  re
+from    werkzeug.wrappers import Response
 
 import  threading
 import  time
@@ -174,3 +178,21 @@ def test_auto_session_renewal(httpserver: test_server.HTTPServer):
 #     response = couch.user.get(id='testuser')
 #
 #     assert response == expected_json
+
+
+def test_instance_can_be_shared_across_threads(httpserver: test_server.HTTPServer):
+    def echo_path(request):
+        return Response(json.dumps({"path": request.path}), content_type='application/json')
+
+    httpserver.expect_request(re.compile(r"/db\d/doc\d+"), method="GET").respond_with_handler(echo_path)
+    shared = couchapy.CouchDB(host="http://127.0.0.1", port=8000, transport_kwargs={'pool_maxsize': 16})
+
+    def fetch(i):
+        segments = {'db': f'db{i % 3}', 'docid': f'doc{i}'}
+        return shared.db.get_doc(uri_segments=segments)['path'] == f'/db{i % 3}/doc{i}'
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(fetch, range(400)))
+
+    assert all(results)
+    assert shared.db._predefined_segments == {'db': '_global_changes'}
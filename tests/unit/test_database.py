@@ -24,3 +24,13 @@ def test_get_doc_info(httpserver: test_server.HTTPServer):
     response = couch.db.get_doc_info(uri_segments={'docid': 'testdoc'})
 
     assert response == expected
+
+
+def test_copy_endpoints_send_the_destination_header(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/_local/source", method="COPY", headers={"Destination": "target?rev=1-abc"}).respond_with_json(
+        {"ok": True, "id": "target", "rev": "2-def"}, status=201)
+    httpserver.expect_request("/_local/_local/source", method="COPY", headers={"Destination": "_local/target"}).respond_with_json(
+        {"ok": True, "id": "_local/target", "rev": "0-1"}, status=201)
+
+    assert couch.db.copy_doc(uri_segments={'docid': 'source'}, headers={'Destination': 'target?rev=1-abc'})['rev'] == '2-def'
+    assert couch.db.copy_local_doc(uri_segments={'docid': 'source'}, headers={'Destination': '_local/target'})['ok']
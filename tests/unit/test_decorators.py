@@ -0,0 +1,81 @@
+import  couchapy
+from    couchapy.decorators import UriTemplate
+import  pytest
+import  pytest_httpserver as test_server
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def test_uri_template_is_parsed_once_into_segment_names():
+    template = UriTemplate('/:db:/_design/:docid:/_view/:view:')
+
+    assert template.segments == ('db', 'docid', 'view')
+    assert template.format({'db': 'somedb', 'docid': 'ddoc', 'view': 'byname', 'unused': 'x'}) == '/somedb/_design/ddoc/_view/byname'
+
+
+def test_uri_template_without_segments_and_with_braces():
+    assert UriTemplate('/_up').segments == ()
+    assert UriTemplate('/_up').format(None) == '/_up'
+    assert UriTemplate('/{literal}/:db:').format({'db': 'x'}) == '/{literal}/x'
+
+
+def test_uri_template_missing_segments_raise_clear_errors():
+    template = UriTemplate('/:db:/:docid:')
+
+    with pytest.raises(Exception, match='but none were provided.  Expected segment definition for "db"'):
+        template.format({})
+
+    with pytest.raises(Exception, match='but none were provided.  Expected segment definition for "db"'):
+        template.format(None)
+
+    with pytest.raises(Exception, match='Expected a dynamic segment for "docid", but none was provided'):
+        template.format({'db': 'somedb'})
+
+
+def test_base_uri_follows_host_and_port_changes():
+    couch = couchapy.CouchDB(host='http://couch.local', port=6984)
+    assert couch._base_uri == 'http://couch.local:6984'
+
+    couch.host = 'https://other.local'
+    couch.port = 443
+    assert couch._base_uri == 'https://other.local:443'
+
+
+def test_raw_response_formats_skip_json_decoding(httpserver: test_server.HTTPServer):
+    body = b'{"_id":"testdoc","_rev":"1-abc"}'
+    httpserver.expect_request("/somedb/testdoc", method="GET").respond_with_data(body, content_type='application/json')
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+
+    response = couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='bytes')
+    assert isinstance(response, couchapy.RawResponse)
+    assert response.status_code == 200
+    assert response.body == body
+
+    response = couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='memoryview')
+    assert isinstance(response.body, memoryview)
+    assert response.body.tobytes() == body
+
+    with couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='stream') as response:
+        assert b''.join(response.iter_chunks(chunk_size=4)) == body
+
+    assert couch.db.get_doc(uri_segments={'docid': 'testdoc'}) == {"_id": "testdoc", "_rev": "1-abc"}
+
+
+def test_raw_response_format_defaults_to_the_client_option(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/testdoc", method="GET").respond_with_data(b'{"error":"not_found"}', status=404)
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                             response_format='bytes')
+
+    response = couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+    assert response.status_code == 404
+    assert response.body == b'{"error":"not_found"}'
+
+    assert isinstance(couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='json'), couchapy.CouchError)
+
+    with pytest.raises(ValueError, match='Unknown response format "xml"'):
+        couch.db.get_doc(uri_segments={'docid': 'testdoc'}, response_format='xml')
@@ -0,0 +1,173 @@
+import  couchapy
+from    couchapy.deploy import BuildProgress
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+def _indexer(shard, ddoc, done, total, db='somedb'):
+    return {"type": "indexer", "node": "couchdb@node1", "database": f"shards/{shard}/{db}.1590000000",
+            "design_document": ddoc, "changes_done": done, "total_changes": total, "progress": done * 100 // total}
+
+
+def _serve(httpserver, polls):
+    polls = iter(polls)
+    view_requests = []
+
+    def view(request):
+        view_requests.append((request.path, dict(request.args)))
+        return Response(json.dumps({"total_rows": 0, "offset": 0, "rows": []}), content_type='application/json')
+
+    httpserver.expect_request("/_active_tasks").respond_with_handler(
+        lambda request: Response(json.dumps(next(polls, [])), content_type='application/json'))
+    httpserver.expect_request("/somedb/_design/orders").respond_with_json(
+        {"_id": "_design/orders", "views": {"by_date": {"map": "..."}, "by_customer": {"map": "..."}}})
+    httpserver.expect_request("/somedb/_design/orders/_info").respond_with_json(
+        {"name": "orders", "view_index": {"updater_running": False, "signature": "abc"}})
+    httpserver.expect_request("/somedb/_design/mango-status").respond_with_json(
+        {"_id": "_design/mango-status", "language": "query", "views": {"status-idx": {"map": {}}}})
+    httpserver.expect_request("/somedb/_design/mango-status/_info").respond_with_json(
+        {"name": "mango-status", "view_index": {"updater_running": False}})
+    httpserver.expect_request("/somedb/_index").respond_with_json(
+        {"indexes": [{"ddoc": None, "name": "_all_docs", "type": "special"},
+                     {"ddoc": "_design/mango-status", "name": "status-idx", "type": "json"}]})
+    httpserver.expect_request("/somedb/_design/orders/_view/by_date").respond_with_handler(view)
+    httpserver.expect_request("/somedb/_design/orders/_view/by_customer").respond_with_handler(view)
+    httpserver.expect_request("/somedb/_design/mango-status/_view/status-idx").respond_with_handler(view)
+    return view_requests
+
+
+def test_warm_up_triggers_every_view_and_waits_for_the_indexers(httpserver: test_server.HTTPServer):
+    polls = [[_indexer('00000000-7fffffff', '_design/orders', 100, 1000),
+              _indexer('80000000-ffffffff', '_design/orders', 100, 1000),
+              _indexer('00000000-ffffffff', '_design/orders', 5, 10, db='otherdb')],
+             [_indexer('00000000-7fffffff', '_design/orders', 600, 1000),
+              _indexer('80000000-ffffffff', '_design/orders', 600, 1000)]]
+    view_requests = _serve(httpserver, polls)
+    reported = []
+
+    progress = couch.db.warm_up(['orders'], mango=True, poll_interval=0.01, on_progress=reported.append)
+
+    assert set(progress) == {'_design/orders', '_design/mango-status'}
+    assert all(build.ready and build.percent == 100 for build in progress.values())
+
+    triggered = [request for request in view_requests if request[1].get('update') == 'lazy']
+    assert sorted(path for path, _ in triggered) == ['/somedb/_design/mango-status/_view/status-idx',
+                                                    '/somedb/_design/orders/_view/by_customer',
+                                                    '/somedb/_design/orders/_view/by_date']
+    assert all(args['limit'] == '0' for _, args in triggered)
+
+    first, second = reported[0]['_design/orders'], reported[1]['_design/orders']
+    assert (first.changes_done, first.total_changes, first.percent, first.eta, first.ready) == (200, 2000, 10, None, False)
+    assert (second.changes_done, second.percent, second.ready) == (1200, 60, False)
+    assert second.eta > 0
+    assert reported[0]['_design/mango-status'].ready
+    assert len(reported) == 3
+
+
+def test_warm_up_times_out_and_returns_errors(httpserver: test_server.HTTPServer):
+    busy = [_indexer('00000000-ffffffff', '_design/orders', 1, 1000)]
+    _serve(httpserver, [busy] * 1000)
+
+    with pytest.raises(TimeoutError):
+        couch.db.warm_up(['_design/orders'], poll_interval=0.01, timeout=0.05)
+
+    httpserver.expect_request("/somedb/_design/missing").respond_with_json({"error": "not_found", "reason": "missing"},
+                                                                          status=404)
+    assert isinstance(couch.db.warm_up(['missing'], poll_interval=0), couchapy.CouchError)
+
+
+def test_build_progress_reports_percent_and_eta():
+    assert BuildProgress('_design/a', 250, 1000, 30).percent == 25
+    assert BuildProgress('_design/a').percent == 0
+    assert repr(BuildProgress('_design/a', 250, 1000, 30)) == "BuildProgress('_design/a', 25.0%, eta=30s, ready=False)"
+
+
+def test_deploy_ddoc_builds_the_staging_copy_before_swapping_it_in(httpserver: test_server.HTTPServer):
+    steps = []
+    new_version = {"_id": "_design/whatever", "_rev": "9-zzz", "language": "javascript",
+                   "views": {"by_date": {"map": "function (doc) { emit(doc.date, null); }"}}}
+
+    def step(name, payload, status=200, headers=None):
+        def handler(request):
+            steps.append((name, request.method, dict(request.args), request.headers.get('Destination'),
+                          request.get_data() or None))
+            return Response(json.dumps(payload), status=status, content_type='application/json', headers=headers)
+        return handler
+
+    httpserver.expect_request("/somedb/_design/orders-staging", method="HEAD").respond_with_handler(
+        step('staging rev', {}, headers={'ETag': '"3-old"'}))
+    httpserver.expect_request("/somedb/_design/orders-staging", method="PUT").respond_with_handler(
+        step('save staging', {"ok": True, "id": "_design/orders-staging", "rev": "4-new"}, status=201))
+    httpserver.expect_request("/somedb/_design/orders-staging", method="GET").respond_with_json(new_version)
+    httpserver.expect_request("/somedb/_design/orders-staging/_view/by_date").respond_with_handler(
+        step('query staging', {"rows": []}))
+    httpserver.expect_request("/_active_tasks").respond_with_json([])
+    httpserver.expect_request("/somedb/_design/orders-staging/_info").respond_with_json(
+        {"view_index": {"updater_running": False}})
+    httpserver.expect_request("/somedb/_design/orders", method="HEAD").respond_with_handler(
+        step('live rev', {}, headers={'ETag': '"7-live"'}))
+    httpserver.expect_request("/somedb/_design/orders-staging", method="COPY").respond_with_handler(
+        step('copy', {"ok": True, "id": "_design/orders", "rev": "8-copied"}, status=201))
+    httpserver.expect_request("/somedb/_design/orders-staging", method="DELETE").respond_with_handler(
+        step('delete staging', {"ok": True}))
+    httpserver.expect_request("/somedb/_view_cleanup", method="POST").respond_with_handler(
+        step('view cleanup', {"ok": True}, status=202))
+
+    result = couch.db.deploy_ddoc('_design/orders', new_version, poll_interval=0)
+
+    assert result == {"ok": True, "id": "_design/orders", "rev": "8-copied"}
+    assert [name for name, *_ in steps] == ['staging rev', 'save staging', 'query staging', 'query staging',
+                                           'live rev', 'copy', 'delete staging', 'view cleanup']
+
+    saved = steps[1]
+    assert saved[2] == {'rev': '3-old'}
+    assert json.loads(saved[4]) == {key: value for key, value in new_version.items() if key not in ['_id', '_rev']}
+    assert steps[2][2] == {'update': 'lazy', 'limit': '0'}
+    assert steps[5][3] == '_design/orders?rev=7-live'
+    assert steps[6][2] == {'rev': '4-new'}
+
+
+def test_deploy_ddoc_leaves_the_live_version_alone_when_the_staging_copy_fails(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_design/orders-next", method="HEAD").respond_with_data('', status=404)
+    httpserver.expect_request("/somedb/_design/orders-next", method="PUT").respond_with_json(
+        {"error": "compilation_error", "reason": "Expression does not eval to a function."}, status=400)
+
+    result = couch.db.deploy_ddoc('orders', {"views": {"broken": {"map": "nope"}}}, staging='_design/orders-next',
+                                  keep_staging=True)
+
+    assert isinstance(result, couchapy.CouchError) and result.status_code == 400
+    assert [request.method for request, _ in httpserver.log] == ['HEAD', 'PUT']
+
+
+def test_deploy_ddoc_returns_the_error_when_the_staging_copy_cannot_be_deleted(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_design/orders-staging", method="HEAD").respond_with_data('', status=404)
+    httpserver.expect_request("/somedb/_design/orders-staging", method="PUT").respond_with_json(
+        {"ok": True, "id": "_design/orders-staging", "rev": "1-new"}, status=201)
+    httpserver.expect_request("/somedb/_design/orders-staging", method="GET").respond_with_json({"views": {}})
+    httpserver.expect_request("/somedb/_design/orders", method="HEAD").respond_with_data('', status=404)
+    httpserver.expect_request("/somedb/_design/orders-staging", method="COPY").respond_with_json(
+        {"ok": True, "id": "_design/orders", "rev": "1-copied"}, status=201)
+    httpserver.expect_request("/somedb/_design/orders-staging", method="DELETE").respond_with_json(
+        {"error": "conflict", "reason": "Document update conflict."}, status=409)
+    httpserver.expect_request("/_active_tasks").respond_with_json([])
+    httpserver.expect_request("/somedb/_design/orders-staging/_info").respond_with_json({"view_index": {}})
+
+    result = couch.db.deploy_ddoc('orders', {"views": {}}, poll_interval=0)
+
+    assert isinstance(result, couchapy.CouchError) and result.status_code == 409
+    assert not any(request.path == '/somedb/_view_cleanup' for request, _ in httpserver.log)
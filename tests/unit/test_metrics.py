@@ -0,0 +1,94 @@
+import  couchapy
+from    couchapy.metrics import Histogram, MetricsAggregator, RequestMetrics
+import  pytest
+import  pytest_httpserver as test_server
+import  time
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def test_histogram_percentiles_are_within_the_bucket_precision():
+    histogram = Histogram(precision=16)
+    for value in range(1, 1001):
+        histogram.add(value / 1000)
+
+    for percent in [50, 95, 99]:
+        assert histogram.percentile(percent) == pytest.approx(percent / 100, rel=0.05)
+
+    assert histogram.percentile(100) == 1.0
+    assert histogram.summary()['mean'] == pytest.approx(0.5005)
+    assert Histogram().percentile(50) is None
+    assert len(histogram.counts) < 200
+
+
+def test_aggregator_groups_calls_by_endpoint_and_can_be_turned_off():
+    metrics = MetricsAggregator()
+    metrics(RequestMetrics('/:db:/:docid:', 'get', 200, 0, 100, {'wait': 0.01, 'decode': 0.001}))
+    metrics(RequestMetrics('/:db:/:docid:', 'get', 404, 0, 50, {'connect': 0.002, 'wait': 0.02}))
+
+    metrics.enabled = False
+    metrics(RequestMetrics('/:db:', 'get', 200, 0, 10, {}))
+
+    summary = metrics.summary()
+    assert list(summary) == ['GET /:db:/:docid:']
+    stats = summary['GET /:db:/:docid:']
+    assert (stats['count'], stats['errors'], stats['response_bytes']) == (2, 1, 150)
+    assert stats['total']['max'] == pytest.approx(0.022)
+    assert stats['connect']['p99'] == pytest.approx(0.002, rel=0.05)
+
+    metrics.reset()
+    assert metrics.summary() == {}
+
+
+def test_observers_receive_request_metrics(httpserver: test_server.HTTPServer):
+    def slow_handler(request):
+        time.sleep(0.05)
+        return Response('{"_id": "testdoc"}', status=200, content_type='application/json')
+
+    httpserver.expect_request("/somedb/testdoc", method="GET").respond_with_handler(slow_handler)
+    httpserver.expect_request("/somedb", method="POST").respond_with_json({"ok": True}, status=201)
+
+    observed = []
+    metrics = MetricsAggregator()
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                             observers=[observed.append, metrics])
+
+    couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+    couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+    couch.db.save_doc(data={'_id': 'newdoc'})
+
+    first, second, save = observed
+    assert (first.endpoint, first.method, first.status_code) == ('/:db:/:docid:', 'get', 200)
+    assert (first.request_bytes, first.response_bytes) == (0, len(b'{"_id": "testdoc"}'))
+    # the test server closes every connection, so each request connects
+    assert first.connect > 0 and second.connect > 0
+    assert first.wait >= 0.05
+    assert first.decode > 0
+    assert first.total >= first.wait + first.decode
+    assert (save.method, save.status_code, save.request_bytes) == ('post', 201, len(b'{"_id":"newdoc"}'))
+
+    assert metrics.summary()['GET /:db:/:docid:']['count'] == 2
+
+    couch.observers.remove(observed.append)
+    couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+    assert len(observed) == 3
+
+
+def test_async_observers_receive_request_metrics(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_request("/somedb/testdoc", method="GET").respond_with_json({"_id": "testdoc"})
+    observed = []
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                                         observers=[observed.append]) as couch:
+            await couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+            await couch.db.get_doc(uri_segments={'docid': 'testdoc'})
+
+    run_async(run())
+    assert [(metrics.endpoint, metrics.status_code) for metrics in observed] == [('/:db:/:docid:', 200)] * 2
+    assert observed[0].connect > 0
+    assert observed[0].response_bytes > 0
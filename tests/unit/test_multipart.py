@@ -0,0 +1,163 @@
+import  couchapy
+import  couchapy.codec
+from    couchapy.multipart import MultipartReader, RelatedBody
+import  io
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+BLOB = bytes(range(256)) * 512
+
+
+def _related(boundary, doc, attachments):
+    body = f'--{boundary}\r\nContent-Type: application/json\r\n\r\n'.encode() + json.dumps(doc).encode()
+    for name, data in attachments:
+        body += f'\r\n--{boundary}\r\nContent-Disposition: attachment; filename="{name}"\r\n' \
+                f'Content-Type: application/octet-stream\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data
+    return body + f'\r\n--{boundary}--'.encode()
+
+
+def _chunked(body, size):
+    return (body[i:i + size] for i in range(0, len(body), size))
+
+
+def test_reader_handles_delimiters_split_across_chunks():
+    body = _related('abc', {'_id': 'doc'}, [('a.bin', BLOB), ('b.txt', b'--abc is not a delimiter\r\n')])
+
+    for size in [1, 3, 7, 4096, len(body)]:
+        parts = [(part.content_type, part.name, part.read()) for part in MultipartReader(_chunked(body, size), 'abc')]
+
+        assert parts == [('application/json', None, b'{"_id": "doc"}'),
+                         ('application/octet-stream', 'a.bin', BLOB),
+                         ('application/octet-stream', 'b.txt', b'--abc is not a delimiter\r\n')]
+
+
+def test_reader_skips_unread_parts_and_rejects_truncated_bodies():
+    body = _related('abc', {'_id': 'doc'}, [('a.bin', BLOB), ('b.bin', b'xyz')])
+
+    parts = MultipartReader(_chunked(body, 1000), 'abc')
+    assert [part.name for part in parts] == [None, 'a.bin', 'b.bin']
+
+    with pytest.raises(ValueError, match='Truncated'):
+        [part.read() for part in MultipartReader(_chunked(body[:-100], 1000), 'abc')]
+
+
+def test_get_doc_with_attachments_streams_attachment_parts(httpserver: test_server.HTTPServer):
+    doc = {'_id': 'doc', '_attachments': {'a.bin': {'follows': True}, 'b.bin': {'follows': True}}}
+    body = _related('xyz', doc, [('a.bin', BLOB), ('b.bin', b'small')])
+    httpserver.expect_request("/somedb/doc", method="GET", query_string='attachments=true',
+                              headers={'Accept': 'multipart/related'}) \
+              .respond_with_data(body, content_type='multipart/related; boundary="xyz"')
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    with couch.db.get_doc_with_attachments(uri_segments={'docid': 'doc'}) as result:
+        assert result.doc == doc
+        attachments = result.attachments
+        first = next(attachments)
+        assert first.name == 'a.bin'
+        assert b''.join(first.iter_chunks(1024)) == BLOB
+        assert next(attachments).read() == b'small'
+
+
+def test_get_doc_with_attachments_without_attachments_and_errors(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/plain", method="GET").respond_with_json({'_id': 'plain'})
+    httpserver.expect_request("/somedb/missing", method="GET").respond_with_json({'error': 'not_found',
+                                                                                 'reason': 'missing'}, status=404)
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+
+    result = couch.db.get_doc_with_attachments(uri_segments={'docid': 'plain'})
+    assert result.doc == {'_id': 'plain'}
+    assert list(result.attachments) == []
+
+    result = couch.db.get_doc_with_attachments(uri_segments={'docid': 'missing'})
+    assert isinstance(result, couchapy.CouchError) is True
+    assert (result.status_code, result.error) == (404, 'not_found')
+
+
+def test_bulk_get_with_attachments_reads_mixed_responses(httpserver: test_server.HTTPServer):
+    doc = {'_id': 'a', '_attachments': {'a.bin': {'follows': True}}}
+    related = _related('inner', doc, [('a.bin', BLOB)])
+    body = b'--outer\r\nContent-Type: multipart/related; boundary="inner"\r\n\r\n' + related + \
+           b'\r\n--outer\r\nContent-Type: application/json\r\n\r\n{"_id": "b"}' + \
+           b'\r\n--outer\r\nContent-Type: application/json; error="true"\r\n\r\n' + \
+           b'{"id": "c", "error": "not_found", "reason": "missing"}' + \
+           b'\r\n--outer--'
+    httpserver.expect_request("/somedb/_bulk_get", method="POST", query_string='attachments=true') \
+              .respond_with_data(body, content_type='multipart/mixed; boundary="outer"')
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    results = list(couch.db.bulk_get_with_attachments(data={'docs': [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]}))
+
+    assert [result.doc for result in results[:2]] == [doc, {'_id': 'b'}]
+    assert isinstance(results[2], couchapy.CouchError) is True
+    assert results[2].status_code == 404
+
+    results = couch.db.bulk_get_with_attachments(data={'docs': [{'id': 'a'}]})
+    assert next(results).read_attachments() == {'a.bin': BLOB}
+
+
+def test_related_body_has_a_known_length_and_streams_its_sources():
+    codec = couchapy.codec.get_codec('json')
+    body = RelatedBody({'_id': 'doc', '_rev': '1-abc', '_attachments': {'old.txt': {'stub': True}, 'gone': {}}},
+                       {'a.bin': ('application/octet-stream', io.BytesIO(BLOB)),
+                        'b.txt': ('text/plain', iter([b'he', b'llo']), 5),
+                        'c.txt': ('text/plain', b'bytes')},
+                       codec)
+    data = b''.join(body)
+
+    assert len(data) == len(body)
+    parts = [(part.content_type, part.read()) for part in MultipartReader([data], body.boundary)]
+    assert json.loads(parts[0][1])['_attachments'] == {
+        'old.txt': {'stub': True},
+        'a.bin': {'follows': True, 'content_type': 'application/octet-stream', 'length': len(BLOB)},
+        'b.txt': {'follows': True, 'content_type': 'text/plain', 'length': 5},
+        'c.txt': {'follows': True, 'content_type': 'text/plain', 'length': 5}}
+    assert parts[1:] == [('application/octet-stream', BLOB), ('text/plain', b'hello'), ('text/plain', b'bytes')]
+
+    with pytest.raises(ValueError, match='length'):
+        RelatedBody({'_id': 'doc'}, {'a': ('text/plain', iter([b'x']))}, codec)
+
+
+def test_related_body_lists_replaced_stubs_in_the_order_of_their_parts():
+    codec = couchapy.codec.get_codec('json')
+    body = RelatedBody({'_id': 'doc', '_rev': '1-abc',
+                        '_attachments': {'a.txt': {'stub': True}, 'b.txt': {'stub': True}, 'c.txt': {'stub': True}}},
+                       {'b.txt': ('text/plain', b'new b'), 'a.txt': ('text/plain', b'new a')},
+                       codec)
+
+    parts = [part.read() for part in MultipartReader([b''.join(body)], body.boundary)]
+    attachments = json.loads(parts[0])['_attachments']
+    following = [name for name, info in attachments.items() if info.get('follows')]
+
+    assert list(attachments) == ['c.txt', 'b.txt', 'a.txt']
+    assert dict(zip(following, parts[1:])) == {'b.txt': b'new b', 'a.txt': b'new a'}
+
+
+def test_save_doc_with_attachments_sends_a_sized_multipart_body(httpserver: test_server.HTTPServer):
+    received = {}
+
+    def handler(request):
+        received.update(content_type=request.headers.get('Content-Type'),
+                        length=request.headers.get('Content-Length'),
+                        body=request.get_data())
+        return Response('{"ok": true, "id": "doc", "rev": "2-def"}', status=201, content_type='application/json')
+
+    httpserver.expect_request("/somedb/doc", method="PUT").respond_with_handler(handler)
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    result = couch.db.save_doc_with_attachments({'_id': 'doc', '_rev': '1-abc'},
+                                                {'a.bin': ('application/octet-stream', io.BytesIO(BLOB))})
+
+    assert result == {"ok": True, "id": "doc", "rev": "2-def"}
+    assert received['content_type'].startswith('multipart/related; boundary=')
+    assert int(received['length']) == len(received['body'])
+    assert received['body'].startswith(b'--')
+    assert received['body'].endswith(BLOB + b'\r\n--' + received['content_type'].split('"')[1].encode() + b'--')
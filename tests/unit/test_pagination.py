@@ -0,0 +1,137 @@
+import  couchapy
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+# view rows with duplicate keys, sorted by (key, id) as CouchDB does
+VIEW_ROWS = [{"id": f"doc{i:03}", "key": i // 3, "value": None} for i in range(25)]
+
+
+def _view_handler(requests_seen):
+    def handler(request):
+        requests_seen.append(dict(request.args))
+        rows = VIEW_ROWS
+
+        if 'startkey' in request.args:
+            start = (json.loads(request.args['startkey']), request.args.get('startkey_docid', ''))
+            rows = [row for row in rows if (row['key'], row['id']) >= start]
+
+        rows = rows[:int(request.args['limit'])]
+        return Response(json.dumps({"total_rows": len(VIEW_ROWS), "offset": 0, "rows": rows}),
+                        content_type='application/json')
+    return handler
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_view_pages_with_startkey_and_docid(httpserver: test_server.HTTPServer, prefetch):
+    requests_seen = []
+    httpserver.expect_request("/somedb/_design/ddoc/_view/byvalue", method="GET").respond_with_handler(_view_handler(requests_seen))
+
+    rows = couch.db.iter_view(uri_segments={'docid': 'ddoc', 'view': 'byvalue'}, params={'skip': 3}, page_size=10,
+                              prefetch=prefetch)
+
+    assert list(rows) == VIEW_ROWS
+    assert rows.meta == {"total_rows": 25, "offset": 0}
+    assert requests_seen == [{'limit': '11'},
+                             {'limit': '11', 'startkey': '3', 'startkey_docid': 'doc010'},
+                             {'limit': '11', 'startkey': '6', 'startkey_docid': 'doc020'}]
+
+
+def test_iter_view_limit_caps_the_total_number_of_rows(httpserver: test_server.HTTPServer):
+    requests_seen = []
+    httpserver.expect_request("/somedb/_design/ddoc/_view/byvalue", method="GET").respond_with_handler(_view_handler(requests_seen))
+
+    rows = list(couch.db.iter_view(uri_segments={'docid': 'ddoc', 'view': 'byvalue'}, params={'limit': 12}, page_size=10))
+
+    assert rows == VIEW_ROWS[:12]
+    assert [seen['limit'] for seen in requests_seen] == ['11', '3']
+
+
+def test_iter_docs_pages_on_key_only(httpserver: test_server.HTTPServer):
+    first_page = {"total_rows": 3, "offset": 0, "rows": [{"id": "a", "key": "a"}, {"id": "b", "key": "b"}, {"id": "c", "key": "c"}]}
+    second_page = {"total_rows": 3, "offset": 2, "rows": [{"id": "c", "key": "c"}]}
+    httpserver.expect_oneshot_request("/somedb/_all_docs", method="GET", query_string="limit=3").respond_with_json(first_page)
+    httpserver.expect_oneshot_request("/somedb/_all_docs", method="GET", query_string="startkey=%22c%22&limit=3").respond_with_json(second_page)
+
+    assert [row['id'] for row in couch.db.iter_docs(page_size=2)] == ['a', 'b', 'c']
+
+
+def test_iter_design_docs_yields_errors(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/_design_docs", method="GET").respond_with_json({}, status=401)
+
+    rows = list(couch.db.iter_design_docs())
+
+    assert len(rows) == 1
+    assert isinstance(rows[0], couchapy.CouchError) is True
+
+
+FIND_DOCS = [{"_id": f"doc{i:03}", "type": "order"} for i in range(23)]
+
+
+def _find_handler(requests_seen):
+    def handler(request):
+        data = json.loads(request.get_data())
+        requests_seen.append(data)
+        start = int(data.get('bookmark', 'b0')[1:])
+        docs = FIND_DOCS[start:start + data['limit']]
+        page = {"docs": docs, "bookmark": f"b{start + len(docs)}",
+                "warning": "No matching index found, create an index to optimize query time."}
+        if data.get('execution_stats'):
+            page['execution_stats'] = {"total_keys_examined": 0, "total_docs_examined": 100,
+                                       "results_returned": len(docs), "execution_time_ms": 1.5}
+        return Response(json.dumps(page), content_type='application/json')
+    return handler
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_find_follows_bookmarks_until_an_empty_page(httpserver: test_server.HTTPServer, prefetch):
+    requests_seen = []
+    httpserver.expect_request("/somedb/_find", method="POST").respond_with_handler(_find_handler(requests_seen))
+
+    cursor = couch.db.iter_find(data={'selector': {'type': 'order'}, 'skip': 5, 'execution_stats': True},
+                                page_size=10, prefetch=prefetch)
+
+    assert list(cursor) == FIND_DOCS
+    assert [data.get('bookmark') for data in requests_seen] == [None, 'b10', 'b20', 'b23']
+    assert all(data['limit'] == 10 and 'skip' not in data for data in requests_seen)
+    assert cursor.bookmark == 'b23'
+    assert cursor.warning.startswith('No matching index')
+    assert len(cursor.execution_stats) == 4
+    assert cursor.totals == {"total_keys_examined": 0, "total_docs_examined": 400, "results_returned": 23,
+                             "execution_time_ms": 6.0}
+
+
+def test_iter_find_limit_and_bookmark_resume_a_cursor(httpserver: test_server.HTTPServer):
+    requests_seen = []
+    httpserver.expect_request("/somedb/_find", method="POST").respond_with_handler(_find_handler(requests_seen))
+
+    cursor = couch.db.iter_find(data={'selector': {}, 'limit': 12}, page_size=10)
+    assert list(cursor) == FIND_DOCS[:12]
+    assert [data['limit'] for data in requests_seen] == [10, 2]
+
+    resumed = couch.db.iter_find(data={'selector': {}, 'bookmark': cursor.bookmark}, page_size=10)
+    assert list(resumed) == FIND_DOCS[12:]
+    assert resumed.execution_stats == []
+
+
+def test_iter_find_yields_errors(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_find", method="POST").respond_with_json(
+        {"error": "invalid_operator", "reason": "Invalid operator: $foo"}, status=400)
+
+    results = list(couch.db.iter_find(data={'selector': {'a': {'$foo': 1}}}))
+    assert len(results) == 1 and isinstance(results[0], couchapy.CouchError)
@@ -0,0 +1,122 @@
+import  couchapy
+from    couchapy.retry import RetryPolicy
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+import  requests
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def _couch(**retry_kwargs):
+    return couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                            retry_kwargs={'backoff': 0, **retry_kwargs})
+
+
+def test_backoff_is_exponential_capped_and_jittered():
+    policy = RetryPolicy(backoff=0.1, max_backoff=1, jitter=False)
+    assert [policy.delay(attempt) for attempt in range(6)] == [0.1, 0.2, 0.4, 0.8, 1, 1]
+    assert policy.delay(0, retry_after=0.5) == 0.5
+    assert policy.delay(0, retry_after=60) == 1
+
+    jittered = RetryPolicy(backoff=0.1, max_backoff=1)
+    assert all(0 <= jittered.delay(3) <= 0.8 for _ in range(100))
+
+
+def test_retry_budget_limits_retries():
+    policy = RetryPolicy(budget_reserve=2, budget_ratio=0.5)
+
+    assert policy.retry_delay(0, True, 503) is not None
+    assert policy.retry_delay(0, True, 503) is not None
+    assert policy.retry_delay(0, True, 503) is None
+
+    policy._deposit()
+    policy._deposit()
+    assert policy.retry_delay(0, True, 503) is not None
+    assert policy.retry_delay(3, True, 503) is None
+
+
+def test_idempotent_requests_are_retried(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb/doc", method="GET").respond_with_json({"error": "unavailable"}, status=503)
+    httpserver.expect_oneshot_request("/somedb/doc", method="GET").respond_with_json({"error": "rebalance"}, status=500)
+    httpserver.expect_request("/somedb/doc", method="GET").respond_with_json({"_id": "doc"})
+    httpserver.expect_oneshot_request("/somedb/doc", method="PUT").respond_with_json({"error": "unavailable"}, status=503)
+    httpserver.expect_request("/somedb/doc", method="PUT").respond_with_json({"ok": True}, status=201)
+
+    couch = _couch()
+    assert couch.db.get_doc(uri_segments={'docid': 'doc'}) == {"_id": "doc"}
+    assert couch.db.save_named_doc(uri_segments={'docid': 'doc'}, params={'rev': '1-abc'}, data={}) == {"ok": True}
+    assert len(httpserver.log) == 5
+
+
+def test_unsafe_requests_are_only_retried_when_rejected_with_429(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/somedb", method="POST").respond_with_json({"error": "unavailable"}, status=503)
+    httpserver.expect_oneshot_request("/somedb", method="POST").respond_with_json({"error": "too_many_requests"}, status=429)
+    httpserver.expect_request("/somedb", method="POST").respond_with_json({"ok": True}, status=201)
+
+    couch = _couch()
+    assert couch.db.save_doc(data={'_id': 'doc'}).status_code == 503
+    assert couch.db.save_doc(data={'_id': 'doc'}) == {"ok": True}
+    assert len(httpserver.log) == 3
+
+
+def test_retries_give_up_and_can_be_disabled(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/doc", method="GET").respond_with_json({"error": "unavailable"}, status=503)
+
+    couch = _couch(max_retries=2)
+    assert couch.db.get_doc(uri_segments={'docid': 'doc'}).status_code == 503
+    assert len(httpserver.log) == 3
+
+    assert couch.db.get_doc(uri_segments={'docid': 'doc'}, retry=False).status_code == 503
+    assert len(httpserver.log) == 4
+
+
+def test_connection_failures_are_retried_when_the_request_was_never_sent():
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=1, database_kwargs={"db": 'somedb'},
+                             retry_kwargs={'backoff': 0, 'max_retries': 2, 'budget_reserve': 10})
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        couch.db.save_doc(data={'_id': 'doc'})
+
+    assert couch._retry_policy._tokens == pytest.approx(8)
+
+
+def test_bulk_save_resends_only_the_documents_that_failed(httpserver: test_server.HTTPServer):
+    received = []
+
+    def handler(request):
+        docs = json.loads(request.get_data())['docs']
+        received.append([doc['_id'] for doc in docs])
+        results = []
+        for doc in docs:
+            if doc['_id'] == 'b' and len(received) == 1 or doc['_id'] == 'c' and len(received) < 3:
+                results.append({'id': doc['_id'], 'error': 'unknown_error', 'reason': 'timeout'})
+            elif doc['_id'] == 'd':
+                results.append({'id': doc['_id'], 'error': 'conflict', 'reason': 'Document update conflict.'})
+            else:
+                results.append({'ok': True, 'id': doc['_id'], 'rev': f'1-{len(received)}'})
+        return Response(json.dumps(results), status=201, content_type='application/json')
+
+    httpserver.expect_request("/somedb/_bulk_docs", method="POST").respond_with_handler(handler)
+
+    results = _couch().db.bulk_save(data={'docs': [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}, {'_id': 'd'}]})
+
+    assert received == [['a', 'b', 'c', 'd'], ['b', 'c'], ['c']]
+    assert [result.get('rev', result.get('error')) for result in results] == ['1-1', '1-2', '1-3', 'conflict']
+
+
+def test_async_client_retries(httpserver: test_server.HTTPServer, run_async):
+    httpserver.expect_oneshot_request("/somedb/doc", method="GET").respond_with_json({"error": "unavailable"}, status=503)
+    httpserver.expect_request("/somedb/doc", method="GET").respond_with_json({"_id": "doc"})
+
+    async def run():
+        async with couchapy.AsyncCouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'},
+                                         retry_kwargs={'backoff': 0}) as couch:
+            return await couch.db.get_doc(uri_segments={'docid': 'doc'})
+
+    assert run_async(run()) == {"_id": "doc"}
+    assert len(httpserver.log) == 2
@@ -0,0 +1,183 @@
+import  couchapy
+import  couchapy.pagination
+import  json
+import  pytest
+import  pytest_httpserver as test_server
+import  threading
+import  time
+from    werkzeug.wrappers import Response
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """ setup any state specific to the execution of the given module."""
+    global couch
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+    yield
+
+
+DOC_IDS = sorted(f'{i * 2654435761 % 65536:04x}{i:04}' for i in range(200))
+PARTITIONS = {'sensor-1': [f'sensor-1:{i:03}' for i in range(0, 60, 2)],
+              'sensor-2': [f'sensor-2:{i:03}' for i in range(1, 60, 2)],
+              'sensor': [f'sensor:{i:03}' for i in range(5)]}
+
+
+def _rows(ids, args):
+    if 'startkey' in args:
+        ids = [docid for docid in ids if docid >= json.loads(args['startkey'])]
+    if 'endkey' in args:
+        end = json.loads(args['endkey'])
+        ids = [docid for docid in ids if docid < end or docid == end and args.get('inclusive_end') != 'false']
+
+    rows = [{"id": docid, "key": docid, "value": {"rev": "1-a"}} for docid in ids[:int(args['limit'])]]
+    return Response(json.dumps({"total_rows": len(ids), "offset": 0, "rows": rows}), content_type='application/json')
+
+
+def _shards(ranges):
+    return {"shards": {f'{i:08x}-{i:08x}': ["couchdb@node1"] for i in range(ranges)}}
+
+
+def test_scan_docs_splits_all_docs_into_ranges(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_shards").respond_with_json(_shards(4))
+    httpserver.expect_request("/somedb/_all_docs").respond_with_handler(lambda request: _rows(DOC_IDS, request.args))
+
+    rows = list(couch.db.scan_docs(page_size=20))
+
+    assert [row['id'] for row in rows] == DOC_IDS
+    ranges = {(request.args.get('startkey'), request.args.get('endkey')) for request, _ in httpserver.log
+              if request.path.endswith('_all_docs') and request.args.get('startkey_docid') is None}
+    assert {(None, '"4000"'), ('"4000"', '"8000"'), ('"8000"', '"c000"'), ('"c000"', None)} <= ranges
+
+
+def test_parallel_scan_limits_the_requests_in_flight():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def query(uri_segments, params):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+        ids = [f'{uri_segments["partition"]}:{i:03}' for i in range(30)]
+        if 'startkey' in params:
+            ids = [docid for docid in ids if docid >= json.loads(params['startkey'])]
+        return {"rows": [{"id": docid, "key": docid} for docid in ids[:params['limit']]]}
+
+    slices = [({'partition': partition}, {}) for partition in ['a', 'b', 'c', 'd', 'e']]
+    rows = list(couchapy.pagination.ParallelScan(query, slices, key=lambda row: row['id'], concurrency=3,
+                                                 page_size=5, docid_keys=False))
+
+    assert [row['id'] for row in rows] == sorted(f'{p}:{i:03}' for p in 'abcde' for i in range(30))
+    assert peak[0] == 3
+
+
+@pytest.mark.parametrize('key', [None, lambda row: row['id']])
+def test_parallel_scan_runs_every_slice_on_a_bounded_pool(key):
+    queried, threads = [], []
+    baseline = threading.active_count()
+
+    def query(uri_segments, params):
+        queried.append(uri_segments['partition'])
+        threads.append(threading.active_count() - baseline)
+        time.sleep(0.001)
+        return {"rows": [{"id": f'{uri_segments["partition"]}:{i}', "key": i} for i in range(2)]}
+
+    partitions = [f'p{index:03}' for index in range(200)]
+    rows = iter(couchapy.pagination.ParallelScan(query, [({'partition': p}, {}) for p in partitions], key=key,
+                                                 concurrency=4, page_size=10, docid_keys=False))
+
+    assert next(rows)['id'] == 'p000:0'
+    if key is None:
+        # slices are started as the consumer reaches them
+        assert set(queried) <= set(partitions[:4])
+
+    assert len(list(rows)) == 399
+    assert sorted(queried) == partitions
+    assert max(threads) <= 4
+
+
+def test_scan_docs_keeps_the_bounds_of_the_query_on_the_outer_ranges(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_all_docs").respond_with_handler(lambda request: _rows(DOC_IDS, request.args))
+
+    rows = list(couch.db.scan_docs(params={'startkey': '"2"', 'endkey': '"e"'}, split_keys=['5', 'a'], concurrency=2,
+                                   page_size=50))
+
+    assert [row['id'] for row in rows] == [docid for docid in DOC_IDS if '2' <= docid <= 'e']
+
+    with pytest.raises(ValueError):
+        couch.db.scan_docs(params={'limit': 10}, concurrency=2)
+
+
+def test_scan_docs_ignores_split_keys_outside_the_bounds_of_the_query(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_all_docs").respond_with_handler(lambda request: _rows(DOC_IDS, request.args))
+
+    rows = list(couch.db.scan_docs(params={'startkey': '"b"', 'endkey': '"c"'}, concurrency=3, page_size=20))
+
+    assert [row['id'] for row in rows] == [docid for docid in DOC_IDS if 'b' <= docid <= 'c']
+    ranges = [(request.args.get('startkey'), request.args.get('endkey')) for request, _ in httpserver.log
+              if request.args.get('startkey_docid') is None]
+    assert sorted(ranges) == [('"b"', '"c"')]
+
+    slices = couch.db._range_slices({}, {'startkey': '"b"', 'endkey': '"c"'}, ['4000', 'b800', 'c000'])
+    assert [(params['startkey'], params['endkey']) for _, params in slices] == [('"b"', '"b800"'), ('"b800"', '"c"')]
+
+
+def test_scan_docs_reads_partitions_from_their_shards_in_id_order(httpserver: test_server.HTTPServer):
+    for partition, ids in PARTITIONS.items():
+        httpserver.expect_request(f"/somedb/_partition/{partition}/_all_docs").respond_with_handler(
+            lambda request, ids=ids: _rows(ids, request.args))
+
+    rows = list(couch.db.scan_docs(partitions=list(PARTITIONS), concurrency=2, page_size=7))
+
+    assert [row['id'] for row in rows] == sorted(docid for ids in PARTITIONS.values() for docid in ids)
+    assert not any(request.path == '/somedb/_all_docs' for request, _ in httpserver.log)
+
+
+def test_scan_view_merges_partitioned_views_in_key_order(httpserver: test_server.HTTPServer):
+    def handler(request, partition):
+        rows = [{"id": f'{partition}:{i}', "key": i * 10 + int(partition[-1]), "value": None} for i in range(10)]
+        if 'startkey' in request.args:
+            rows = [row for row in rows if row['key'] >= json.loads(request.args['startkey'])]
+        return Response(json.dumps({"rows": rows[:int(request.args['limit'])]}), content_type='application/json')
+
+    for partition in ['p1', 'p2', 'p3']:
+        httpserver.expect_request(f"/somedb/_partition/{partition}/_design/ddoc/_view/by_time").respond_with_handler(
+            lambda request, partition=partition: handler(request, partition))
+
+    rows = couch.db.scan_view(uri_segments={'docid': 'ddoc', 'view': 'by_time'}, partitions=['p1', 'p2', 'p3'],
+                              concurrency=3, page_size=4)
+
+    assert [row['key'] for row in rows] == sorted(i * 10 + p for i in range(10) for p in [1, 2, 3])
+
+    with pytest.raises(ValueError):
+        couch.db.scan_view(uri_segments={'docid': 'ddoc', 'view': 'by_time'})
+
+
+def test_scan_stops_at_the_first_error(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_partition/good/_all_docs").respond_with_handler(
+        lambda request: _rows([f'good:{i}' for i in range(50)], request.args))
+    httpserver.expect_request("/somedb/_partition/bad/_all_docs").respond_with_json(
+        {"error": "not_found", "reason": "missing"}, status=404)
+
+    rows = list(couch.db.scan_docs(partitions=['good', 'bad'], concurrency=2, page_size=10))
+
+    assert isinstance(rows[-1], couchapy.CouchError)
+    assert all(not isinstance(row, couchapy.CouchError) for row in rows[:-1])
+
+
+def test_partition_endpoints(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/somedb/_partition/sensor-1").respond_with_json({"partition": "sensor-1", "doc_count": 30})
+    httpserver.expect_request("/somedb/_partition/sensor-1/_find", method="POST",
+                              json={"selector": {"value": {"$gt": 1}}}).respond_with_json({"docs": []})
+
+    assert couch.db.get_partition(uri_segments={'partition': 'sensor-1'})['doc_count'] == 30
+    assert couch.db.find_partition(uri_segments={'partition': 'sensor-1'},
+                                   data={"selector": {"value": {"$gt": 1}}}) == {"docs": []}
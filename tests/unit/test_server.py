@@ -471,8 +471,10 @@ def test_get_node_server_stat(httpserver: test_server.HTTPServer):
     response = couch.server.node_stat(uri_segments={'node_name': '_local', 'stat': 'couchdb/request_time'})
     assert response == expected_json
 
-    response = couch.server.node_stat()
-    assert response == expected_json
+    # uri segments of a previous call are not remembered
+    assert couch.server._predefined_segments == {'node_name': '_local'}
+    with pytest.raises(Exception, match='Expected a dynamic segment for "stat"'):
+        couch.server.node_stat()
 
 
 def test_get_node_system_stats(httpserver: test_server.HTTPServer):
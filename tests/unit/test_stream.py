@@ -0,0 +1,122 @@
+import  couchapy
+import  couchapy.codec
+import  couchapy.stream
+import  json
+import  pytest
+
+
+def _chunked(text, size):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_iter_lines_splits_chunks_and_keeps_heartbeats():
+    chunks = [b'{"seq":1}\n\n{"se', b'q":2}\r\n', b'\n{"last_seq":2}']
+
+    assert list(couchapy.stream.iter_lines(chunks)) == ['{"seq":1}', '', '{"seq":2}', '', '{"last_seq":2}']
+
+
+def test_iter_lines_handles_multibyte_characters_split_between_chunks():
+    assert list(couchapy.stream.iter_lines(_chunked('{"name":"café"}\n', 13))) == ['{"name":"café"}']
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64, 4096])
+def test_json_array_stream_yields_items_and_collects_meta(size):
+    document = {"total_rows": 12345, "offset": 0,
+                "rows": [{"id": f"doc{i}", "key": i * 1.5, "value": {"rev": f"1-{i}", "tags": ["a", "b"]}} for i in range(20)],
+                "update_seq": "20-g1AAAA"}
+    rows = couchapy.stream.JsonArrayStream(_chunked(json.dumps(document, indent=1), size))
+
+    assert list(rows) == document['rows']
+    assert rows.array_key == 'rows'
+    assert rows.meta == {"total_rows": 12345, "offset": 0, "update_seq": "20-g1AAAA"}
+
+
+def test_json_array_stream_does_not_truncate_numbers_split_between_chunks():
+    rows = couchapy.stream.JsonArrayStream([b'{"results":[1234', b'5,6', b'7],"last_seq":9', b'99}'])
+
+    assert list(rows) == [12345, 67]
+    assert rows.meta == {"last_seq": 999}
+
+
+@pytest.mark.parametrize('size', [1, 2, 5])
+def test_json_array_stream_scans_strings_escapes_and_literals_split_between_chunks(size):
+    items = [{"text": "a \\\" } ] { [ \\\\", "nested": [[{}], {"k": [1, "]"]}]}, "plain \\u00e9", -1.5e3, True, None, []]
+    rows = couchapy.stream.JsonArrayStream(_chunked(json.dumps({"rows": items, "total_rows": 1}), size))
+
+    assert list(rows) == items
+    assert rows.meta == {"total_rows": 1}
+
+
+def test_json_array_stream_decodes_every_item_once_with_the_codec():
+    class CountingCodec(couchapy.codec.JsonCodec):
+        calls = []
+
+        def loads(self, data):
+            self.calls.append(len(data))
+            return super().loads(data)
+
+    codec = CountingCodec()
+    document = {"rows": [{"id": "big", "doc": {"payload": "x" * 100000}}, {"id": "small"}]}
+    rows = couchapy.stream.JsonArrayStream(_chunked(json.dumps(document), 100), codec=codec)
+
+    assert list(rows) == document['rows']
+    assert sorted(codec.calls)[-2:] == [len('{"id": "small"}'), len(json.dumps(document['rows'][0]))]
+    assert len(codec.calls) == 3
+
+
+def test_json_array_stream_with_empty_array_and_custom_key():
+    rows = couchapy.stream.JsonArrayStream([b'{"docs": [], "bookmark": "nil"}'], array_keys=['docs'])
+
+    assert list(rows) == []
+    assert rows.meta == {"bookmark": "nil"}
+
+
+def test_json_array_stream_raises_on_truncated_input():
+    with pytest.raises(json.JSONDecodeError):
+        list(couchapy.stream.JsonArrayStream([b'{"rows":[{"id":1},{"id"']))
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def test_rows_response_format_streams_view_and_find_results(httpserver):
+    rows = [{"id": f"doc{i}", "key": i, "value": None} for i in range(1000)]
+    httpserver.expect_request("/somedb/_design/ddoc/_view/byvalue").respond_with_data(
+        json.dumps({"total_rows": 1000, "offset": 0, "rows": rows}), content_type='application/json')
+    httpserver.expect_request("/somedb/_find", method="POST").respond_with_data(
+        json.dumps({"docs": [{"_id": "a"}, {"_id": "b"}], "bookmark": "g1"}), content_type='application/json')
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+
+    with couch.db.get_view(uri_segments={'docid': 'ddoc', 'view': 'byvalue'}, response_format='rows') as stream:
+        assert isinstance(stream, couchapy.stream.JsonArrayStream)
+        assert list(stream) == rows
+        assert stream.meta == {"total_rows": 1000, "offset": 0}
+
+    docs = couch.db.find(data={'selector': {}}, response_format='rows')
+    assert [doc['_id'] for doc in docs] == ['a', 'b']
+    assert docs.array_key == 'docs' and docs.meta == {"bookmark": "g1"}
+
+
+def test_rows_response_format_returns_errors_and_releases_abandoned_streams(httpserver):
+    httpserver.expect_request("/somedb/_all_docs").respond_with_json({"error": "unauthorized", "reason": "nope"},
+                                                                      status=401)
+    httpserver.expect_request("/somedb/_design/ddoc/_view/byvalue").respond_with_data(
+        json.dumps({"rows": [{"id": "a", "key": 1}, {"id": "b", "key": 2}]}), content_type='application/json')
+
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000, database_kwargs={"db": 'somedb'})
+
+    error = couch.db.get_docs(response_format='rows')
+    assert isinstance(error, couchapy.CouchError)
+    assert error.status_code == 401 and error.error == 'unauthorized'
+
+    closed = []
+    stream = couch.db.get_view(uri_segments={'docid': 'ddoc', 'view': 'byvalue'}, response_format='rows')
+    close, stream._close = stream._close, lambda: closed.append(close())
+    assert next(iter(stream)) == {"id": "a", "key": 1}
+    stream.close()
+    stream.close()
+    assert len(closed) == 1
@@ -0,0 +1,79 @@
+import  couchapy
+import  couchapy.transport
+import  pytest
+import  pytest_httpserver as test_server
+
+
+@pytest.fixture
+def httpserver_listen_address():
+    return ("127.0.0.1", 8000)
+
+
+def test_default_transport_settings():
+    transport = couchapy.transport.Transport()
+
+    assert transport.pool_connections == 10
+    assert transport.pool_maxsize == 10
+    assert transport.pool_block is False
+    assert transport.max_retries == 0
+    assert transport.keep_alive is True
+    assert transport.timeout is None
+    assert transport._session.headers['Connection'] == 'keep-alive'
+
+
+def test_transport_settings_are_applied_to_the_connection_pool():
+    couch = couchapy.CouchDB(transport_kwargs={'pool_connections': 2, 'pool_maxsize': 25, 'pool_block': True,
+                                               'max_retries': 3, 'keep_alive': False, 'timeout': 5})
+    adapter = couch._transport._session.get_adapter('http://127.0.0.1:5984')
+
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 25
+    assert adapter._pool_block is True
+    assert adapter.max_retries.total == 3
+    assert couch._transport._session.headers['Connection'] == 'close'
+    assert couch._transport.timeout == 5
+
+
+def test_endpoints_share_a_single_transport(httpserver: test_server.HTTPServer):
+    couch = couchapy.CouchDB(host="http://127.0.0.1", port=8000)
+    requested = []
+    request = couch._transport.request
+
+    def recording_request(method, uri, **kwargs):
+        requested.append((method, uri))
+        return request(method, uri, **kwargs)
+
+    couch._transport.request = recording_request
+
+    httpserver.expect_request("/_up", method="GET").respond_with_json({"status": "ok"})
+    httpserver.expect_request("/_session", method="GET").respond_with_json({"ok": True})
+    httpserver.expect_request("/_global_changes", method="GET").respond_with_json({"db_name": "_global_changes"})
+
+    couch.server.server_status()
+    couch.session.get_session_info()
+    couch.db.get()
+
+    assert requested == [('get', 'http://127.0.0.1:8000/_up'),
+                         ('get', 'http://127.0.0.1:8000/_session'),
+                         ('get', 'http://127.0.0.1:8000/_global_changes')]
+
+
+def test_transport_does_not_persist_cookies(httpserver: test_server.HTTPServer):
+    httpserver.expect_oneshot_request("/_session", method="POST") \
+              .respond_with_json({"ok": True},
+                                 headers={'Set-Cookie': 'AuthSession=sometoken; Version=1; Path=/; HttpOnly'})
+
+    couch = couchapy.CouchDB(name="test", password="test", host="http://127.0.0.1", port=8000)
+    couch.session.authenticate(data={'name': couch.name, 'password': couch.password})
+
+    assert couch.session.auth_token == 'sometoken'
+    assert len(couch._transport._session.cookies) == 0
+
+
+def test_close_releases_connections_and_transport_remains_usable(httpserver: test_server.HTTPServer):
+    httpserver.expect_request("/_up", method="GET").respond_with_json({"status": "ok"})
+
+    with couchapy.CouchDB(host="http://127.0.0.1", port=8000) as couch:
+        assert couch.server.server_status() == {"status": "ok"}
+
+    assert couch.server.server_status() == {"status": "ok"}